@@ -41,8 +41,11 @@ export const handler = async (
       return createErrorResponse(403, "Access denied");
     }
 
-    // Check if video is processed
-    if (video["status"] !== "PROCESSED") {
+    // Check if video is processed; detections are published page by page
+    // while results are stored, so those videos play with partial results
+    const partial =
+      video["status"] === "PROCESSING" && video["processingStage"] === "STORING";
+    if (video["status"] !== "PROCESSED" && !partial) {
       return createErrorResponse(400, "Video is not ready for playback");
     }
 
@@ -59,7 +62,10 @@ export const handler = async (
       videoId,
       fileName: video["fileName"],
       status: video["status"],
+      processedFaces: video["processedFaces"],
+      progressPercent: video["progressPercent"],
       playbackUrl: presignedUrl, // Changed from presignedUrl to playbackUrl
+      scrubPreview: await getScrubPreview(video["spriteSheet"]),
       metadata: {
         duration: video["duration"],
         size: video["size"],
@@ -107,3 +113,33 @@ async function getPresignedUrl(
 ): Promise<string> {
   return await getSignedUrl(s3Client, command, { expiresIn });
 }
+
+// Sprite sheets plus the index mapping tile N to timestamps[N]:
+// sheet N / (columns * rows), column N % columns, row N % (columns * rows) / columns
+async function getScrubPreview(spriteSheet: any): Promise<any> {
+  if (!spriteSheet || spriteSheet["status"] !== "ready") {
+    return null;
+  }
+
+  const sheets = await Promise.all(
+    (spriteSheet["sheets"] as string[]).map((key) =>
+      getPresignedUrl(
+        new GetObjectCommand({
+          Bucket: process.env["VIDEO_BUCKET"]!,
+          Key: key,
+          ResponseContentType: "image/jpeg",
+        }),
+        3600
+      )
+    )
+  );
+
+  return {
+    sheets,
+    columns: spriteSheet["columns"],
+    rows: spriteSheet["rows"],
+    tileWidth: spriteSheet["tileWidth"],
+    tileHeight: spriteSheet["tileHeight"],
+    timestamps: spriteSheet["timestamps"],
+  };
+}
@@ -0,0 +1,126 @@
+"""Content-addressed cache of Rekognition analyses for duplicate uploads"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from lifecycle import is_conditional_check_failure
+
+STATUS_PENDING = 'PENDING'
+STATUS_READY = 'READY'
+DEFAULT_TTL_DAYS = 30
+
+
+def content_key(s3_object: Dict[str, Any]) -> Optional[str]:
+    """Cache key for an S3 event object: its ETag plus size
+
+    Identical bytes uploaded the same way produce the same ETag; the size
+    guards against the rare multipart ETag collision.
+    """
+    etag = (s3_object.get('eTag') or s3_object.get('ETag') or '').strip('"')
+    if not etag:
+        return None
+    return f"{etag}-{s3_object.get('size', 0)}"
+
+
+class AnalysisCache:
+    """Maps an org's content key to the video whose analysis can be reused
+
+    Entries expire through the table's ``expiresAt`` TTL attribute; expired
+    entries that DynamoDB has not yet deleted are treated as misses.
+    """
+
+    def __init__(self, table, ttl_seconds: int = DEFAULT_TTL_DAYS * 86400):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def key(org_id: str, cache_key: str) -> Dict[str, str]:
+        return {
+            'PK': f"ANALYSIS#{org_id}#{cache_key}",
+            'SK': 'ANALYSIS'
+        }
+
+    def claim(self, org_id: str, cache_key: str, video_id: str) -> Optional[Dict[str, Any]]:
+        """Register video_id as the source for this content
+
+        Returns None when the claim succeeded (a cache miss: the caller should
+        run the analysis), otherwise the existing live entry.
+        """
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    **self.key(org_id, cache_key),
+                    'sourceVideoId': video_id,
+                    'status': STATUS_PENDING,
+                    'createdAt': datetime.utcnow().isoformat(),
+                    'expiresAt': now + self.ttl_seconds
+                },
+                ConditionExpression='attribute_not_exists(PK) OR expiresAt < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return None
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+
+        return self.table.get_item(Key=self.key(org_id, cache_key), ConsistentRead=True).get('Item')
+
+    def add_waiter(self, org_id: str, cache_key: str, video_id: str) -> bool:
+        """Queue video_id for a copy once the pending source analysis completes
+
+        Returns False if the entry is no longer pending, in which case the
+        caller should re-read it and copy immediately.
+        """
+        try:
+            self.table.update_item(
+                Key=self.key(org_id, cache_key),
+                UpdateExpression='ADD waitingVideoIds :videoIds',
+                ConditionExpression='#status = :pending',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':videoIds': {video_id}, ':pending': STATUS_PENDING}
+            )
+            return True
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+            return False
+
+    def complete(self, org_id: str, cache_key: str, video_id: str) -> List[str]:
+        """Mark the source analysis READY and return the videos waiting on it"""
+        try:
+            response = self.table.update_item(
+                Key=self.key(org_id, cache_key),
+                UpdateExpression='SET #status = :ready, readyAt = :timestamp REMOVE waitingVideoIds',
+                ConditionExpression='sourceVideoId = :videoId',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':ready': STATUS_READY,
+                    ':timestamp': datetime.utcnow().isoformat(),
+                    ':videoId': video_id
+                },
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+            return []
+        return sorted(response.get('Attributes', {}).get('waitingVideoIds', set()))
+
+    def release(self, org_id: str, cache_key: str, video_id: str) -> List[str]:
+        """Drop a failed source entry and return the videos that were waiting"""
+        try:
+            response = self.table.delete_item(
+                Key=self.key(org_id, cache_key),
+                ConditionExpression='sourceVideoId = :videoId',
+                ExpressionAttributeValues={':videoId': video_id},
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+            return []
+        return sorted(response.get('Attributes', {}).get('waitingVideoIds', set()))
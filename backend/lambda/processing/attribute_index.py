@@ -0,0 +1,71 @@
+"""Org-scoped inverted index entries for appearance attributes"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Attributes written as ORG#{org}#ATTR#{name}#{value} partitions, one search filter each
+INDEXED_ATTRIBUTES = ('ageBucket', 'gender', 'emotion', 'mask')
+# Flags indexed only when set; the search narrows other attributes by their unset value
+FLAG_ATTRIBUTES = ('mask',)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def normalize_attribute_value(value: Any) -> str:
+    """Canonical form used in index keys, e.g. 'Male' -> 'male', True -> 'true'"""
+    return str(value).strip().lower()
+
+
+def attribute_partition_key(org_id: str, name: str, value: Any) -> str:
+    return f"ORG#{org_id}#ATTR#{name}#{normalize_attribute_value(value)}"
+
+
+def recording_start(video: Dict[str, Any]) -> datetime:
+    """Wall-clock (UTC) time of a video's first frame: its upload time, else when its analysis started"""
+    value = video.get('uploadedAt') or video.get('processingStartedAt')
+    if not value:
+        return EPOCH
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def appeared_at(recorded_at: datetime, offset_ms: int) -> str:
+    """Fixed-width UTC time of an appearance, so sort keys order by time"""
+    return (recorded_at + timedelta(milliseconds=offset_ms)).isoformat(timespec='milliseconds')
+
+
+def build_attribute_index_items(org_id: str, appearance: Dict[str, Any],
+                                recorded_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Compact index entries pointing back at an APPEAR# item
+
+    The sort key starts with the wall-clock time of the appearance, its offset
+    into the video after ``recorded_at``, so a search for one value in a time
+    range is a single key-range query on the base table. Unknown values and
+    unset flags are not indexed.
+    """
+    # APPEAR#{video_id}#{offset}[#{track}] -> {video_id}#{offset}[#{track}]
+    appearance_suffix = appearance['SK'].split('#', 1)[1]
+    moment = appeared_at(recorded_at or EPOCH, int(appearance_suffix.split('#')[1]))
+    sort_key = f"APPEAR#{moment}#{appearance_suffix}"
+
+    entries = []
+    for name in INDEXED_ATTRIBUTES:
+        value = appearance.get('attributes', {}).get(name)
+        if value is None or normalize_attribute_value(value) == 'unknown':
+            continue
+        if name in FLAG_ATTRIBUTES and normalize_attribute_value(value) != 'true':
+            continue
+        entries.append({
+            'PK': attribute_partition_key(org_id, name, value),
+            'SK': sort_key,
+            'appearanceSK': appearance['SK'],
+            'videoId': appearance['videoId'],
+            'personId': appearance['personId'],
+            'timestamp': appearance['timestamp'],
+            'appearedAt': moment,
+            'confidence': appearance['confidence'],
+            'attributes': appearance['attributes'],
+        })
+    return entries
@@ -0,0 +1,261 @@
+"""Buffered DynamoDB writer built on batch_write_item"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# DynamoDB accepts at most 25 put/delete requests per BatchWriteItem call
+MAX_BATCH_SIZE = 25
+
+
+class BatchWriteError(Exception):
+    """Raised when items are still unprocessed after all retries"""
+
+    def __init__(self, message: str, unprocessed: List[Dict[str, Any]], stats: Optional['WriteStats'] = None):
+        super().__init__(message)
+        self.unprocessed = unprocessed
+        self.stats = stats
+
+
+@dataclass
+class WriteStats:
+    """Throughput and retry accounting for one writer"""
+
+    items_written: int = 0
+    batches_sent: int = 0
+    retries: int = 0
+    unprocessed_items: int = 0
+    failed_batches: int = 0
+    failed_items: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items_written / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def merge(self, other: 'WriteStats') -> None:
+        self.items_written += other.items_written
+        self.batches_sent += other.batches_sent
+        self.retries += other.retries
+        self.unprocessed_items += other.unprocessed_items
+        self.failed_batches += other.failed_batches
+        self.failed_items += other.failed_items
+        self.elapsed_seconds += other.elapsed_seconds
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'itemsWritten': self.items_written,
+            'batchesSent': self.batches_sent,
+            'retries': self.retries,
+            'unprocessedItems': self.unprocessed_items,
+            'failedBatches': self.failed_batches,
+            'failedItems': self.failed_items,
+            'elapsedSeconds': round(self.elapsed_seconds, 3),
+            'itemsPerSecond': round(self.items_per_second, 1),
+        }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class BatchWriter:
+    """Groups item puts into 25-item batch_write_item calls
+
+    Items sharing a primary key within one buffered batch are collapsed so the
+    last write wins, matching the behaviour of sequential put_item calls.
+    """
+
+    def __init__(self, dynamodb_resource, table_name: str, key_names: Tuple[str, ...] = ('PK', 'SK'),
+                 batch_size: int = MAX_BATCH_SIZE, max_retries: int = 8,
+                 base_delay: float = 0.05, max_delay: float = 5.0):
+        self.client = dynamodb_resource.meta.client
+        self.table_name = table_name
+        self.key_names = key_names
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = WriteStats()
+        self._buffer: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+
+    def put(self, item: Dict[str, Any]) -> None:
+        """Buffer an item, flushing once a full batch is ready"""
+        key = tuple(item[name] for name in self.key_names)
+        self._buffer[key] = item
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write whatever is buffered"""
+        if not self._buffer:
+            return
+        items = list(self._buffer.values())
+        self._buffer.clear()
+        self.write_batch(items)
+
+    def write_batch(self, items: List[Dict[str, Any]]) -> None:
+        """Send one batch, retrying UnprocessedItems with jittered backoff"""
+        started = time.monotonic()
+        try:
+            self._send(items, self.stats)
+        except BatchWriteError as e:
+            self.stats.failed_batches += 1
+            self.stats.failed_items += len(e.unprocessed)
+            e.stats = self.stats
+            raise
+        finally:
+            self.stats.elapsed_seconds += time.monotonic() - started
+
+    def _send(self, items: List[Dict[str, Any]], stats: WriteStats) -> None:
+        requests = [{'PutRequest': {'Item': item}} for item in items]
+        attempt = 0
+
+        while requests:
+            response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            stats.batches_sent += 1
+            stats.items_written += len(requests)
+
+            requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            if not requests:
+                break
+
+            stats.items_written -= len(requests)
+            stats.unprocessed_items += len(requests)
+            if attempt >= self.max_retries:
+                raise BatchWriteError(
+                    f"{len(requests)} items unprocessed after {attempt} retries",
+                    [request['PutRequest']['Item'] for request in requests]
+                )
+
+            time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+            attempt += 1
+            stats.retries += 1
+
+    def sync(self) -> bool:
+        """Write the buffer now; True when every item put so far is stored"""
+        self.flush()
+        return self.stats.failed_items == 0
+
+    def close(self) -> None:
+        """Write any remaining buffered items"""
+        self.flush()
+
+    def __enter__(self) -> 'BatchWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Only drain the buffer on a clean exit; errors propagate unchanged
+        if exc_type is None:
+            self.close()
+
+
+class WritePool:
+    """Thread pool and in-flight bound shared by several ParallelBatchWriters
+
+    Lets the records of one invocation share write capacity instead of each
+    starting its own pool; every writer still keeps its own stats and errors.
+    """
+
+    def __init__(self, max_workers: int = 4, max_in_flight: Optional[int] = None):
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-writer')
+        self.slots = threading.BoundedSemaphore(max_in_flight or self.max_workers * 2)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'WritePool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
+
+
+class ParallelBatchWriter(BatchWriter):
+    """Spreads batches across a thread pool sharing one DynamoDB client
+
+    At most ``max_in_flight`` batches are queued or running at once; put()
+    blocks once that bound is reached. A failed batch does not stop the
+    others: failures are tallied in the stats and raised together by close().
+    Pass a shared ``pool`` to draw on capacity owned by the caller.
+    """
+
+    def __init__(self, dynamodb_resource, table_name: str, max_workers: int = 4,
+                 max_in_flight: Optional[int] = None, pool: Optional[WritePool] = None, **kwargs):
+        super().__init__(dynamodb_resource, table_name, **kwargs)
+        self._owns_pool = pool is None
+        self._pool = pool or WritePool(max_workers, max_in_flight)
+        self.max_workers = self._pool.max_workers
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._errors: List[str] = []
+        self._failed: List[Dict[str, Any]] = []
+        self._started: Optional[float] = None
+
+    def write_batch(self, items: List[Dict[str, Any]]) -> None:
+        if self._started is None:
+            self._started = time.monotonic()
+        if len(self._futures) >= 256:
+            self._futures = [future for future in self._futures if not future.done()]
+        self._pool.slots.acquire()
+        try:
+            self._futures.append(self._pool.executor.submit(self._run_batch, items))
+        except Exception:
+            self._pool.slots.release()
+            raise
+
+    def _run_batch(self, items: List[Dict[str, Any]]) -> None:
+        batch_stats = WriteStats()
+        try:
+            self._send(items, batch_stats)
+        except Exception as e:
+            unprocessed = e.unprocessed if isinstance(e, BatchWriteError) else items
+            batch_stats.failed_batches += 1
+            batch_stats.failed_items += len(unprocessed)
+            with self._lock:
+                self._errors.append(str(e))
+                self._failed.extend(unprocessed)
+        finally:
+            with self._lock:
+                self.stats.merge(batch_stats)
+            self._pool.slots.release()
+
+    def sync(self) -> bool:
+        """Flush and wait for this writer's in-flight batches, keeping the pool open"""
+        self.flush()
+        wait(self._futures)
+        self._futures.clear()
+        with self._lock:
+            return not self._errors
+
+    def close(self) -> None:
+        """Flush, wait for in-flight batches and raise if any batch failed"""
+        self.flush()
+        self._drain()
+        if self._started is not None:
+            self.stats.elapsed_seconds = time.monotonic() - self._started
+
+        if self._errors:
+            raise BatchWriteError(
+                f"{self.stats.failed_batches} batches failed after writing {self.stats.items_written} items: {self._errors[0]}",
+                self._failed,
+                self.stats
+            )
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._drain()
+
+    def _drain(self) -> None:
+        # Wait for this writer's batches; a shared pool stays open for other writers
+        wait(self._futures)
+        self._futures.clear()
+        if self._owns_pool:
+            self._pool.shutdown()
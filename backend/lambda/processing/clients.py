@@ -0,0 +1,96 @@
+"""Lazily created AWS clients and resources, shared for the life of the container
+
+Clients are built on first use instead of at import time, so a record that
+only touches DynamoDB does not pay for Rekognition, MediaConvert or SNS
+client construction during cold start. All clients share one botocore
+config with a connection pool sized for the parallel batch writer.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+
+_lock = threading.Lock()
+_session = None
+_clients: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], Any] = {}
+_resources: Dict[str, Any] = {}
+_tables: Dict[str, Any] = {}
+
+
+def client_config() -> Config:
+    """Shared botocore config: pooled keep-alive connections and adaptive retries"""
+    return Config(
+        max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', str(DEFAULT_MAX_POOL_CONNECTIONS))),
+        connect_timeout=float(os.environ.get('AWS_CONNECT_TIMEOUT', '5')),
+        read_timeout=float(os.environ.get('AWS_READ_TIMEOUT', '60')),
+        retries={'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', '5')), 'mode': 'adaptive'},
+        tcp_keepalive=True
+    )
+
+
+def _get_session():
+    # boto3's default session is not safe to build clients from concurrently
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_client(service_name: str, **kwargs):
+    """Return the container's client for a service, creating it on first use"""
+    cache_key = (service_name, tuple(sorted(kwargs.items())))
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _get_session().client(service_name, config=client_config(), **kwargs)
+            _clients[cache_key] = client
+    return client
+
+
+def get_resource(service_name: str):
+    """Return the container's resource for a service, creating it on first use"""
+    resource = _resources.get(service_name)
+    if resource is not None:
+        return resource
+
+    with _lock:
+        resource = _resources.get(service_name)
+        if resource is None:
+            resource = _get_session().resource(service_name, config=client_config())
+            _resources[service_name] = resource
+    return resource
+
+
+def get_table(table_name: Optional[str] = None):
+    """Return the DynamoDB Table for DATA_TABLE (or table_name), built once"""
+    table_name = table_name or os.environ['DATA_TABLE']
+    table = _tables.get(table_name)
+    if table is None:
+        table = get_resource('dynamodb').Table(table_name)
+        _tables[table_name] = table
+    return table
+
+
+def get_mediaconvert_client():
+    """MediaConvert needs the account-specific endpoint from MEDIACONVERT_ENDPOINT"""
+    endpoint_url = os.environ.get('MEDIACONVERT_ENDPOINT', 'https://mediaconvert.us-east-1.amazonaws.com')
+    return get_client('mediaconvert', endpoint_url=endpoint_url)
+
+
+def reset() -> None:
+    """Drop every cached client (for tests and benchmarks)"""
+    global _session
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+        _session = None
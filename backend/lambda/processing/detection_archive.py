@@ -0,0 +1,285 @@
+"""Compressed columnar archive of a video's detections in S3
+
+Dense footage produces far more detections than are ever read one at a
+time, so with ``DETECTION_STORAGE=archive`` every detection is written to a
+single object per video instead of one DynamoDB item each:
+
+    {org_id}/detections/{video_id}/detections.bin
+
+    [row group 0: column chunks][row group 1: ...]...[footer][footer length: 8 bytes][MAGIC]
+
+Rows are grouped in timestamp order and every column of a row group is a
+separate zlib-compressed little-endian array. String columns are stored as
+uint16 codes into per-column dictionaries. The JSON footer records each
+chunk's byte range and each row group's time span, so a reader fetches only
+the chunks for the columns and time range it asks for, with ranged GETs.
+"""
+
+import json
+import sys
+import tempfile
+import zlib
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+FORMAT_VERSION = 1
+MAGIC = b'ZVDA'
+TRAILER_SIZE = 8 + len(MAGIC)
+DEFAULT_ROW_GROUP_SIZE = 10000
+COMPRESSION_LEVEL = 6
+
+# Column name -> array typecode; 'dict' columns are uint16 codes into a dictionary
+COLUMNS = {
+    'timestamp': 'q',
+    'confidence': 'd',
+    'left': 'd',
+    'top': 'd',
+    'width': 'd',
+    'height': 'd',
+    'ageBucket': 'dict',
+    'gender': 'dict',
+    'emotion': 'dict',
+    'mask': 'b',
+}
+
+
+def archive_key(org_id: str, video_id: str) -> str:
+    return f"{org_id}/detections/{video_id}/detections.bin"
+
+
+def _encode(values: array) -> bytes:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return zlib.compress(values.tobytes(), COMPRESSION_LEVEL)
+
+
+def _decode(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(zlib.decompress(data))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class DetectionArchiveWriter:
+    """Streams detections into row groups and uploads the archive on close"""
+
+    def __init__(self, s3_client, bucket: str, key: str, describe: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.describe = describe
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self.pointer: Optional[Dict[str, Any]] = None
+        # Spooled to /tmp so memory holds a single row group at a time
+        self._file = tempfile.TemporaryFile()
+        self._row_groups: List[Dict[str, Any]] = []
+        self._dictionaries: Dict[str, Dict[str, int]] = {
+            name: {} for name, typecode in COLUMNS.items() if typecode == 'dict'
+        }
+        self._columns = self._empty_columns()
+
+    def observe(self, face: Dict[str, Any]) -> None:
+        details = face.get('Face', {})
+        box = details.get('BoundingBox', {})
+        attributes = self.describe(face)
+        columns = self._columns
+        columns['timestamp'].append(int(face['Timestamp']))
+        columns['confidence'].append(float(details.get('Confidence', 0)))
+        columns['left'].append(float(box.get('Left', 0)))
+        columns['top'].append(float(box.get('Top', 0)))
+        columns['width'].append(float(box.get('Width', 0)))
+        columns['height'].append(float(box.get('Height', 0)))
+        for name, dictionary in self._dictionaries.items():
+            value = str(attributes.get(name, 'unknown'))
+            columns[name].append(dictionary.setdefault(value, len(dictionary)))
+        columns['mask'].append(1 if attributes.get('mask') else 0)
+
+        self.rows += 1
+        if len(columns['timestamp']) >= self.row_group_size:
+            self._flush_row_group()
+
+    def track(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass faces through unchanged while archiving them"""
+        for face in faces:
+            self.observe(face)
+            yield face
+
+    def close(self) -> Dict[str, Any]:
+        """Write the footer, upload the archive and return its pointer"""
+        try:
+            self._flush_row_group()
+            footer = zlib.compress(json.dumps({
+                'version': FORMAT_VERSION,
+                'rows': self.rows,
+                'columns': COLUMNS,
+                'dictionaries': {name: list(dictionary) for name, dictionary in self._dictionaries.items()},
+                'rowGroups': self._row_groups,
+            }, separators=(',', ':')).encode('utf-8'), COMPRESSION_LEVEL)
+            footer_offset = self._file.tell()
+            self._file.write(footer)
+            self._file.write(len(footer).to_bytes(8, 'little'))
+            self._file.write(MAGIC)
+            size = self._file.tell()
+
+            self._file.seek(0)
+            self.s3_client.upload_fileobj(self._file, self.bucket, self.key,
+                                          ExtraArgs={'ContentType': 'application/octet-stream'})
+        finally:
+            self._file.close()
+
+        self.pointer = {
+            'bucket': self.bucket,
+            'key': self.key,
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'rowGroups': len(self._row_groups),
+            'sizeBytes': size,
+            'footerOffset': footer_offset,
+            'footerLength': len(footer),
+            'firstTimestamp': self._row_groups[0]['minTimestamp'] if self._row_groups else None,
+            'lastTimestamp': self._row_groups[-1]['maxTimestamp'] if self._row_groups else None,
+        }
+        print(f"Archived {self.rows} detections in {len(self._row_groups)} row groups "
+              f"({size} bytes) to s3://{self.bucket}/{self.key}")
+        return self.pointer
+
+    def _empty_columns(self) -> Dict[str, array]:
+        return {name: array('H' if typecode == 'dict' else typecode) for name, typecode in COLUMNS.items()}
+
+    def _flush_row_group(self) -> None:
+        timestamps = self._columns['timestamp']
+        if not timestamps:
+            return
+        chunks = {}
+        for name, values in self._columns.items():
+            data = _encode(values)
+            chunks[name] = [self._file.tell(), len(data)]
+            self._file.write(data)
+        self._row_groups.append({
+            'rows': len(timestamps),
+            'minTimestamp': min(timestamps),
+            'maxTimestamp': max(timestamps),
+            'columns': chunks,
+        })
+        self._columns = self._empty_columns()
+
+
+class DetectionArchiveReader:
+    """Loads selected columns and time ranges of an archive with ranged reads"""
+
+    def __init__(self, s3_client, bucket: str, key: str, footer: Optional[Dict[str, Any]] = None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.requests = 0
+        self.bytes_read = 0
+        self._footer = footer
+        self._last_content_range = ''
+
+    @classmethod
+    def from_pointer(cls, s3_client, pointer: Dict[str, Any]) -> 'DetectionArchiveReader':
+        """Reader for a stored pointer; its footer range saves the trailer read"""
+        reader = cls(s3_client, pointer['bucket'], pointer['key'])
+        offset = int(pointer['footerOffset'])
+        reader._footer = reader._load_footer(offset, int(pointer['footerLength']))
+        return reader
+
+    @property
+    def footer(self) -> Dict[str, Any]:
+        if self._footer is None:
+            trailer = self._read_range(f"bytes=-{TRAILER_SIZE}")
+            if trailer[8:] != MAGIC:
+                raise ValueError(f"s3://{self.bucket}/{self.key} is not a detection archive")
+            length = int.from_bytes(trailer[:8], 'little')
+            size = int(self._last_content_range.rsplit('/', 1)[1])
+            self._footer = self._load_footer(size - TRAILER_SIZE - length, length)
+        return self._footer
+
+    def read(self, columns: Optional[List[str]] = None, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> Dict[str, List[Any]]:
+        """Column name -> values for detections with start_ms <= timestamp <= end_ms"""
+        footer = self.footer
+        wanted = list(columns or footer['columns'])
+        unknown = [name for name in wanted if name not in footer['columns']]
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {', '.join(unknown)}")
+
+        # Timestamps are needed to trim the edge row groups to the exact range
+        needed = wanted if 'timestamp' in wanted or (start_ms is None and end_ms is None) else ['timestamp'] + wanted
+        result: Dict[str, List[Any]] = {name: [] for name in wanted}
+
+        for row_group in footer['rowGroups']:
+            if start_ms is not None and row_group['maxTimestamp'] < start_ms:
+                continue
+            if end_ms is not None and row_group['minTimestamp'] > end_ms:
+                continue
+
+            values = self._read_row_group(row_group, needed)
+            keep = None
+            if start_ms is not None or end_ms is not None:
+                keep = [
+                    index for index, timestamp in enumerate(values['timestamp'])
+                    if (start_ms is None or timestamp >= start_ms) and (end_ms is None or timestamp <= end_ms)
+                ]
+            for name in wanted:
+                column = values[name]
+                result[name].extend(column if keep is None else [column[index] for index in keep])
+
+        return result
+
+    def rows(self, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Every detection as a column name -> value dict, one row group in memory at a time"""
+        wanted = list(columns or self.footer['columns'])
+        for row_group in self.footer['rowGroups']:
+            values = self._read_row_group(row_group, wanted)
+            for index in range(row_group['rows']):
+                yield {name: values[name][index] for name in wanted}
+
+    def _read_row_group(self, row_group: Dict[str, Any], names: List[str]) -> Dict[str, List[Any]]:
+        footer = self.footer
+        chunks = sorted((row_group['columns'][name][0], row_group['columns'][name][1], name) for name in names)
+
+        values: Dict[str, List[Any]] = {}
+        for start, end, members in self._coalesce(chunks):
+            data = self._read_range(f"bytes={start}-{end - 1}")
+            for offset, length, name in members:
+                typecode = footer['columns'][name]
+                column = _decode('H' if typecode == 'dict' else typecode, data[offset - start:offset - start + length])
+                if typecode == 'dict':
+                    dictionary = footer['dictionaries'][name]
+                    values[name] = [dictionary[code] for code in column]
+                elif typecode == 'b':
+                    values[name] = [bool(flag) for flag in column]
+                else:
+                    values[name] = column.tolist()
+        return values
+
+    @staticmethod
+    def _coalesce(chunks: List[Tuple[int, int, str]]) -> List[Tuple[int, int, List[Tuple[int, int, str]]]]:
+        # Adjacent chunks of the same row group are fetched with one request
+        ranges: List[Tuple[int, int, List[Tuple[int, int, str]]]] = []
+        for offset, length, name in chunks:
+            if ranges and ranges[-1][1] == offset:
+                start, _, members = ranges[-1]
+                ranges[-1] = (start, offset + length, members + [(offset, length, name)])
+            else:
+                ranges.append((offset, offset + length, [(offset, length, name)]))
+        return ranges
+
+    def _load_footer(self, offset: int, length: int) -> Dict[str, Any]:
+        footer = json.loads(zlib.decompress(self._read_range(f"bytes={offset}-{offset + length - 1}")))
+        if footer.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported detection archive version {footer.get('version')}")
+        return footer
+
+    def _read_range(self, byte_range: str) -> bytes:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=byte_range)
+        self._last_content_range = response.get('ContentRange', '')
+        data = response['Body'].read()
+        self.requests += 1
+        self.bytes_read += len(data)
+        return data
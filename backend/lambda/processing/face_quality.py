@@ -0,0 +1,35 @@
+"""How good a single face detection is as a picture of that face
+
+One score serves every place that picks between detections: the temporal
+sampler, a track's best frame, the summary's best frames and the thumbnail
+frame ranking, so they all agree on which detections are best.
+"""
+
+import math
+from typing import Any, Dict
+
+# Faces touching the frame border are usually cut off
+EDGE_MARGIN = 0.02
+EDGE_PENALTY = 0.6
+IDEAL_BRIGHTNESS = 55.0
+
+
+def touches_edge(box: Dict[str, float]) -> bool:
+    left = box.get('Left', 0)
+    top = box.get('Top', 0)
+    return (left < EDGE_MARGIN or top < EDGE_MARGIN or
+            left + box.get('Width', 0) > 1 - EDGE_MARGIN or top + box.get('Height', 0) > 1 - EDGE_MARGIN)
+
+
+def face_quality(face: Dict[str, Any]) -> float:
+    """Confident, sharp, large, well-exposed and fully in frame scores highest"""
+    details = face.get('Face', {})
+    box = details.get('BoundingBox', {})
+    quality = details.get('Quality', {})
+    return (
+        details.get('Confidence', 0) / 100
+        * (0.5 + quality.get('Sharpness', 50.0) / 200)
+        * math.sqrt(box.get('Width', 0) * box.get('Height', 0))
+        * (1 - min(abs(quality.get('Brightness', IDEAL_BRIGHTNESS) - IDEAL_BRIGHTNESS) / 100, 0.5))
+        * (EDGE_PENALTY if touches_edge(box) else 1.0)
+    )
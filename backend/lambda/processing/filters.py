@@ -0,0 +1,102 @@
+"""Pluggable detection filters applied ahead of persistence"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from face_quality import face_quality
+
+DEFAULT_SAMPLE_GRID = 4
+
+
+@dataclass
+class FilterStats:
+    kept: int = 0
+    dropped: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.kept + self.dropped
+        return {
+            'kept': self.kept,
+            'dropped': self.dropped,
+            'dropRatio': round(self.dropped / total, 3) if total else 0,
+        }
+
+
+class DetectionFilter:
+    """Base class for stream filters over timestamp-sorted Rekognition faces
+
+    Subclasses implement ``filter`` and must preserve timestamp order so that
+    downstream stages (tracking, writers) can keep consuming a sorted stream.
+    """
+
+    name = 'filter'
+
+    def __init__(self):
+        self.stats = FilterStats()
+
+    def filter(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def __call__(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        return self.filter(faces)
+
+
+class TemporalSampler(DetectionFilter):
+    """Keep at most one detection per face region per time window
+
+    Regions are cells of a ``grid`` x ``grid`` split of the frame, keyed on the
+    bounding-box centre. Within each window the highest-quality detection per
+    region wins; a window is flushed as soon as the stream moves past it.
+    """
+
+    name = 'temporal_sampler'
+
+    def __init__(self, window_seconds: float, grid: int = DEFAULT_SAMPLE_GRID):
+        super().__init__()
+        self.window_ms = max(1, int(window_seconds * 1000))
+        self.grid = max(1, grid)
+
+    def region(self, face: Dict[str, Any]) -> Tuple[int, int]:
+        box = face.get('Face', {}).get('BoundingBox', {})
+        center_x = box.get('Left', 0) + box.get('Width', 0) / 2
+        center_y = box.get('Top', 0) + box.get('Height', 0) / 2
+        last_cell = self.grid - 1
+        return (
+            min(last_cell, max(0, int(center_x * self.grid))),
+            min(last_cell, max(0, int(center_y * self.grid)))
+        )
+
+    def filter(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        window = None
+        best: Dict[Tuple[int, int], Tuple[float, Dict[str, Any]]] = {}
+
+        for face in faces:
+            face_window = face['Timestamp'] // self.window_ms
+            if face_window != window:
+                yield from self._flush(best)
+                window = face_window
+
+            region = self.region(face)
+            score = face_quality(face)
+            current = best.get(region)
+            if current is None:
+                best[region] = (score, face)
+            else:
+                self.stats.dropped += 1
+                if score > current[0]:
+                    best[region] = (score, face)
+
+        yield from self._flush(best)
+
+    def _flush(self, best: Dict[Tuple[int, int], Tuple[float, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        kept = sorted((face for _, face in best.values()), key=lambda face: face['Timestamp'])
+        best.clear()
+        self.stats.kept += len(kept)
+        yield from kept
+
+
+def apply_filters(faces: Iterable[Dict[str, Any]], filters: List[DetectionFilter]) -> Iterator[Dict[str, Any]]:
+    """Chain filters lazily in order"""
+    for detection_filter in filters:
+        faces = detection_filter(faces)
+    return iter(faces)
@@ -0,0 +1,169 @@
+"""Rank candidate thumbnail frames by scoring every detection in one pass
+
+Each detection is scored as it streams through and folded into its frame's
+best score, score total and face count; pages arrive in timestamp order, so
+a frame is complete once the timestamp moves on. Memory is bounded by the
+number of frames, not detections. The per-frame scores are then computed
+once over those columns: with numpy as a vectorized pass, otherwise with an
+equivalent pure-Python loop.
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the pure-Python path gives the same scores
+    np = None
+
+from face_quality import face_quality
+
+DEFAULT_ALTERNATES = 3
+# Alternates closer than this to an already chosen frame add little variety
+DEFAULT_MIN_GAP_MS = 2000
+
+# Scrub-preview frames are ranked by how many faces fall within this window around them
+DEFAULT_DENSITY_WINDOW_MS = 5000
+# Each preview frame is a one-second clip, so frames closer than that would overlap
+MIN_DENSE_GAP_MS = 1000
+
+# Frame score blends the best face with the average face, then rewards more faces
+BEST_FACE_WEIGHT = 0.7
+FACE_COUNT_WEIGHT = 0.15
+
+
+def ranked(values: List[float], timestamps: List[int]) -> Iterable[int]:
+    """Frame indexes by descending value, earlier frames first on ties"""
+    if np is not None:
+        # Avoids a key tuple per frame on long videos
+        return np.lexsort((np.asarray(timestamps), -np.asarray(values))).tolist()
+    return sorted(range(len(values)), key=lambda index: (-values[index], timestamps[index]))
+
+
+class FrameScorer:
+    """Folds detections into per-frame columns and ranks the frames"""
+
+    def __init__(self, min_gap_ms: int = DEFAULT_MIN_GAP_MS):
+        self.min_gap_ms = min_gap_ms
+        self.face_count = 0
+        self.timestamps = array('q')
+        self.best = array('d')
+        self.totals = array('d')
+        self.counts = array('q')
+        self._frame: Optional[List[Any]] = None
+        self._scores: Optional[Tuple[List[int], List[float], List[int]]] = None
+
+    def __len__(self) -> int:
+        return self.face_count
+
+    def observe(self, face: Dict[str, Any]) -> None:
+        timestamp = int(face.get('Timestamp', 0))
+        score = face_quality(face)
+        self.face_count += 1
+        self._scores = None
+        frame = self._frame
+        if frame is not None and frame[0] == timestamp:
+            frame[1] = max(frame[1], score)
+            frame[2] += score
+            frame[3] += 1
+            return
+        self._close_frame()
+        self._frame = [timestamp, score, score, 1]
+
+    def _close_frame(self) -> None:
+        if self._frame is None:
+            return
+        timestamp, best, total, count = self._frame
+        self.timestamps.append(timestamp)
+        self.best.append(best)
+        self.totals.append(total)
+        self.counts.append(count)
+        self._frame = None
+
+    def track(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass faces through unchanged while folding them into their frames"""
+        for face in faces:
+            self.observe(face)
+            yield face
+
+    def frame_scores(self) -> Tuple[List[int], List[float], List[int]]:
+        """Per-frame timestamps, scores and face counts, in timestamp order; computed once"""
+        if self._scores is None:
+            self._close_frame()
+            if not self.timestamps:
+                self._scores = ([], [], [])
+            elif np is not None:
+                self._scores = self._frame_scores_numpy()
+            else:
+                self._scores = self._frame_scores_python()
+        return self._scores
+
+    def best_frames(self, count: int = 1 + DEFAULT_ALTERNATES) -> List[Dict[str, Any]]:
+        """The best frame first, then alternates at least min_gap_ms apart"""
+        timestamps, scores, face_counts = self.frame_scores()
+        chosen: List[int] = []
+        for index in ranked(scores, timestamps):
+            if len(chosen) >= count:
+                break
+            if all(abs(timestamps[index] - timestamps[other]) >= self.min_gap_ms for other in chosen):
+                chosen.append(index)
+
+        return [
+            {
+                'timestamp': timestamps[index],
+                'score': round(scores[index], 4),
+                'faceCount': face_counts[index]
+            }
+            for index in chosen
+        ]
+
+    def dense_frames(self, count: int, window_ms: int = DEFAULT_DENSITY_WINDOW_MS,
+                     min_gap_ms: int = MIN_DENSE_GAP_MS) -> List[int]:
+        """Timestamps of the most detection-dense frames, in timestamp order
+
+        A frame's density is the number of faces detected within ``window_ms``
+        centred on it; the densest frames at least ``min_gap_ms`` apart win.
+        """
+        timestamps, _, face_counts = self.frame_scores()
+        if not timestamps:
+            return []
+        densities = self._densities(timestamps, face_counts, window_ms / 2)
+        chosen: List[int] = []
+        for index in ranked(densities, timestamps):
+            if len(chosen) >= count:
+                break
+            if all(abs(timestamps[index] - other) >= min_gap_ms for other in chosen):
+                chosen.append(timestamps[index])
+        return sorted(chosen)
+
+    def _densities(self, timestamps: List[int], face_counts: List[int], half_window: float) -> List[int]:
+        if np is not None:
+            frame_times = np.asarray(timestamps, dtype=np.int64)
+            cumulative = np.r_[0, np.cumsum(face_counts)]
+            lower = np.searchsorted(frame_times, frame_times - half_window, side='left')
+            upper = np.searchsorted(frame_times, frame_times + half_window, side='right')
+            return (cumulative[upper] - cumulative[lower]).tolist()
+
+        cumulative = [0]
+        for face_count in face_counts:
+            cumulative.append(cumulative[-1] + face_count)
+        return [
+            cumulative[bisect_right(timestamps, timestamp + half_window)] - cumulative[bisect_left(timestamps, timestamp - half_window)]
+            for timestamp in timestamps
+        ]
+
+    def _frame_scores_numpy(self) -> Tuple[List[int], List[float], List[int]]:
+        counts = np.frombuffer(self.counts, dtype=np.int64)
+        best = np.frombuffer(self.best, dtype=np.float64)
+        mean = np.frombuffer(self.totals, dtype=np.float64) / counts
+        scores = (BEST_FACE_WEIGHT * best + (1 - BEST_FACE_WEIGHT) * mean) * (1 + FACE_COUNT_WEIGHT * np.log(counts))
+        return self.timestamps.tolist(), scores.tolist(), counts.tolist()
+
+    def _frame_scores_python(self) -> Tuple[List[int], List[float], List[int]]:
+        scores = [
+            (BEST_FACE_WEIGHT * best + (1 - BEST_FACE_WEIGHT) * total / count) * (1 + FACE_COUNT_WEIGHT * math.log(count))
+            for best, total, count in zip(self.best, self.totals, self.counts)
+        ]
+        return self.timestamps.tolist(), scores, self.counts.tolist()
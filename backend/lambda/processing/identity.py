@@ -0,0 +1,62 @@
+"""Deterministic identifiers for detections and people
+
+IDs are derived from the video, the timestamp and the bounding box, so
+reprocessing the same Rekognition results rewrites the same items instead of
+adding new ones.
+"""
+
+import hashlib
+import uuid
+from typing import Dict, Optional, Tuple
+
+# Fixed namespace so person IDs are stable across deployments
+PERSON_NAMESPACE = uuid.UUID('6f0d8c1e-7b5a-4d0e-9a51-2f6c3b8e4d17')
+
+# Bounding boxes are rounded so float noise cannot change an ID
+BOX_PRECISION = 4
+
+
+def detection_fingerprint(video_id: str, timestamp: int, bounding_box: Dict[str, float]) -> str:
+    # Fixed-point formatting rounds exactly as round() followed by the same format would
+    box = ','.join(
+        f"{float(bounding_box.get(side, 0)):.{BOX_PRECISION}f}"
+        for side in ('Left', 'Top', 'Width', 'Height')
+    )
+    return f"{video_id}|{timestamp}|{box}"
+
+
+def detection_ids(video_id: str, timestamp: int, bounding_box: Dict[str, float]) -> Tuple[str, str]:
+    """(detection ID, person UUID) of a detection from a single fingerprint
+
+    The detection ID is a short hash that keeps same-frame detections apart
+    in sort keys; the person UUID identifies the detection or, for a track,
+    its first detection.
+    """
+    fingerprint = detection_fingerprint(video_id, timestamp, bounding_box)
+    return (hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12],
+            str(uuid.uuid5(PERSON_NAMESPACE, fingerprint)))
+
+
+def job_request_token(org_id: str, video_id: str, attempt: int = 0) -> str:
+    """Idempotency token for starting analysis jobs (Rekognition allows [a-zA-Z0-9-_]{1,64})"""
+    source = f"{org_id}/{video_id}" if not attempt else f"{org_id}/{video_id}/{attempt}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def job_tag(org_id: str, video_id: str, attempt: int = 0) -> str:
+    """Rekognition JobTag identifying the video and analysis attempt"""
+    return f"{org_id}_{video_id}:{attempt}"
+
+
+def parse_job_tag(tag: str) -> Optional[Tuple[str, str, Optional[int]]]:
+    """(org_id, video_id, attempt) from a JobTag; attempt is None for tags without one"""
+    attempt = None
+    base, separator, suffix = tag.rpartition(':')
+    if separator and suffix.isdigit():
+        tag, attempt = base, int(suffix)
+
+    if '_' not in tag:
+        return None
+    org_id, video_id_with_ext = tag.split('_', 1)
+    # Normalize video_id (strip extension if present)
+    return org_id, video_id_with_ext.rsplit('.', 1)[0], attempt
@@ -1,170 +1,253 @@
 import json
-import boto3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional
 from decimal import Decimal
 
-# Initialize AWS clients
-rekognition = boto3.client('rekognition')
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+from boto3.dynamodb.conditions import Key
 
-def generate_thumbnail(bucket: str, video_key: str, org_id: str, video_id: str, faces_data: List[Dict[str, Any]]) -> str:
-    """Generate thumbnail from first frame with faces using AWS MediaConvert"""
+from analysis_cache import DEFAULT_TTL_DAYS, STATUS_PENDING, AnalysisCache, content_key
+from attribute_index import build_attribute_index_items, recording_start
+from batch_writer import BatchWriteError, BatchWriter, ParallelBatchWriter, WritePool, WriteStats
+from clients import get_client, get_mediaconvert_client, get_resource, get_table
+from detection_archive import DEFAULT_ROW_GROUP_SIZE, DetectionArchiveReader, DetectionArchiveWriter, archive_key
+from frame_scoring import DEFAULT_ALTERNATES, FrameScorer
+from filters import DetectionFilter, TemporalSampler, apply_filters
+from identity import detection_ids, job_request_token, job_tag, parse_job_tag
+from instrumentation import (AGGREGATION, DYNAMODB_WRITE, NORMALIZATION, REKOGNITION_START, RESULT_FETCH, S3_EVENT_PARSE,
+                             THUMBNAIL_SUBMIT, create_instrumentation)
+from ingestion import DEFAULT_PAGE_SIZE, DetectionStats, iter_face_detections
+from lifecycle import begin_analysis, begin_storing, complete_processing, fail_processing, record_progress
+from normalization import NORMALIZED_KEY, NormalizedFace, normalize_faces, normalized, to_decimal
+from profiling import create_profiler
+from progress import DEFAULT_INTERVAL_SECONDS, ProgressPublisher
+from scheduler import (DEFAULT_MAX_CONCURRENT_JOBS, DEFAULT_START_BURST, DEFAULT_START_RATE, JobScheduler,
+                       QueuedVideo)
+from sharding import DEFAULT_SHARD_COUNT, sharded_key
+from sprites import DEFAULT_COLUMNS, DEFAULT_ROWS, DEFAULT_SPRITE_FRAMES, SpriteSheetGenerator
+from summary import DEFAULT_TOP_FRAMES, VideoSummary
+from thumbnails import (DEFAULT_WINDOW_SECONDS, MAX_JOB_INPUTS, THUMBNAIL_PROCESSING, THUMBNAIL_QUEUED,
+                        ThumbnailCoalescer, frame_capture_settings, thumbnail_key)
+from tracking import FaceTrack, FaceTracker
+
+# Set while an SQS batch is processed so its records share one write pool
+_shared_write_pool: Optional[WritePool] = None
+
+# Stage timings and log sampling for the current invocation
+instrumentation = create_instrumentation()
+
+# cProfile/tracemalloc capture, on for invocations flagged with "profile": true or PROFILING_ENABLED
+profiler = create_profiler(lambda: get_client('s3'))
+
+# Org settings are cached per container to avoid a read on every job
+ORG_SETTINGS_TTL_SECONDS = 300
+_org_settings_cache: Dict[str, Any] = {}
+
+def get_org_settings(org_id: str) -> Dict[str, Any]:
+    """Fetch the processing settings stored on the ORG# record"""
+    
+    cached = _org_settings_cache.get(org_id)
+    if cached and time.monotonic() - cached[0] < ORG_SETTINGS_TTL_SECONDS:
+        return cached[1]
+    
+    settings: Dict[str, Any] = {}
+    try:
+        table = get_table()
+        response = table.get_item(
+            Key={
+                'PK': f"ORG#{org_id}",
+                'SK': f"ORG#{org_id}"
+            },
+            ProjectionExpression='processingSettings'
+        )
+        settings = response.get('Item', {}).get('processingSettings', {})
+    except Exception as e:
+        print(f"Error loading settings for org {org_id}: {e}")
+    
+    _org_settings_cache[org_id] = (time.monotonic(), settings)
+    return settings
+
+def build_detection_filters(org_id: str) -> List[DetectionFilter]:
+    """Build the filters configured for an org, falling back to the environment"""
+    
+    settings = get_org_settings(org_id)
+    filters: List[DetectionFilter] = []
     
-    if not faces_data:
+    sample_seconds = float(settings.get('detectionSampleSeconds', os.environ.get('DETECTION_SAMPLE_SECONDS', '0')))
+    if sample_seconds > 0:
+        grid = int(settings.get('detectionSampleGrid', os.environ.get('DETECTION_SAMPLE_GRID', '4')))
+        filters.append(TemporalSampler(sample_seconds, grid=grid))
+    
+    return filters
+
+# Role MediaConvert assumes to read videos and write captures
+DEFAULT_MEDIACONVERT_ROLE_ARN = 'arn:aws:iam::804857032172:role/ZentriqVisionStack-MediaConvertServiceRole08F94F4A-LiWrgvEvyiN6'
+
+def generate_thumbnail(bucket: str, video_key: str, org_id: str, video_id: str, frames: List[Dict[str, Any]],
+                       frame_rate: Optional[float] = None) -> Optional[Dict[str, str]]:
+    """Capture the best-scoring frame, plus alternates, using AWS MediaConvert
+    
+    ``frames`` comes from FrameScorer.best_frames: the chosen frame first.
+    With coalescing enabled the request is queued for a shared multi-video
+    job; otherwise a job is submitted for this video alone. Returns the
+    thumbnail key plus the status (and job id) for the completion update.
+    """
+    
+    if not frames:
         print(f"No faces detected in video {video_id}, skipping thumbnail generation")
         return None
     
     try:
-        # Find first frame with faces
-        first_face_timestamp = min(face['Timestamp'] for face in faces_data)
-        frame_number = int(first_face_timestamp / 1000)  # Convert ms to seconds
+        # Best frame was ranked by the scoring pass over all detections
+        frame_number = int(frames[0]['timestamp'] / 1000)  # Convert ms to seconds
         
-        print(f"First face detected at {frame_number} seconds for thumbnail")
+        print(f"Best frame at {frame_number} seconds (score {frames[0]['score']}) for thumbnail, "
+              f"{len(frames) - 1} alternates")
         
         # Create thumbnail key structure
-        thumbnail_key = f"{org_id}/thumbnails/{video_id}.jpg"
+        key = thumbnail_key(org_id, video_id)
+        
+        if thumbnail_coalescing_enabled():
+            create_thumbnail_coalescer(get_table()).enqueue(
+                org_id, video_id, bucket, video_key, [frame['timestamp'] for frame in frames], frame_rate
+            )
+            return {'thumbnailKey': key, 'thumbnailStatus': THUMBNAIL_QUEUED}
         
         # Use AWS MediaConvert to extract frame
         try:
-            # Use MediaConvert endpoint from environment variable
-            mediaconvert_endpoint = os.environ.get('MEDIACONVERT_ENDPOINT', 'https://mediaconvert.us-east-1.amazonaws.com')
-            
-            # Create MediaConvert client with endpoint
-            mediaconvert_client = boto3.client('mediaconvert', endpoint_url=mediaconvert_endpoint)
-            
-            # Create job for frame extraction (simplified approach)
-            job_settings = {
-                'TimecodeConfig': {
-                    'Source': 'ZEROBASED'
-                },
-                'Inputs': [{
-                    'FileInput': f"s3://{bucket}/{video_key}"
-                }],
-                'OutputGroups': [{
-                    'Name': 'File Group',
-                    'OutputGroupSettings': {
-                        'Type': 'FILE_GROUP_SETTINGS',
-                        'FileGroupSettings': {
-                            'Destination': f"s3://{bucket}/{org_id}/thumbnails/"
-                        }
-                    },
-                    'Outputs': [
-                        {
-                            'NameModifier': f"_{video_id}_video",
-                            'ContainerSettings': {
-                                'Container': 'MP4'
-                            },
-                            'VideoDescription': {
-                                'Width': 320,
-                                'Height': 240,
-                                'ScalingBehavior': 'DEFAULT',
-                                'CodecSettings': {
-                                    'Codec': 'H_264',
-                                    'H264Settings': {
-                                        'MaxBitrate': 1000000,
-                                        'RateControlMode': 'QVBR',
-                                        'QvbrSettings': {
-                                            'QvbrQualityLevel': 7
-                                        }
-                                    }
-                                }
-                            }
-                        },
-                        {
-                            'NameModifier': f"_{video_id}_frame",
-                            'ContainerSettings': {
-                                'Container': 'RAW'
-                            },
-                            'VideoDescription': {
-                                'Width': 320,
-                                'Height': 240,
-                                'ScalingBehavior': 'DEFAULT',
-                                'CodecSettings': {
-                                    'Codec': 'FRAME_CAPTURE',
-                                    'FrameCaptureSettings': {
-                                        'MaxCaptures': 1,
-                                        'Quality': 80
-                                    }
-                                }
-                            }
-                        }
-                    ]
-                }]
-            }
-            
-                        # Submit MediaConvert job
-            response = mediaconvert_client.create_job(
-                    Role='arn:aws:iam::804857032172:role/ZentriqVisionStack-MediaConvertServiceRole08F94F4A-LiWrgvEvyiN6',  # Use our custom MediaConvert role
-                    Settings=job_settings,
-                    UserMetadata={
-                        'videoId': video_id,
-                        'orgId': org_id,
-                        'frameTimestamp': str(frame_number)
-                    }
-                )
+            # One second of video per candidate frame, chosen frame first
+            clips = [{'bucket': bucket, 'key': video_key, 'timestamp': frame['timestamp'], 'frameRate': frame_rate}
+                     for frame in frames]
+            response = get_mediaconvert_client().create_job(
+                Role=os.environ.get('MEDIACONVERT_ROLE_ARN', DEFAULT_MEDIACONVERT_ROLE_ARN),
+                Settings=frame_capture_settings(clips, f"s3://{bucket}/{org_id}/thumbnails/", f"_{video_id}_frame"),
+                UserMetadata={
+                    'videoId': video_id,
+                    'orgId': org_id,
+                    'frameTimestamp': str(frame_number),
+                    'alternateTimestamps': ','.join(str(frame['timestamp']) for frame in frames[1:])
+                }
+            )
             
             job_id = response['Job']['Id']
             print(f"MediaConvert job {job_id} submitted for frame extraction")
             
-            # Store job ID in DynamoDB for tracking
-            table = dynamodb.Table(os.environ['DATA_TABLE'])
-            table.update_item(
-                Key={
-                    'PK': f"ORG#{org_id}",
-                    'SK': f"VIDEO#{video_id}"
-                },
-                UpdateExpression="SET mediaConvertJobId = :jobId, thumbnailStatus = :status",
-                ExpressionAttributeValues={
-                    ':jobId': job_id,
-                    ':status': 'processing'
-                }
-            )
-            
             # For now, return the expected thumbnail key
             # The actual thumbnail will be generated asynchronously by MediaConvert
-            return thumbnail_key
+            return {'thumbnailKey': key, 'thumbnailStatus': THUMBNAIL_PROCESSING, 'mediaConvertJobId': job_id}
             
         except Exception as e:
             print(f"MediaConvert error: {e}")
             # Fallback: return placeholder for now
-            return thumbnail_key
+            return {'thumbnailKey': key}
                 
     except Exception as e:
         print(f"Error in thumbnail generation: {e}")
         return None
 
+def thumbnail_coalescing_enabled() -> bool:
+    return os.environ.get('THUMBNAIL_COALESCING_ENABLED', 'true').lower() == 'true'
+
+def create_thumbnail_coalescer(table) -> ThumbnailCoalescer:
+    return ThumbnailCoalescer(
+        table,
+        get_mediaconvert_client,
+        lambda: get_client('s3'),
+        os.environ.get('MEDIACONVERT_ROLE_ARN', DEFAULT_MEDIACONVERT_ROLE_ARN),
+        window_seconds=int(os.environ.get('THUMBNAIL_BATCH_WINDOW_SECONDS', str(DEFAULT_WINDOW_SECONDS))),
+        max_inputs=int(os.environ.get('THUMBNAIL_BATCH_MAX_INPUTS', str(MAX_JOB_INPUTS)))
+    )
+
+def flush_thumbnail_requests(force: bool = False):
+    """Submit queued thumbnail requests if the batch window has closed"""
+    
+    try:
+        create_thumbnail_coalescer(get_table()).flush(force=force)
+    except Exception as e:
+        # Requests stay queued for the next flush
+        print(f"Error flushing thumbnail requests: {e}")
+
+def sprite_sheets_enabled() -> bool:
+    # Opt-in: each video's sprite sheets are their own MediaConvert job, outside thumbnail coalescing
+    return os.environ.get('SPRITE_SHEETS_ENABLED', 'false').lower() == 'true'
+
+def create_sprite_generator(table) -> SpriteSheetGenerator:
+    return SpriteSheetGenerator(
+        table,
+        get_mediaconvert_client,
+        lambda: get_client('s3'),
+        os.environ.get('MEDIACONVERT_ROLE_ARN', DEFAULT_MEDIACONVERT_ROLE_ARN),
+        columns=int(os.environ.get('SPRITE_COLUMNS', str(DEFAULT_COLUMNS))),
+        rows=int(os.environ.get('SPRITE_ROWS', str(DEFAULT_ROWS)))
+    )
+
+def generate_sprite_sheets(table, bucket: str, video_key: str, org_id: str, video_id: str, frame_scorer: FrameScorer,
+                           frame_rate: Optional[float] = None):
+    """Start the scrub-preview sprite job over the video's detection-dense frames"""
+    
+    timestamps = frame_scorer.dense_frames(int(os.environ.get('SPRITE_FRAMES', str(DEFAULT_SPRITE_FRAMES))))
+    if not timestamps:
+        return
+    try:
+        create_sprite_generator(table).submit(org_id, video_id, bucket, video_key, timestamps, frame_rate)
+    except Exception as e:
+        # Playback works without a scrub preview
+        print(f"Error starting sprite sheets for video {video_id}: {e}")
+
+def process_mediaconvert_event(event) -> Dict[str, Any]:
+    """Finish a thumbnail batch or sprite job when MediaConvert reports its state"""
+    
+    detail = event.get('detail', {})
+    if 'spriteVideoId' in detail.get('userMetadata', {}):
+        updated = 1 if create_sprite_generator(get_table()).complete(detail) else 0
+    else:
+        updated = create_thumbnail_coalescer(get_table()).complete(detail)
+    return {"statusCode": 200, "body": json.dumps({"videosUpdated": updated})}
+
 def handler(event, context):
-    """Main handler that routes events to appropriate functions"""
+    """Main handler that routes events to appropriate functions
+    
+    Independent records are processed concurrently (HANDLER_MAX_WORKERS) and
+    each record's outcome is reported separately. SQS batches wrapping S3 or
+    SNS payloads are answered with batchItemFailures. Stage timings are
+    written as EMF metrics when the invocation ends. Results processing is
+    profiled when the event, an SQS message or an SNS message carries
+    ``"profile": true``, or when PROFILING_ENABLED is set.
+    """
+    
+    instrumentation.begin(context)
+    profiler.begin(event, context)
+    try:
+        return route_event(event, context)
+    finally:
+        instrumentation.flush()
+
+def route_event(event, context):
+    """Dispatch an invocation's event by source"""
 
-    print(f"Processing event: {json.dumps(event)}")
+    # Whole events are only serialized for sampled invocations
+    instrumentation.log("Processing event", event=event)
+
+    # EventBridge schedule for the Rekognition job scheduler and thumbnail batches
+    if event and event.get('source') == 'aws.events':
+        flush_thumbnail_requests()
+        return run_scheduled_dispatch()
+
+    # MediaConvert job state changes for coalesced thumbnail jobs
+    if event and event.get('source') == 'aws.mediaconvert':
+        return process_mediaconvert_event(event)
 
     if not event or 'Records' not in event:
         return {"statusCode": 400, "body": json.dumps("Invalid event: missing Records")}
 
-    processed_count = 0
-    errors: List[str] = []
+    if event['Records'] and all(record.get('eventSource') == 'aws:sqs' for record in event['Records']):
+        return process_sqs_batch(event, context)
 
-    # Route each record individually; do not return early
-    for record in event['Records']:
-        try:
-            if record.get('EventSource') == 'aws:sns' or record.get('EventSource') == 'aws:sns':
-                print("Routing to Rekognition results processing (SNS)")
-                process_rekognition_results({"Records": [record]}, context)
-                processed_count += 1
-            elif 's3' in record:
-                print("Routing to S3 video processing")
-                process_s3_video_upload({"Records": [record]}, context)
-                processed_count += 1
-            else:
-                print(f"Unknown event type structure: {json.dumps(record)}")
-        except Exception as e:
-            print(f"Error processing record: {e}")
-            errors.append(str(e))
+    outcomes = process_records(event['Records'], context)
+    processed_count = sum(1 for outcome in outcomes if outcome['status'] == 'processed')
+    errors = [outcome['error'] for outcome in outcomes if outcome['status'] == 'error']
 
     status_code = 200 if processed_count > 0 and not errors else 500 if errors and processed_count == 0 else 207
     return {
@@ -172,101 +255,159 @@ def handler(event, context):
         "body": json.dumps({
             "processedRecords": processed_count,
             "errors": errors,
+            "records": outcomes,
         }),
     }
 
+def process_records(records: List[Dict[str, Any]], context) -> List[Dict[str, Any]]:
+    """Run process_record over independent records on a bounded thread pool"""
+    
+    max_workers = min(int(os.environ.get('HANDLER_MAX_WORKERS', '4')), len(records))
+    if max_workers <= 1:
+        return [process_record(index, record, context) for index, record in enumerate(records)]
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='record') as executor:
+        return list(executor.map(lambda indexed: process_record(indexed[0], indexed[1], context), enumerate(records)))
+
+def process_sqs_batch(event, context) -> Dict[str, Any]:
+    """Process an SQS batch together and report only the failed messages for retry"""
+    
+    global _shared_write_pool
+    
+    # Unwrap every message into the S3/SNS records it carries
+    inner_records: List[Dict[str, Any]] = []
+    owners: List[str] = []
+    failed_message_ids: List[str] = []
+    for message in event['Records']:
+        try:
+            unwrapped = unwrap_sqs_message(message)
+        except Exception as e:
+            print(f"Error parsing SQS message {message.get('messageId')}: {e}")
+            failed_message_ids.append(message['messageId'])
+            continue
+        inner_records.extend(unwrapped)
+        owners.extend(message['messageId'] for _ in unwrapped)
+    
+    # One write pool for the whole batch instead of one per record
+    max_workers = int(os.environ.get('DETECTION_WRITE_WORKERS', '4'))
+    max_in_flight = int(os.environ.get('DETECTION_WRITE_MAX_IN_FLIGHT', str(max_workers * 2)))
+    with WritePool(max_workers, max_in_flight) as pool:
+        _shared_write_pool = pool
+        try:
+            outcomes = process_records(inner_records, context)
+        finally:
+            _shared_write_pool = None
+    
+    for message_id, outcome in zip(owners, outcomes):
+        if outcome['status'] == 'error' and message_id not in failed_message_ids:
+            failed_message_ids.append(message_id)
+    
+    print(f"Processed SQS batch: {len(event['Records'])} messages, {len(inner_records)} records, "
+          f"{len(failed_message_ids)} failed")
+    return {
+        "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_message_ids]
+    }
+
+def unwrap_sqs_message(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn one SQS message into the S3 or SNS records the handler understands
+    
+    Bodies may be an S3 notification, an SNS envelope (carrying an S3
+    notification or a Rekognition completion) or a raw Rekognition message.
+    """
+    
+    body = json.loads(message['body'])
+    
+    if body.get('Type') == 'Notification' and 'Message' in body:
+        inner = json.loads(body['Message'])
+        if 'Records' not in inner:
+            return [{'EventSource': 'aws:sns', 'Sns': {'Message': body['Message']}}]
+        body = inner
+    
+    if 'Records' in body:
+        return [record for record in body['Records'] if 's3' in record]
+    
+    if 'JobId' in body:
+        return [{'EventSource': 'aws:sns', 'Sns': {'Message': message['body']}}]
+    
+    # s3:TestEvent and anything else carries nothing to process
+    print(f"Ignoring SQS message {message.get('messageId')} without S3 or Rekognition payload")
+    return []
+
+def process_record(index: int, record: Dict[str, Any], context) -> Dict[str, Any]:
+    """Route one record and capture its outcome without affecting the others"""
+    
+    started = time.monotonic()
+    outcome: Dict[str, Any] = {'index': index}
+    try:
+        if record.get('EventSource') == 'aws:sns':
+            instrumentation.log("Routing record to Rekognition results processing", record=index)
+            outcome['type'] = 'rekognition-results'
+            with profiler.section('process_rekognition_results'):
+                process_rekognition_results({"Records": [record]}, context)
+            outcome['status'] = 'processed'
+        elif 's3' in record:
+            instrumentation.log("Routing record to S3 video processing", record=index)
+            outcome['type'] = 's3-upload'
+            outcome['key'] = record['s3'].get('object', {}).get('key')
+            process_s3_video_upload({"Records": [record]}, context)
+            outcome['status'] = 'processed'
+        else:
+            print(f"Unknown event type structure: {json.dumps(record)}")
+            outcome['status'] = 'skipped'
+    except Exception as e:
+        print(f"Error processing record {index}: {e}")
+        outcome['status'] = 'error'
+        outcome['error'] = str(e)
+    
+    outcome['durationMs'] = int((time.monotonic() - started) * 1000)
+    return outcome
+
 def process_s3_video_upload(event, context):
     """Process uploaded video using AWS Rekognition"""
     
     # Parse S3 event
     for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        key = record['s3']['object']['key']
+        with instrumentation.stage(S3_EVENT_PARSE):
+            bucket = record['s3']['bucket']['name']
+            key = record['s3']['object']['key']
+            
+            # Extract video metadata from S3 key
+            parts = key.split('/')
+            if len(parts) >= 3:
+                org_id = parts[1]  # videos/default-org/video_id/filename
+                video_id = parts[2]
+            else:
+                print(f"Invalid key format: {key}")
+                continue
+            
+            # Check if this is a video file
+            video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.quicktime']
+            file_extension = os.path.splitext(parts[-1])[1].lower()
+            if file_extension not in video_extensions:
+                print(f"Skipping non-video file: {key} (extension: {file_extension})")
+                continue
+            
+            # Identical content can reuse an earlier analysis
+            cache_key = content_key(record['s3']['object']) if analysis_cache_enabled() else None
         
-        # Extract video metadata from S3 key
-        parts = key.split('/')
-        if len(parts) >= 3:
-            org_id = parts[1]  # videos/default-org/video_id/filename
-            video_id = parts[2]
-        else:
-            print(f"Invalid key format: {key}")
-            continue
+        print(f"Processing video {video_id} for org {org_id}")
         
-        # Check if this is a video file
-        video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.quicktime']
-        file_extension = os.path.splitext(parts[-1])[1].lower()
-        if file_extension not in video_extensions:
-            print(f"Skipping non-video file: {key} (extension: {file_extension})")
+        # Claim the video for analysis; S3 redeliveries lose the condition
+        table = get_table()
+        attempt = begin_analysis(table, org_id, video_id, key, {'analysisCacheKey': cache_key} if cache_key else None)
+        if attempt is None:
+            print(f"Video {video_id} is already being analyzed; ignoring duplicate delivery")
             continue
         
-        print(f"Processing video {video_id} for org {org_id}")
-        
-        # Update video status to PROCESSING and store video key
-        table = dynamodb.Table(os.environ['DATA_TABLE'])
-        table.update_item(
-            Key={
-                'PK': f"ORG#{org_id}",
-                'SK': f"VIDEO#{video_id}"
-            },
-            UpdateExpression="SET #status = :status, processingStartedAt = :timestamp, videoKey = :videoKey",
-            ExpressionAttributeNames={
-                '#status': 'status'
-            },
-            ExpressionAttributeValues={
-                ':status': 'PROCESSING',
-                ':timestamp': datetime.utcnow().isoformat(),
-                ':videoKey': key
-            }
-        )
+        if cache_key:
+            try:
+                if reuse_cached_analysis(table, org_id, video_id, cache_key):
+                    continue
+            except Exception as e:
+                # A cache failure should never block a fresh analysis
+                print(f"Analysis cache error for video {video_id}: {e}")
         
-        # Start Rekognition Video analysis
-        try:
-            response = rekognition.start_face_detection(
-                Video={
-                    'S3Object': {
-                        'Bucket': bucket,
-                        'Name': key
-                    }
-                },
-                NotificationChannel={
-                    'SNSTopicArn': os.environ['SNS_TOPIC_ARN'],
-                    'RoleArn': os.environ['REKOGNITION_ROLE_ARN']
-                },
-                JobTag=f"{org_id}_{video_id}",
-                FaceAttributes='ALL'
-            )
-            
-            # Store Rekognition job ID
-            table.update_item(
-                Key={
-                    'PK': f"ORG#{org_id}",
-                    'SK': f"VIDEO#{video_id}"
-                },
-                UpdateExpression="SET rekognitionJobId = :jobId",
-                ExpressionAttributeValues={
-                    ':jobId': response['JobId']
-                }
-            )
-            
-            print(f"Started Rekognition job {response['JobId']} for video {video_id}")
-            
-        except Exception as e:
-            print(f"Error starting Rekognition job: {e}")
-            # Update status to ERROR
-            table.update_item(
-                Key={
-                    'PK': f"ORG#{org_id}",
-                    'SK': f"VIDEO#{video_id}"
-                },
-                UpdateExpression="SET #status = :status, errorMessage = :error",
-                ExpressionAttributeNames={
-                    '#status': 'status'
-                },
-                ExpressionAttributeValues={
-                    ':status': 'ERROR',
-                    ':error': str(e)
-                }
-            )
+        submit_analysis(table, QueuedVideo(org_id, video_id, bucket, key, attempt))
     
     return {
         'statusCode': 200,
@@ -276,7 +417,7 @@ def process_s3_video_upload(event, context):
 def process_rekognition_results(event, context):
     """Process Rekognition results and store in DynamoDB"""
     
-    print(f"Processing Rekognition results: {json.dumps(event)}")
+    instrumentation.log("Processing Rekognition results", event=event)
     
     # Parse SNS message
     if not event or 'Records' not in event:
@@ -298,165 +439,649 @@ def process_rekognition_results(event, context):
             print(f"SNS message missing required fields: {sns_message}")
             continue
         
-        # Extract org_id and video_id from job tag
-        job_tag = sns_message.get('JobTag', '')
-        if '_' not in job_tag:
-            print(f"Invalid job tag: {job_tag}")
+        # Extract org_id, video_id and the analysis attempt from the job tag
+        tag = sns_message.get('JobTag', '')
+        parsed_tag = parse_job_tag(tag)
+        if parsed_tag is None:
+            print(f"Invalid job tag: {tag}")
             continue
-        org_id, video_id_with_ext = job_tag.split('_', 1)
-        # Normalize video_id (strip extension if present)
-        video_id = video_id_with_ext.rsplit('.', 1)[0]
+        org_id, video_id, attempt = parsed_tag
         
-        table = dynamodb.Table(os.environ['DATA_TABLE'])
+        table = get_table()
+        
+        # The finished job frees its Rekognition slot for the next queued video
+        if attempt is not None and scheduler_enabled():
+            release_analysis_slot(table, org_id, video_id, attempt)
         
         if status == 'SUCCEEDED':
-            # Get Rekognition results
+            # Claim the results; SNS redeliveries and superseded jobs lose the condition
+            video_info = begin_storing(table, org_id, video_id, job_id, attempt)
+            if video_info is None:
+                print(f"Results for video {video_id} already stored, in progress or superseded; ignoring job {job_id}")
+                continue
+            cache_key = video_info.get('analysisCacheKey')
+            
+            # Stream Rekognition results page by page
             try:
-                response = rekognition.get_face_detection(JobId=job_id)
+                stats = DetectionStats()
+                video_summary = VideoSummary(top_frames=int(os.environ.get('SUMMARY_TOP_FRAMES', str(DEFAULT_TOP_FRAMES))))
+                frame_scorer = FrameScorer()
+                
+                # Drop redundant detections before they reach the writers
+                detection_filters = build_detection_filters(org_id)
+                
+                # Stored detections are published page by page while the rest are fetched
+                progress = None
+                if progressive_results_enabled() and detection_storage() != 'archive':
+                    progress = create_progress_publisher(table, org_id, video_id, detection_filters)
+                
+                def on_page(response: Dict[str, Any]):
+                    stats.observe_page(response)
+                    if progress:
+                        progress.page_done(response)
+                
+                detections = instrumentation.timed(iter_face_detections(get_client('rekognition'), job_id, on_page=on_page),
+                                                   RESULT_FETCH)
+                faces = frame_scorer.track(video_summary.track(stats.track(detections)))
+                faces = apply_filters(faces, detection_filters)
+                
+                # Dense footage can keep its detections in one S3 archive instead of per-item
+                archive = create_detection_archive(org_id, video_id) if detection_storage() == 'archive' else None
                 
                 # Process and store results
-                process_face_detections(org_id, video_id, response.get('Faces', []))
+                with profiler.section('process_face_detections', video_id):
+                    process_face_detections(org_id, video_id, faces, summary=video_summary, archive=archive,
+                                            progress=progress, recorded_at=recording_start(video_info))
+                print(f"Ingested {stats.face_count} faces across {stats.frame_count} frames for video {video_id}")
+                if progress:
+                    print(f"Published {progress.updates} progress updates for video {video_id}")
+                for detection_filter in detection_filters:
+                    print(f"Filter {detection_filter.name} for video {video_id}: {json.dumps(detection_filter.stats.summary())}")
                 
-                # Get video info from DynamoDB to get bucket and key
-                video_item = table.get_item(
-                    Key={
-                        'PK': f"ORG#{org_id}",
-                        'SK': f"VIDEO#{video_id}"
-                    }
-                )
+                bucket = os.environ['VIDEO_BUCKET']
+                video_key = video_info.get('videoKey', f"{org_id}/videos/{video_id}.mp4")
                 
-                if 'Item' in video_item:
-                    video_info = video_item['Item']
-                    bucket = os.environ['VIDEO_BUCKET']
-                    video_key = video_info.get('videoKey', f"{org_id}/videos/{video_id}.mp4")
-                    
-                    # Calculate first face timestamp
-                    faces_list = response.get('Faces', [])
-                    first_face_timestamp = min(face.get('Timestamp', 0) for face in faces_list) if faces_list else 0
-                    
-                    # Generate thumbnail from first frame with faces
-                    print(f"Generating thumbnail for video {video_id}")
-                    thumbnail_key = generate_thumbnail(bucket, video_key, org_id, video_id, faces_list)
-                    
-                    # Update video status to PROCESSED with thumbnail info
-                    update_expression = "SET #status = :status, processingCompletedAt = :timestamp"
-                    expression_values = {
-                        ':status': 'PROCESSED',
-                        ':timestamp': datetime.utcnow().isoformat()
-                    }
-                    
-                    if thumbnail_key:
-                        update_expression += ", thumbnailUrl = :thumbnailUrl, thumbnailMetadata = :thumbnailMeta"
-                        expression_values[':thumbnailUrl'] = f"s3://{bucket}/{thumbnail_key}"
-                        expression_values[':thumbnailMeta'] = {
-                            'frameTimestamp': int(first_face_timestamp / 1000),
-                            'faceCount': len(response.get('Faces', [])),
-                            'generatedAt': datetime.utcnow().isoformat(),
-                            'status': 'metadata_ready'  # Will be 'ready' when actual image is generated
-                        }
-                else:
-                    print(f"Video info not found for {video_id}")
-                    thumbnail_key = None
-                    update_expression = "SET #status = :status, processingCompletedAt = :timestamp"
-                    expression_values = {
-                        ':status': 'PROCESSED',
-                        ':timestamp': datetime.utcnow().isoformat()
+                # Frames were scored over every detection; the best one plus alternates are captured
+                alternates = int(os.environ.get('THUMBNAIL_ALTERNATES', str(DEFAULT_ALTERNATES)))
+                thumbnail_frames = frame_scorer.best_frames(1 + alternates)
+                
+                # Generate thumbnail from the best-scoring frame
+                print(f"Generating thumbnail for video {video_id}")
+                with instrumentation.stage(THUMBNAIL_SUBMIT):
+                    thumbnail = generate_thumbnail(bucket, video_key, org_id, video_id, thumbnail_frames, stats.frame_rate)
+                
+                # Update video status to PROCESSED with thumbnail info in a single write
+                update_expression = ("SET processingCompletedAt = :timestamp, processedFaces = :processedFaces, "
+                                     "progressPercent = :progressPercent")
+                expression_values = {
+                    ':timestamp': datetime.utcnow().isoformat(),
+                    ':processedFaces': stats.face_count,
+                    ':progressPercent': 100
+                }
+                
+                if thumbnail:
+                    update_expression += ", thumbnailUrl = :thumbnailUrl, thumbnailMetadata = :thumbnailMeta"
+                    expression_values[':thumbnailUrl'] = f"s3://{bucket}/{thumbnail['thumbnailKey']}"
+                    expression_values[':thumbnailMeta'] = {
+                        'frameTimestamp': int(thumbnail_frames[0]['timestamp'] / 1000),
+                        'frameScore': float_to_decimal(thumbnail_frames[0]['score']),
+                        'alternateTimestamps': [frame['timestamp'] for frame in thumbnail_frames[1:]],
+                        'faceCount': stats.face_count,
+                        'generatedAt': datetime.utcnow().isoformat(),
+                        'status': 'metadata_ready'  # Will be 'ready' when actual image is generated
                     }
+                    if 'thumbnailStatus' in thumbnail:
+                        update_expression += ", thumbnailStatus = :thumbnailStatus"
+                        expression_values[':thumbnailStatus'] = thumbnail['thumbnailStatus']
+                    if 'mediaConvertJobId' in thumbnail:
+                        update_expression += ", mediaConvertJobId = :mediaConvertJobId"
+                        expression_values[':mediaConvertJobId'] = thumbnail['mediaConvertJobId']
                 
-                table.update_item(
-                    Key={
-                        'PK': f"ORG#{org_id}",
-                        'SK': f"VIDEO#{video_id}"
-                    },
-                    UpdateExpression=update_expression,
-                    ExpressionAttributeNames={
-                        '#status': 'status'
-                    },
-                    ExpressionAttributeValues=expression_values
-                )
+                # Video-level rollup so library and search views need a single GetItem
+                update_expression += ", detectionSummary = :summary"
+                expression_values[':summary'] = float_to_decimal(video_summary.to_record())
+                if archive is not None and archive.pointer:
+                    update_expression += ", detectionArchive = :archive"
+                    expression_values[':archive'] = archive.pointer
+                
+                if not complete_processing(table, org_id, video_id, update_expression, expression_values):
+                    print(f"Video {video_id} left the STORING stage before completion")
+                    continue
                 
                 print(f"Successfully processed video {video_id}")
                 
+                with instrumentation.stage(THUMBNAIL_SUBMIT):
+                    # Submit this video's queued thumbnail once the batch window allows
+                    if thumbnail and thumbnail.get('thumbnailStatus') == THUMBNAIL_QUEUED:
+                        flush_thumbnail_requests()
+                    
+                    if sprite_sheets_enabled():
+                        generate_sprite_sheets(table, bucket, video_key, org_id, video_id, frame_scorer, stats.frame_rate)
+                
+                # Duplicates that arrived while this analysis ran can now copy it
+                if cache_key:
+                    for waiting_video_id in create_analysis_cache(table).complete(org_id, cache_key, video_id):
+                        copy_video_results(table, org_id, video_id, waiting_video_id, cache_key)
+                
             except Exception as e:
                 print(f"Error processing Rekognition results: {e}")
+                # Keep track of what was persisted before the failing batch
+                extra = None
+                if isinstance(e, BatchWriteError) and e.stats:
+                    extra = {'detectionWriteStats': float_to_decimal(e.stats.summary())}
+                
                 # Update status to ERROR
-                table.update_item(
-                    Key={
-                        'PK': f"ORG#{org_id}",
-                        'SK': f"VIDEO#{video_id}"
-                    },
-                    UpdateExpression="SET #status = :status, errorMessage = :error",
-                    ExpressionAttributeNames={
-                        '#status': 'status'
-                    },
-                    ExpressionAttributeValues={
-                        ':status': 'ERROR',
-                        ':error': str(e)
-                    }
-                )
+                fail_processing(table, org_id, video_id, str(e), extra, attempt)
+                
+                if cache_key:
+                    release_cached_analysis(table, org_id, video_id, cache_key)
         
         elif status == 'FAILED':
             # Update status to ERROR
-            table.update_item(
-                Key={
-                    'PK': f"ORG#{org_id}",
-                    'SK': f"VIDEO#{video_id}"
-                },
-                UpdateExpression="SET #status = :status, errorMessage = :error",
-                ExpressionAttributeNames={
-                    '#status': 'status'
-                },
-                ExpressionAttributeValues={
-                    ':status': 'ERROR',
-                    ':error': 'Rekognition job failed'
-                }
-            )
+            video_info = fail_processing(table, org_id, video_id, 'Rekognition job failed', attempt=attempt)
+            cache_key = (video_info or {}).get('analysisCacheKey')
+            if cache_key:
+                release_cached_analysis(table, org_id, video_id, cache_key)
     
     return {
         'statusCode': 200,
         'body': json.dumps('Results processed')
     }
 
-def process_face_detections(org_id: str, video_id: str, faces: List[Dict[str, Any]]):
-    """Process face detection results and store in DynamoDB"""
+def submit_analysis(table, video: QueuedVideo):
+    """Start a claimed video's Rekognition job, through the scheduler when it is enabled"""
+    
+    if not scheduler_enabled():
+        try:
+            start_analysis_job(video)
+        except Exception as e:
+            handle_start_failure(video, e)
+        return
+    
+    # Admission control: queue the video and start it once Rekognition has capacity
+    scheduler = create_job_scheduler(table)
+    try:
+        scheduler.enqueue(video)
+    except Exception as e:
+        handle_start_failure(video, e)
+        return
+    try:
+        scheduler.dispatch()
+    except Exception as e:
+        # The video stays queued for the next completion or scheduled dispatch
+        print(f"Error dispatching queued Rekognition jobs: {e}")
+
+def start_analysis_job(video: QueuedVideo) -> str:
+    """Start the Rekognition face detection job for a video"""
     
-    table = dynamodb.Table(os.environ['DATA_TABLE'])
+    with instrumentation.stage(REKOGNITION_START):
+        response = get_client('rekognition').start_face_detection(
+            Video={
+                'S3Object': {
+                    'Bucket': video.bucket,
+                    'Name': video.key
+                }
+            },
+            NotificationChannel={
+                'SNSTopicArn': os.environ['SNS_TOPIC_ARN'],
+                'RoleArn': os.environ['REKOGNITION_ROLE_ARN']
+            },
+            JobTag=job_tag(video.org_id, video.video_id, video.attempt),
+            FaceAttributes='ALL',
+            # Same token for the same attempt, so a retried start returns the original job
+            ClientRequestToken=job_request_token(video.org_id, video.video_id, video.attempt)
+        )
     
-    for face in faces:
-        # Generate unique person ID
-        person_id = str(uuid.uuid4())
-        timestamp = face['Timestamp']
+    # No write here: the tag carries the attempt and the job id is recorded with the results
+    print(f"Started Rekognition job {response['JobId']} for video {video.video_id}")
+    return response['JobId']
+
+def handle_start_failure(video: QueuedVideo, error: Exception):
+    print(f"Error starting Rekognition job: {error}")
+    # Update status to ERROR
+    table = get_table()
+    video_info = fail_processing(table, video.org_id, video.video_id, str(error), attempt=video.attempt)
+    cache_key = (video_info or {}).get('analysisCacheKey')
+    if cache_key:
+        release_cached_analysis(table, video.org_id, video.video_id, cache_key)
+
+def scheduler_enabled() -> bool:
+    return os.environ.get('REKOGNITION_SCHEDULER_ENABLED', 'true').lower() == 'true'
+
+def create_job_scheduler(table) -> JobScheduler:
+    return JobScheduler(
+        table,
+        start_analysis_job,
+        handle_start_failure,
+        max_concurrent_jobs=int(os.environ.get('REKOGNITION_MAX_CONCURRENT_JOBS', str(DEFAULT_MAX_CONCURRENT_JOBS))),
+        start_rate=float(os.environ.get('REKOGNITION_START_RATE', str(DEFAULT_START_RATE))),
+        start_burst=int(os.environ.get('REKOGNITION_START_BURST', str(DEFAULT_START_BURST)))
+    )
+
+def release_analysis_slot(table, org_id: str, video_id: str, attempt: int):
+    """Release a finished job's slot and start whatever is queued behind it"""
+    
+    try:
+        scheduler = create_job_scheduler(table)
+        if scheduler.release(org_id, video_id, attempt):
+            scheduler.dispatch()
+    except Exception as e:
+        # Queued videos are picked up again by the scheduled dispatch
+        print(f"Error releasing Rekognition slot for video {video_id}: {e}")
+
+def run_scheduled_dispatch() -> Dict[str, Any]:
+    """Periodic tick: reclaim lost slots and start queued videos after backoff"""
+    
+    scheduler = create_job_scheduler(get_table())
+    reaped = scheduler.reap_expired_leases()
+    started = scheduler.dispatch()
+    print(f"Scheduled dispatch: {reaped} slots reclaimed, {started} jobs started")
+    return {"statusCode": 200, "body": json.dumps({"slotsReclaimed": reaped, "jobsStarted": started})}
+
+def analysis_cache_enabled() -> bool:
+    return os.environ.get('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+
+def create_analysis_cache(table) -> AnalysisCache:
+    ttl_days = int(os.environ.get('ANALYSIS_CACHE_TTL_DAYS', str(DEFAULT_TTL_DAYS)))
+    return AnalysisCache(table, ttl_seconds=ttl_days * 86400)
+
+def reuse_cached_analysis(table, org_id: str, video_id: str, cache_key: str) -> bool:
+    """Serve a duplicate upload from an earlier analysis of the same content
+    
+    Returns False when the caller should start a Rekognition job itself.
+    """
+    
+    cache = create_analysis_cache(table)
+    entry = cache.claim(org_id, cache_key, video_id)
+    
+    # Cache miss (now claimed by this video) or a redelivery of the source upload
+    if not entry or entry.get('sourceVideoId') == video_id:
+        return False
+    
+    source_video_id = entry['sourceVideoId']
+    if entry.get('status') == STATUS_PENDING and cache.add_waiter(org_id, cache_key, video_id):
+        print(f"Video {video_id} will reuse in-flight analysis of video {source_video_id}")
+        return True
+    
+    print(f"Analysis cache hit: copying results of video {source_video_id} to video {video_id}")
+    copy_video_results(table, org_id, source_video_id, video_id, cache_key)
+    return True
+
+def release_cached_analysis(table, org_id: str, video_id: str, cache_key: str):
+    """Forget a failed analysis and analyze the duplicates that were waiting on it"""
+    
+    try:
+        waiting_video_ids = create_analysis_cache(table).release(org_id, cache_key, video_id)
+    except Exception as e:
+        print(f"Error releasing analysis cache entry for video {video_id}: {e}")
+        return
+    
+    # The source failing says nothing about a waiter's own upload
+    for waiting_video_id in waiting_video_ids:
+        reanalyze_video(table, org_id, waiting_video_id, cache_key, f"Analysis of duplicate video {video_id} failed")
+
+def copy_video_results(table, org_id: str, source_video_id: str, video_id: str, cache_key: str):
+    """Copy the stored analysis of one video onto another and mark it PROCESSED
+    
+    If the source results cannot be copied, the cache entry is dropped and
+    the video is analyzed itself, so later duplicates do not hit it again.
+    """
+    
+    # Claim the target like a results delivery so concurrent copies collapse to one
+    video_info = begin_storing(table, org_id, video_id, None)
+    if video_info is None:
+        print(f"Video {video_id} already stored or in progress; skipping copy")
+        return
+    # Index entries are keyed on this upload's own recording time
+    recorded_at = recording_start(video_info)
+    
+    try:
+        source_item = table.get_item(
+            Key={
+                'PK': f"ORG#{org_id}",
+                'SK': f"VIDEO#{source_video_id}"
+            }
+        ).get('Item')
+        if not source_item:
+            raise ValueError(f"Cached source video {source_video_id} not found")
         
-        # Extract attributes
-        attributes = face.get('Face', {})  # Rekognition returns details directly under 'Face'
-        face_details = attributes  # Normalize variable name for downstream field access
+        # An archived source keeps no APPEAR# items; its index entries are rebuilt from the archive
+        if 'detectionArchive' in source_item:
+            write_stats = rebuild_attribute_index(org_id, video_id, source_item['detectionArchive'], recorded_at)
+        else:
+            write_stats = copy_appearances(table, org_id, source_video_id, video_id, recorded_at)
         
-        # Create person detection record with Decimal types for DynamoDB
-        detection_item = {
-            'PK': f"ORG#{org_id}",
-            'SK': f"APPEAR#{video_id}#{timestamp}",
-            'personId': person_id,
-            'videoId': video_id,
-            'timestamp': datetime.fromtimestamp(timestamp/1000).isoformat(),
-            'confidence': float_to_decimal(attributes.get('Confidence', 0)),
-            'attributes': {
-                'ageBucket': get_age_bucket(face_details.get('AgeRange', {})),
-                'gender': face_details.get('Gender', {}).get('Value', 'unknown'),
-                'emotion': get_primary_emotion(face_details.get('Emotions', [])),
-                'mask': face_details.get('FaceOccluded', {}).get('Value', False),
-            },
-            'GSI1PK': f"ATTR#color#unknown",  # Will be updated by color detection
-            'GSI1SK': f"APPEAR#{timestamp}",
-            'GSI2PK': f"VIDEO#{video_id}",
-            'GSI2SK': f"APPEAR#{timestamp}",
-            'GSI3PK': f"TIME#{datetime.fromtimestamp(timestamp/1000).strftime('%Y%m%d')}",
-            'GSI3SK': f"APPEAR#{timestamp}",
+        # Storing zeroed the counts; a copy holds every face of its source
+        update_expression = ("SET processingCompletedAt = :timestamp, analysisSourceVideoId = :sourceVideoId, "
+                             "processedFaces = :processedFaces, progressPercent = :progressPercent")
+        expression_values = {
+            ':timestamp': datetime.utcnow().isoformat(),
+            ':sourceVideoId': source_video_id,
+            ':processedFaces': source_item.get('processedFaces', 0),
+            ':progressPercent': 100
         }
+        # An archived source shares its detection archive with the copy
+        for attribute in ('detectionSummary', 'detectionArchive', 'thumbnailUrl', 'thumbnailMetadata'):
+            if attribute in source_item:
+                update_expression += f", {attribute} = :{attribute}"
+                expression_values[f":{attribute}"] = source_item[attribute]
         
-        # Store in DynamoDB
-        table.put_item(Item=detection_item)
+        complete_processing(table, org_id, video_id, update_expression, expression_values)
+        print(f"Copied analysis to video {video_id}: {json.dumps(write_stats.summary())}")
         
-        print(f"Stored detection for person {person_id} in video {video_id}")
+    except Exception as e:
+        print(f"Error copying analysis of video {source_video_id} to video {video_id}: {e}")
+        try:
+            create_analysis_cache(table).release(org_id, cache_key, source_video_id)
+        except Exception as release_error:
+            print(f"Error releasing analysis cache entry of video {source_video_id}: {release_error}")
+        reanalyze_video(table, org_id, video_id, cache_key, f"Copying analysis of video {source_video_id} failed: {e}")
+
+def reanalyze_video(table, org_id: str, video_id: str, cache_key: str, reason: str):
+    """Analyze a video again after the analysis it was waiting on or copying from failed"""
+    
+    # The failed stage lets the video be claimed for analysis again, under a new attempt
+    video_info = fail_processing(table, org_id, video_id, reason)
+    if video_info is None or 'videoKey' not in video_info:
+        return
+    attempt = begin_analysis(table, org_id, video_id, video_info['videoKey'], {'analysisCacheKey': cache_key})
+    if attempt is None:
+        print(f"Video {video_id} is already being analyzed again")
+        return
+    
+    print(f"Analyzing video {video_id} again: {reason}")
+    try:
+        # Becomes the source for its content now that the broken entry is gone, or
+        # waits on another duplicate that already took its place
+        if reuse_cached_analysis(table, org_id, video_id, cache_key):
+            return
+    except Exception as e:
+        print(f"Analysis cache error for video {video_id}: {e}")
+    
+    submit_analysis(table, QueuedVideo(org_id, video_id, os.environ['VIDEO_BUCKET'], video_info['videoKey'], attempt))
+
+def copy_appearances(table, org_id: str, source_video_id: str, video_id: str,
+                     recorded_at: Optional[datetime] = None) -> WriteStats:
+    """Rewrite a video's APPEAR# items and attribute index entries under another video"""
+    
+    source_prefix = f"APPEAR#{source_video_id}#"
+    writer = create_detection_writer()
+    index_attributes = os.environ.get('ATTRIBUTE_INDEX_ENABLED', 'true').lower() == 'true'
+    query_args = {
+        'KeyConditionExpression': Key('PK').eq(f"ORG#{org_id}") & Key('SK').begins_with(source_prefix)
+    }
+    
+    with writer:
+        while True:
+            response = table.query(**query_args)
+            for source_appearance in response.get('Items', []):
+                appearance = dict(source_appearance)
+                appearance['SK'] = f"APPEAR#{video_id}#{source_appearance['SK'][len(source_prefix):]}"
+                appearance['videoId'] = video_id
+                appearance['GSI2PK'] = f"VIDEO#{video_id}"
+                writer.put(appearance)
+                if index_attributes:
+                    for entry in build_attribute_index_items(org_id, appearance, recorded_at):
+                        writer.put(entry)
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return writer.stats
+
+def rebuild_attribute_index(org_id: str, video_id: str, pointer: Dict[str, Any],
+                            recorded_at: Optional[datetime] = None) -> WriteStats:
+    """Write a video's attribute index entries from the detections of an archive"""
+    
+    if os.environ.get('ATTRIBUTE_INDEX_ENABLED', 'true').lower() != 'true':
+        return WriteStats()
+    reader = DetectionArchiveReader.from_pointer(get_client('s3'), pointer)
+    return process_face_detections(org_id, video_id, archived_faces(reader), index_only=True,
+                                   recorded_at=recorded_at)
+
+def archived_faces(reader: DetectionArchiveReader) -> Iterator[Dict[str, Any]]:
+    """Faces rebuilt from archive rows, carrying their normalized values"""
+    for row in reader.rows():
+        moment = datetime.fromtimestamp(row['timestamp']/1000)
+        attributes = {name: row[name] for name in ('ageBucket', 'gender', 'emotion', 'mask')}
+        yield {
+            'Timestamp': row['timestamp'],
+            'Face': {
+                'Confidence': row['confidence'],
+                'BoundingBox': {
+                    'Left': row['left'],
+                    'Top': row['top'],
+                    'Width': row['width'],
+                    'Height': row['height']
+                }
+            },
+            NORMALIZED_KEY: NormalizedFace(to_decimal(row['confidence']), attributes,
+                                           moment.isoformat(), moment.strftime('%Y%m%d'))
+        }
+
+def progressive_results_enabled() -> bool:
+    return os.environ.get('PROGRESSIVE_RESULTS_ENABLED', 'true').lower() == 'true'
+
+def create_progress_publisher(table, org_id: str, video_id: str, detection_filters: List[DetectionFilter]) -> ProgressPublisher:
+    return ProgressPublisher(
+        lambda processed_faces, percent: record_progress(table, org_id, video_id, processed_faces, percent),
+        video_id,
+        interval_seconds=float(os.environ.get('PROGRESS_INTERVAL_SECONDS', str(DEFAULT_INTERVAL_SECONDS))),
+        dropped_faces=lambda: sum(detection_filter.stats.dropped for detection_filter in detection_filters)
+    )
+
+def create_detection_writer(parallel: Optional[bool] = None) -> BatchWriter:
+    """Build the detection writer for the configured write mode"""
+    if parallel is None and _shared_write_pool is not None:
+        return ParallelBatchWriter(get_resource('dynamodb'), os.environ['DATA_TABLE'], pool=_shared_write_pool)
+    
+    if parallel is None:
+        parallel = os.environ.get('DETECTION_WRITE_MODE', 'batch').lower() == 'parallel'
+    
+    if not parallel:
+        return BatchWriter(get_resource('dynamodb'), os.environ['DATA_TABLE'])
+    
+    max_workers = int(os.environ.get('DETECTION_WRITE_WORKERS', '4'))
+    max_in_flight = int(os.environ.get('DETECTION_WRITE_MAX_IN_FLIGHT', str(max_workers * 2)))
+    return ParallelBatchWriter(get_resource('dynamodb'), os.environ['DATA_TABLE'], max_workers=max_workers, max_in_flight=max_in_flight)
+
+def extract_attributes(face: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize the searchable attributes of a Rekognition face"""
+    row = normalized(face)
+    if row is not None:
+        return row.attributes
+    face_details = face.get('Face', {})  # Rekognition returns details directly under 'Face'
+    return {
+        'ageBucket': get_age_bucket(face_details.get('AgeRange', {})),
+        'gender': face_details.get('Gender', {}).get('Value', 'unknown'),
+        'emotion': get_primary_emotion(face_details.get('Emotions', [])),
+        'mask': face_details.get('FaceOccluded', {}).get('Value', False),
+    }
+
+def gsi_shard_count() -> int:
+    """Number of write shards for the AttributeIndex and TimeIndex partition keys"""
+    return int(os.environ.get('GSI_SHARD_COUNT', str(DEFAULT_SHARD_COUNT)))
+
+def build_detection_item(org_id: str, video_id: str, face: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the APPEAR# item for a single Rekognition face detection"""
+    
+    timestamp = face['Timestamp']
+    
+    # Extract attributes
+    attributes = face.get('Face', {})
+    bounding_box = attributes.get('BoundingBox', {})
+    
+    # IDs derive from video, timestamp and box so reprocessing overwrites in place
+    appearance_id, appearance_person_id = detection_ids(video_id, timestamp, bounding_box)
+    sort_key = f"APPEAR#{video_id}#{timestamp}#{appearance_id}"
+    shard_count = gsi_shard_count()
+    
+    # Pages normalized up front already carry typed values and time keys
+    row = normalized(face)
+    if row is None:
+        moment = datetime.fromtimestamp(timestamp/1000)
+        confidence = float_to_decimal(attributes.get('Confidence', 0))
+        face_attributes = extract_attributes(face)
+        iso_timestamp, day = moment.isoformat(), moment.strftime('%Y%m%d')
+    else:
+        confidence, face_attributes, iso_timestamp, day = row
+    
+    # Create person detection record with Decimal types for DynamoDB
+    return {
+        'PK': f"ORG#{org_id}",
+        'SK': sort_key,
+        'personId': appearance_person_id,
+        'videoId': video_id,
+        'timestamp': iso_timestamp,
+        'confidence': confidence,
+        'attributes': face_attributes,
+        # Hot GSI partitions are write-sharded on the item's sort key
+        'GSI1PK': sharded_key("ATTR#color#unknown", sort_key, shard_count),  # Will be updated by color detection
+        'GSI1SK': f"APPEAR#{timestamp}",
+        'GSI2PK': f"VIDEO#{video_id}",
+        'GSI2SK': f"APPEAR#{timestamp}",
+        'GSI3PK': sharded_key(f"TIME#{day}", sort_key, shard_count),
+        'GSI3SK': f"APPEAR#{timestamp}",
+    }
+
+def build_track_item(org_id: str, video_id: str, track: FaceTrack) -> Dict[str, Any]:
+    """Build a single APPEAR# span item for a face track"""
+    
+    start = track.start_timestamp
+    best_details = track.best_face.get('Face', {})
+    track_id, track_person_id = detection_ids(video_id, start, track.start_box)
+    sort_key = f"APPEAR#{video_id}#{start}#{track_id}"
+    shard_count = gsi_shard_count()
+    
+    return {
+        'PK': f"ORG#{org_id}",
+        'SK': sort_key,
+        'personId': track_person_id,
+        'videoId': video_id,
+        'timestamp': datetime.fromtimestamp(start/1000).isoformat(),
+        'startTimestamp': start,
+        'endTimestamp': track.end_timestamp,
+        'durationMs': track.end_timestamp - start,
+        'detectionCount': track.detection_count,
+        'confidence': float_to_decimal(round(track.average_confidence, 3)),
+        'bestFrame': {
+            'timestamp': track.best_face['Timestamp'],
+            'confidence': float_to_decimal(best_details.get('Confidence', 0)),
+            'boundingBox': float_to_decimal(best_details.get('BoundingBox', {})),
+        },
+        'attributes': track.majority_attributes(),
+        'GSI1PK': sharded_key("ATTR#color#unknown", sort_key, shard_count),  # Will be updated by color detection
+        'GSI1SK': f"APPEAR#{start}",
+        'GSI2PK': f"VIDEO#{video_id}",
+        'GSI2SK': f"APPEAR#{start}",
+        'GSI3PK': sharded_key(f"TIME#{datetime.fromtimestamp(start/1000).strftime('%Y%m%d')}", sort_key, shard_count),
+        'GSI3SK': f"APPEAR#{start}",
+    }
+
+def create_face_tracker() -> FaceTracker:
+    """Build a tracker using the configured matching thresholds"""
+    return FaceTracker(
+        extract_attributes,
+        min_iou=float(os.environ.get('TRACK_MIN_IOU', '0.3')),
+        max_gap_ms=int(os.environ.get('TRACK_MAX_GAP_MS', '1000'))
+    )
+
+def detection_storage() -> str:
+    """'dynamodb' stores appearance items; 'archive' keeps detections in S3 and only index entries in DynamoDB"""
+    return os.environ.get('DETECTION_STORAGE', 'dynamodb').lower()
+
+def create_detection_archive(org_id: str, video_id: str) -> DetectionArchiveWriter:
+    return DetectionArchiveWriter(
+        get_client('s3'),
+        os.environ['VIDEO_BUCKET'],
+        archive_key(org_id, video_id),
+        extract_attributes,
+        row_group_size=int(os.environ.get('DETECTION_ARCHIVE_ROW_GROUP_SIZE', str(DEFAULT_ROW_GROUP_SIZE)))
+    )
+
+def read_detection_archive(org_id: str, video_id: str, columns: Optional[List[str]] = None,
+                           start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, List[Any]]:
+    """Load selected columns of a video's archived detections, optionally within a time range"""
+    
+    video = get_table().get_item(
+        Key={
+            'PK': f"ORG#{org_id}",
+            'SK': f"VIDEO#{video_id}"
+        },
+        ProjectionExpression='detectionArchive'
+    ).get('Item') or {}
+    if 'detectionArchive' not in video:
+        raise ValueError(f"Video {video_id} has no detection archive")
+    
+    reader = DetectionArchiveReader.from_pointer(get_client('s3'), video['detectionArchive'])
+    detections = reader.read(columns, start_ms, end_ms)
+    print(f"Read detection archive of video {video_id}: {reader.requests} ranged reads, {reader.bytes_read} bytes")
+    return detections
+
+def process_face_detections(org_id: str, video_id: str, faces: Iterable[Dict[str, Any]], parallel: Optional[bool] = None,
+                            aggregation: Optional[str] = None, summary: Optional[VideoSummary] = None,
+                            archive: Optional[DetectionArchiveWriter] = None,
+                            progress: Optional[ProgressPublisher] = None, index_only: bool = False,
+                            recorded_at: Optional[datetime] = None) -> WriteStats:
+    """Process face detection results and store in DynamoDB
+    
+    With the default 'track' aggregation, consecutive detections of the same
+    face are collapsed into one span item; 'none' stores every detection.
+    With an ``archive``, every detection goes to it and DynamoDB receives
+    only the attribute index entries of the appearances, as it does with
+    ``index_only``. Index entries are keyed on ``recorded_at`` (the video's
+    recording start) plus each appearance's offset. A ``progress`` publisher
+    counts the faces behind each written item and syncs the writer at result
+    page boundaries.
+    """
+    
+    if archive is not None:
+        faces = archive.track(faces)
+    
+    aggregation = (aggregation or os.environ.get('DETECTION_AGGREGATION', 'track')).lower()
+    tracker = None
+    if aggregation == 'track':
+        tracker = create_face_tracker()
+        items = (build_track_item(org_id, video_id, track) for track in tracker.track(faces))
+    else:
+        # Attributes and time keys are computed a page at a time, leaving only item assembly per face
+        page_size = int(os.environ.get('NORMALIZATION_PAGE_SIZE', str(DEFAULT_PAGE_SIZE)))
+        normalized_faces = instrumentation.timed(normalize_faces(faces, page_size), NORMALIZATION)
+        items = (build_detection_item(org_id, video_id, face) for face in normalized_faces)
+    
+    # Tracking and item construction, excluding the fetch and normalization they pull from
+    items = instrumentation.timed(items, AGGREGATION)
+    
+    writer = create_detection_writer(parallel)
+    if progress:
+        progress.attach(writer)
+    index_attributes = os.environ.get('ATTRIBUTE_INDEX_ENABLED', 'true').lower() == 'true'
+    store_appearances = archive is None and not index_only
+    
+    try:
+        # Items are buffered into 25-item batch writes; a clean exit drains the buffer
+        with instrumentation.stage(DYNAMODB_WRITE), writer:
+            for item in items:
+                if store_appearances:
+                    writer.put(item)
+                    if progress:
+                        progress.observe_item(item)
+                if summary:
+                    summary.observe_appearance(item)
+                if index_attributes:
+                    for entry in build_attribute_index_items(org_id, item, recorded_at):
+                        writer.put(entry)
+        
+        # Uploaded only once every detection has been streamed through
+        if archive is not None:
+            archive.close()
+    finally:
+        print(f"Stored detections for video {video_id}: {json.dumps(writer.stats.summary())}")
+        if tracker:
+            print(f"Tracked detections for video {video_id}: {json.dumps(tracker.stats.summary())}")
+    
+    return writer.stats
 
 def get_age_bucket(age_range: Dict[str, int]) -> str:
     """Convert age range to bucket"""
@@ -494,6 +1119,5 @@ def get_primary_emotion(emotions: List[Dict[str, Any]]) -> str:
     if not emotions:
         return 'neutral'
     
-    # Sort by confidence and return the highest
-    sorted_emotions = sorted(emotions, key=lambda x: x.get('Confidence', 0), reverse=True)
-    return sorted_emotions[0].get('Type', 'neutral').lower()
+    # Highest confidence wins; the first one on ties
+    return max(emotions, key=lambda x: x.get('Confidence', 0)).get('Type', 'neutral').lower()
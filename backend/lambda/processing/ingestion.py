@@ -0,0 +1,85 @@
+"""Streaming ingestion of Rekognition face detection results"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Rekognition caps GetFaceDetection pages at 1000 faces
+DEFAULT_PAGE_SIZE = 1000
+
+
+def iter_face_detection_pages(rekognition_client, job_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                              on_page: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield each page of faces for a job, following NextToken until exhausted
+
+    ``on_page`` receives each GetFaceDetection response once the consumer
+    asks for the following page, i.e. after the whole page went downstream.
+    """
+
+    next_token = None
+    while True:
+        # GetFaceDetection always returns faces in timestamp order; it takes no SortBy
+        request = {
+            'JobId': job_id,
+            'MaxResults': page_size
+        }
+        if next_token:
+            request['NextToken'] = next_token
+
+        response = rekognition_client.get_face_detection(**request)
+        yield response.get('Faces', [])
+        if on_page:
+            on_page(response)
+
+        next_token = response.get('NextToken')
+        if not next_token:
+            break
+
+
+def iter_face_detections(rekognition_client, job_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                         on_page: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield faces one at a time; only the current page is held in memory"""
+    for page in iter_face_detection_pages(rekognition_client, job_id, page_size, on_page):
+        yield from page
+
+
+@dataclass
+class DetectionStats:
+    """Aggregates computed in a single pass over the detection stream"""
+
+    face_count: int = 0
+    first_timestamp: Optional[int] = None
+    last_timestamp: Optional[int] = None
+    max_confidence: float = 0.0
+    confidence_total: float = 0.0
+    frame_count: int = 0
+    frame_rate: Optional[float] = None
+
+    def observe_page(self, response: Dict[str, Any]) -> None:
+        """Keep the video metadata reported with each results page"""
+        self.frame_rate = response.get('VideoMetadata', {}).get('FrameRate') or self.frame_rate
+
+    def observe(self, face: Dict[str, Any]) -> None:
+        """Fold a single detection into the running aggregates"""
+        timestamp = face.get('Timestamp', 0)
+        confidence = face.get('Face', {}).get('Confidence', 0.0)
+
+        self.face_count += 1
+        # Pages are sorted by timestamp, so a new frame starts whenever it advances
+        if timestamp != self.last_timestamp:
+            self.frame_count += 1
+        if self.first_timestamp is None or timestamp < self.first_timestamp:
+            self.first_timestamp = timestamp
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+        self.max_confidence = max(self.max_confidence, confidence)
+        self.confidence_total += confidence
+
+    def track(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass faces through unchanged while updating the aggregates"""
+        for face in faces:
+            self.observe(face)
+            yield face
+
+    @property
+    def average_confidence(self) -> float:
+        return self.confidence_total / self.face_count if self.face_count else 0.0
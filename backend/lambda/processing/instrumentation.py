@@ -0,0 +1,157 @@
+"""Sampled structured logs and per-stage latency metrics
+
+Stage timings are aggregated in memory and written once per stage at the
+end of an invocation as a CloudWatch Embedded Metric Format document, so
+CloudWatch turns the log line into metrics without any PutMetricData call.
+
+Stages nest: time spent in an inner stage (for example pulling the next
+Rekognition page from inside the DynamoDB write loop) is subtracted from
+the stage around it, so each stage reports its own work only.
+
+Verbose logs (whole events, per-record routing) are written for a sampled
+fraction of invocations (``LOG_SAMPLE_RATE``) as single-line JSON.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_NAMESPACE = 'ZentriqVision/Processing'
+DEFAULT_SAMPLE_RATE = 0.01
+# EMF accepts at most 100 values per metric in one document
+MAX_VALUES_PER_DOCUMENT = 100
+
+S3_EVENT_PARSE = 'S3EventParse'
+REKOGNITION_START = 'RekognitionStart'
+RESULT_FETCH = 'ResultFetch'
+NORMALIZATION = 'Normalization'
+AGGREGATION = 'Aggregation'
+DYNAMODB_WRITE = 'DynamoDBWrite'
+THUMBNAIL_SUBMIT = 'ThumbnailSubmit'
+
+
+class Instrumentation:
+    """Per-invocation stage timings and log sampling"""
+
+    def __init__(self, namespace: str = DEFAULT_NAMESPACE, sample_rate: float = DEFAULT_SAMPLE_RATE):
+        self.namespace = namespace
+        self.sample_rate = sample_rate
+        self.request_id: Optional[str] = None
+        self.sampled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._durations: Dict[str, List[float]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def begin(self, context=None) -> None:
+        """Start an invocation: drop leftover timings and roll the sampling decision"""
+        with self._lock:
+            self._durations = {}
+            self._counts = {}
+        self.request_id = getattr(context, 'aws_request_id', None)
+        self.sampled = random.random() < self.sample_rate
+
+    @contextmanager
+    def stage(self, name: str, count: int = 0) -> Iterator[None]:
+        """Time a block as ``name``, excluding nested stages"""
+        stack = self._stack()
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.record(name, (elapsed - nested) * 1000, count)
+
+    def timed(self, items: Iterable[Any], name: str) -> Iterator[Any]:
+        """Pass items through, timing only the work of producing them
+
+        All the time spent pulling items is recorded as a single sample.
+        """
+        iterator = iter(items)
+        stack = self._stack()
+        total = 0.0
+        produced = 0
+        try:
+            while True:
+                stack.append(0.0)
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.perf_counter() - started
+                    nested = stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+                    total += elapsed - nested
+                produced += 1
+                yield item
+        finally:
+            self.record(name, total * 1000, produced)
+
+    def record(self, name: str, milliseconds: float, count: int = 0) -> None:
+        with self._lock:
+            self._durations.setdefault(name, []).append(round(milliseconds, 3))
+            if count:
+                self._counts[name] = self._counts.get(name, 0) + count
+
+    def flush(self) -> None:
+        """Write the invocation's timings as EMF documents, one per stage"""
+        with self._lock:
+            durations, self._durations = self._durations, {}
+            counts, self._counts = self._counts, {}
+
+        for name, values in durations.items():
+            for start in range(0, len(values), MAX_VALUES_PER_DOCUMENT):
+                metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+                document = {
+                    '_aws': {
+                        'Timestamp': int(time.time() * 1000),
+                        'CloudWatchMetrics': [{
+                            'Namespace': self.namespace,
+                            'Dimensions': [['Stage']],
+                            'Metrics': metrics
+                        }]
+                    },
+                    'Stage': name,
+                    'Duration': values[start:start + MAX_VALUES_PER_DOCUMENT]
+                }
+                if start == 0 and name in counts:
+                    metrics.append({'Name': 'Items', 'Unit': 'Count'})
+                    document['Items'] = counts[name]
+                if self.request_id:
+                    document['requestId'] = self.request_id
+                print(json.dumps(document, separators=(',', ':')))
+
+    def log(self, message: str, **fields: Any) -> None:
+        """Structured log line, written for sampled invocations only
+
+        Fields are serialized only when the line is written.
+        """
+        if not self.sampled:
+            return
+        entry = {'message': message, 'requestId': self.request_id}
+        entry.update(fields)
+        print(json.dumps(entry, default=str, separators=(',', ':')))
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+def create_instrumentation() -> Instrumentation:
+    return Instrumentation(
+        namespace=os.environ.get('METRICS_NAMESPACE', DEFAULT_NAMESPACE),
+        sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', str(DEFAULT_SAMPLE_RATE)))
+    )
@@ -0,0 +1,210 @@
+"""Conditional state transitions for the VIDEO# processing lifecycle
+
+The upload API already creates videos with status PROCESSING, so progress
+through the pipeline is tracked in ``processingStage``:
+
+    (none) -> ANALYZING -> STORING -> COMPLETE
+                  \\            \\
+                   +-> FAILED <-+
+
+``analysisAttempt`` counts failed analyses. It is part of the Rekognition
+job tag and request token, so results are matched to the attempt that
+started them without a separate write to record the job id.
+
+While STORING, ``processedFaces`` counts detections whose outcome is stored
+(written, or dropped by a filter), and those written are already
+searchable; ``progressPercent`` is how far into the video the fetched
+results reach.
+
+Every transition is a conditional update, so duplicate S3 or SNS deliveries
+lose the condition and become no-ops. A stage that has not moved for longer
+than the Lambda timeout is considered abandoned and may be claimed again.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+STATUS_PROCESSING = 'PROCESSING'
+STATUS_PROCESSED = 'PROCESSED'
+STATUS_ERROR = 'ERROR'
+
+STAGE_ANALYZING = 'ANALYZING'
+STAGE_STORING = 'STORING'
+STAGE_COMPLETE = 'COMPLETE'
+STAGE_FAILED = 'FAILED'
+
+# Matches the processing Lambda timeout
+DEFAULT_STALE_SECONDS = 15 * 60
+
+
+def is_conditional_check_failure(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def video_item_key(org_id: str, video_id: str) -> Dict[str, str]:
+    return {
+        'PK': f"ORG#{org_id}",
+        'SK': f"VIDEO#{video_id}"
+    }
+
+
+def _attribute_names(expression: str) -> Dict[str, str]:
+    # DynamoDB rejects placeholder names that the expressions do not use
+    names = {'#status': 'status', '#stage': 'processingStage'}
+    return {placeholder: name for placeholder, name in names.items() if placeholder in expression}
+
+
+def _transition(table, org_id: str, video_id: str, update_expression: str, condition: str,
+                values: Dict[str, Any], return_values: str = 'NONE') -> Optional[Dict[str, Any]]:
+    """Apply a conditional update; None means the condition did not hold"""
+    try:
+        response = table.update_item(
+            Key=video_item_key(org_id, video_id),
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=_attribute_names(update_expression + ' ' + condition),
+            ExpressionAttributeValues=values,
+            ReturnValues=return_values
+        )
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+    return response.get('Attributes', {})
+
+
+def begin_analysis(table, org_id: str, video_id: str, video_key: str, extra: Optional[Dict[str, Any]] = None,
+                   stale_seconds: int = DEFAULT_STALE_SECONDS) -> Optional[int]:
+    """Claim a new upload for analysis
+
+    Returns the analysis attempt number, which names the Rekognition job, or
+    None for a duplicate delivery. Reclaiming an abandoned ANALYZING stage
+    keeps the attempt, so restarting the job returns the original one.
+    """
+    now = int(time.time())
+    update_expression = ("SET #status = :processing, #stage = :analyzing, processingStartedAt = :timestamp, "
+                         "stageUpdatedAt = :now, videoKey = :videoKey")
+    values = {
+        ':processing': STATUS_PROCESSING,
+        ':analyzing': STAGE_ANALYZING,
+        ':failed': STAGE_FAILED,
+        ':timestamp': datetime.utcnow().isoformat(),
+        ':now': now,
+        ':stale': now - stale_seconds,
+        ':videoKey': video_key
+    }
+    for name, value in (extra or {}).items():
+        update_expression += f", {name} = :{name}"
+        values[f":{name}"] = value
+
+    condition = ("attribute_not_exists(#stage) OR #stage = :failed OR "
+                 "(#stage = :analyzing AND stageUpdatedAt < :stale)")
+    item = _transition(table, org_id, video_id, update_expression, condition, values, return_values='ALL_NEW')
+    if item is None:
+        return None
+    return int(item.get('analysisAttempt', 0))
+
+
+def begin_storing(table, org_id: str, video_id: str, job_id: Optional[str], attempt: Optional[int] = None,
+                  stale_seconds: int = DEFAULT_STALE_SECONDS) -> Optional[Dict[str, Any]]:
+    """Claim completed analysis results for storage
+
+    Results are matched to the current analysis by ``attempt`` (from the job
+    tag) or, for jobs tagged without one, by the recorded job id. Returns the
+    updated VIDEO# item, or None when the results are already stored or
+    being stored, or belong to a superseded attempt.
+    """
+    now = int(time.time())
+    # A reclaimed STORING stage starts publishing its progress over
+    update_expression = "SET #stage = :storing, stageUpdatedAt = :now, processedFaces = :zero, progressPercent = :zero"
+    values = {
+        ':analyzing': STAGE_ANALYZING,
+        ':storing': STAGE_STORING,
+        ':now': now,
+        ':stale': now - stale_seconds,
+        ':zero': 0
+    }
+
+    condition = "attribute_exists(PK) AND "
+    if attempt:
+        condition += "analysisAttempt = :attempt AND "
+        values[':attempt'] = attempt
+    elif attempt == 0:
+        condition += "attribute_not_exists(analysisAttempt) AND "
+    elif job_id is not None:
+        condition += "(attribute_not_exists(rekognitionJobId) OR rekognitionJobId = :jobId) AND "
+    if job_id is not None:
+        update_expression += ", rekognitionJobId = :jobId"
+        values[':jobId'] = job_id
+    condition += "(attribute_not_exists(#stage) OR #stage = :analyzing OR (#stage = :storing AND stageUpdatedAt < :stale))"
+    return _transition(table, org_id, video_id, update_expression, condition, values, return_values='ALL_NEW')
+
+
+def record_progress(table, org_id: str, video_id: str, processed_faces: int, progress_percent: Optional[int]) -> bool:
+    """Publish how far storing has got; False once the video left the STORING stage
+
+    Also refreshes ``stageUpdatedAt``, so long videos that keep making
+    progress are not reclaimed as abandoned.
+    """
+    update_expression = "SET processedFaces = :faces, stageUpdatedAt = :now"
+    values = {
+        ':faces': processed_faces,
+        ':storing': STAGE_STORING,
+        ':now': int(time.time())
+    }
+    if progress_percent is not None:
+        update_expression += ", progressPercent = :percent"
+        values[':percent'] = progress_percent
+    return _transition(table, org_id, video_id, update_expression, "#stage = :storing", values) is not None
+
+
+def complete_processing(table, org_id: str, video_id: str, update_expression: str, values: Dict[str, Any]) -> bool:
+    """Mark stored results PROCESSED; extra SET clauses are appended to the update"""
+    update_expression += ", #status = :processed, #stage = :complete, stageUpdatedAt = :now"
+    values = {
+        **values,
+        ':processed': STATUS_PROCESSED,
+        ':complete': STAGE_COMPLETE,
+        ':storing': STAGE_STORING,
+        ':now': int(time.time())
+    }
+    return _transition(table, org_id, video_id, update_expression, "#stage = :storing", values) is not None
+
+
+def fail_processing(table, org_id: str, video_id: str, message: str,
+                    extra: Optional[Dict[str, Any]] = None, attempt: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Mark a video ERROR unless it already completed; returns the updated item
+
+    The attempt counter is bumped so a re-upload starts a new Rekognition job
+    instead of being handed the failed one. Passing ``attempt`` ignores
+    failures reported for a superseded attempt.
+    """
+    update_expression = ("SET #status = :error, #stage = :failed, errorMessage = :message, stageUpdatedAt = :now, "
+                         "analysisAttempt = if_not_exists(analysisAttempt, :zero) + :one")
+    values = {
+        ':error': STATUS_ERROR,
+        ':failed': STAGE_FAILED,
+        ':complete': STAGE_COMPLETE,
+        ':message': message,
+        ':now': int(time.time()),
+        ':zero': 0,
+        ':one': 1
+    }
+    for name, value in (extra or {}).items():
+        update_expression += f", {name} = :{name}"
+        values[f":{name}"] = value
+
+    condition = "attribute_exists(PK) AND (attribute_not_exists(#stage) OR #stage <> :complete)"
+    if attempt:
+        condition += " AND analysisAttempt = :attempt"
+        values[':attempt'] = attempt
+    elif attempt == 0:
+        condition += " AND attribute_not_exists(analysisAttempt)"
+
+    item = _transition(table, org_id, video_id, update_expression, condition, values, return_values='ALL_NEW')
+    if item is None:
+        print(f"Video {video_id} already completed or reanalyzed; not marking ERROR")
+    return item
@@ -0,0 +1,166 @@
+"""Normalize Rekognition faces a page at a time
+
+Faces are gathered into pages and each page is converted into typed
+columns (timestamps, confidences, age ranges, emotion scores) so age
+buckets, primary emotions and time keys are computed for the whole page at
+once: vectorized with numpy, otherwise with an equivalent pure-Python pass.
+Each face then carries its ``NormalizedFace`` row, and building its item is
+only a matter of assembling the dict.
+"""
+
+from bisect import bisect_right
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the pure-Python path gives the same values
+    np = None
+
+from ingestion import DEFAULT_PAGE_SIZE
+
+NORMALIZED_KEY = '_normalized'
+
+AGE_BUCKETS = ('0-17', '18-24', '25-34', '35-49', '50+')
+# Lower bound of every bucket after the first, by average of the age range
+AGE_BOUNDARIES = (18, 25, 35, 50)
+
+
+class NormalizedFace(NamedTuple):
+    """Per-face values ready to be placed into DynamoDB items"""
+
+    confidence: Any
+    attributes: Dict[str, Any]
+    timestamp: str
+    day: str
+
+
+def normalized(face: Dict[str, Any]) -> Optional[NormalizedFace]:
+    """The face's normalized row, if it went through ``normalize_faces``"""
+    return face.get(NORMALIZED_KEY)
+
+
+def to_decimal(value: Any) -> Any:
+    """Scalar counterpart of float_to_decimal"""
+    return Decimal(str(value)) if isinstance(value, float) else value
+
+
+def age_buckets(lows: List[float], highs: List[float], present: List[bool]) -> List[str]:
+    """Bucket each age range by the floor of its average"""
+    if np is not None and lows:
+        averages = (np.asarray(lows, dtype=np.float64) + np.asarray(highs, dtype=np.float64)) // 2
+        indexes = np.searchsorted(np.asarray(AGE_BOUNDARIES, dtype=np.float64), averages, side='right').tolist()
+    else:
+        indexes = [bisect_right(AGE_BOUNDARIES, (low + high) // 2) for low, high in zip(lows, highs)]
+    return [AGE_BUCKETS[index] if has_range else 'unknown' for index, has_range in zip(indexes, present)]
+
+
+def primary_emotions(emotion_lists: List[List[Dict[str, Any]]]) -> List[str]:
+    """Type of the most confident emotion per face (the first one on ties)"""
+    if np is None or not emotion_lists:
+        return [
+            max(emotions, key=lambda emotion: emotion.get('Confidence', 0)).get('Type', 'neutral').lower() if emotions else 'neutral'
+            for emotions in emotion_lists
+        ]
+
+    lengths = np.fromiter((len(emotions) for emotions in emotion_lists), dtype=np.int64, count=len(emotion_lists))
+    width = int(lengths.max())
+    if width == 0:
+        return ['neutral'] * len(emotion_lists)
+
+    # Ragged emotion lists become one padded matrix, reduced with argmax per row
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    rows = np.repeat(np.arange(len(emotion_lists)), lengths)
+    columns = np.arange(int(lengths.sum())) - np.repeat(offsets, lengths)
+    scores = np.full((len(emotion_lists), width), -np.inf)
+    flat = [emotion for emotions in emotion_lists for emotion in emotions]
+    scores[rows, columns] = [emotion.get('Confidence', 0) for emotion in flat]
+
+    best = (offsets + scores.argmax(axis=1)).tolist()
+    return [
+        flat[index].get('Type', 'neutral').lower() if length else 'neutral'
+        for index, length in zip(best, lengths.tolist())
+    ]
+
+
+def time_keys(timestamps: List[int]) -> Tuple[List[str], List[str]]:
+    """ISO timestamps and %Y%m%d day keys, converting each distinct second once
+
+    Matches ``datetime.fromtimestamp(timestamp / 1000)``: the fraction is
+    six digits and left out entirely on whole seconds.
+    """
+    seconds: Dict[int, Tuple[str, str]] = {}
+    isoformats: List[str] = []
+    days: List[str] = []
+    for timestamp in timestamps:
+        second, millisecond = divmod(int(timestamp), 1000)
+        keys = seconds.get(second)
+        if keys is None:
+            moment = datetime.fromtimestamp(second)
+            keys = seconds[second] = (moment.isoformat(), moment.strftime('%Y%m%d'))
+        isoformats.append(f"{keys[0]}.{millisecond:03d}000" if millisecond else keys[0])
+        days.append(keys[1])
+    return isoformats, days
+
+
+class FacePage:
+    """One page of faces held as typed columns"""
+
+    def __init__(self, faces: List[Dict[str, Any]]):
+        self.faces = faces
+        self.timestamps: List[int] = []
+        self.confidences: List[Any] = []
+        self.genders: List[str] = []
+        self.masks: List[bool] = []
+        lows: List[float] = []
+        highs: List[float] = []
+        has_ranges: List[bool] = []
+        emotion_lists: List[List[Dict[str, Any]]] = []
+
+        # One walk over the nested dicts fills every column
+        for face in faces:
+            details = face.get('Face', {})
+            age_range = details.get('AgeRange', {})
+            self.timestamps.append(face['Timestamp'])
+            self.confidences.append(to_decimal(details.get('Confidence', 0)))
+            self.genders.append(details.get('Gender', {}).get('Value', 'unknown'))
+            self.masks.append(details.get('FaceOccluded', {}).get('Value', False))
+            lows.append(age_range.get('Low', 0))
+            highs.append(age_range.get('High', 0))
+            has_ranges.append(bool(age_range))
+            emotion_lists.append(details.get('Emotions', []))
+
+        self.age_buckets = age_buckets(lows, highs, has_ranges)
+        self.emotions = primary_emotions(emotion_lists)
+        self.isoformats, self.days = time_keys(self.timestamps)
+
+    def __len__(self) -> int:
+        return len(self.faces)
+
+    def rows(self) -> Iterator[Tuple[Dict[str, Any], NormalizedFace]]:
+        columns = zip(self.faces, self.confidences, self.age_buckets, self.genders, self.emotions, self.masks,
+                      self.isoformats, self.days)
+        for face, confidence, age_bucket, gender, emotion, mask, isoformat, day in columns:
+            attributes = {'ageBucket': age_bucket, 'gender': gender, 'emotion': emotion, 'mask': mask}
+            yield face, NormalizedFace(confidence, attributes, isoformat, day)
+
+
+def iter_pages(faces: Iterable[Dict[str, Any]], page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[FacePage]:
+    """Group a face stream into normalized pages"""
+    page: List[Dict[str, Any]] = []
+    for face in faces:
+        page.append(face)
+        if len(page) >= page_size:
+            yield FacePage(page)
+            page = []
+    if page:
+        yield FacePage(page)
+
+
+def normalize_faces(faces: Iterable[Dict[str, Any]], page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Pass faces through in order, each carrying its normalized row"""
+    for page in iter_pages(faces, page_size):
+        for face, row in page.rows():
+            face[NORMALIZED_KEY] = row
+            yield face
@@ -0,0 +1,232 @@
+"""Opt-in cProfile and tracemalloc capture for slow invocations
+
+Profiling is off unless ``PROFILING_ENABLED=true`` or the invocation's event
+carries ``"profile": true``: at the top level, in an SQS message body, or in
+the SNS message a record or SQS body wraps. Each profiled section writes
+two files:
+
+    {prefix}/{requestId}/{NN}-{section}[-{videoId}].prof   raw pstats, for snakeviz or pstats
+    {prefix}/{requestId}/{NN}-{section}[-{videoId}].txt    wall/CPU time, memory, top functions and allocations
+
+to ``s3://{VIDEO_BUCKET}/profiles/{date}/`` or, when ``PROFILE_OUTPUT_DIR`` is
+set (offline runs), to that directory.
+
+Sections nest. While an inner section runs, the outer profiler is paused,
+and afterwards the inner statistics are merged back into the outer report,
+so the outer report still covers the whole call. Only one thread profiles at
+a time. Sections started on other threads meanwhile are skipped.
+
+Tracing every allocation slows Python code down several times, so read the
+reports for where time and memory go, not for absolute latency; the EMF
+stage metrics remain the latency reference.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional
+
+PROFILE_PREFIX = 'profiles'
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# Frames kept per allocation traceback; more frames cost more memory while tracing
+TRACEMALLOC_FRAMES = 10
+
+
+def _flagged(payload: Any) -> bool:
+    """True for a dict, or JSON object string, carrying ``"profile": true``"""
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return False
+    return isinstance(payload, dict) and payload.get('profile') is True
+
+
+def profile_requested(event: Any) -> bool:
+    """Whether the event, or any SQS or SNS payload it carries, asks for profiling"""
+    if not isinstance(event, dict):
+        return False
+    if event.get('profile') is True:
+        return True
+    for record in event.get('Records') or []:
+        if not isinstance(record, dict):
+            continue
+        if record.get('eventSource') == 'aws:sqs':
+            body = record.get('body')
+            if _flagged(body):
+                return True
+            try:
+                envelope = json.loads(body)
+            except (TypeError, ValueError):
+                continue
+            # SNS subscriptions deliver the envelope unless raw delivery is on
+            if isinstance(envelope, dict) and _flagged(envelope.get('Message')):
+                return True
+        elif _flagged(record.get('Sns', {}).get('Message')):
+            return True
+    return False
+
+
+class Profiler:
+    """Per-invocation profiling of selected handler sections"""
+
+    def __init__(self, s3_client: Callable[[], Any], bucket: Optional[str], output_dir: Optional[str] = None,
+                 always: bool = False):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.output_dir = output_dir
+        self.always = always
+        self.enabled = False
+        self.run_id = ''
+        self._sequence = 0
+        self._owner: Optional[int] = None
+        self._stack: List[cProfile.Profile] = []
+        self._children: List[List[cProfile.Profile]] = []
+        # Wall and CPU seconds spent profiling nested sections, left out of each open section's times
+        self._overhead: List[List[float]] = []
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def begin(self, event: Any, context=None) -> None:
+        """Decide whether this invocation is profiled"""
+        self.enabled = self.always or profile_requested(event)
+        self._sequence = 0
+        request_id = getattr(context, 'aws_request_id', None) or datetime.utcnow().strftime('%H%M%S%f')
+        self.run_id = f"{datetime.utcnow().strftime('%Y/%m/%d')}/{request_id}"
+
+    @contextmanager
+    def section(self, name: str, video_id: Optional[str] = None) -> Iterator[None]:
+        """Profile the block when profiling is on for this invocation"""
+        if not self.enabled or not self._claim():
+            yield
+            return
+
+        label = f"{name}-{video_id}" if video_id else name
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        outermost = not self._stack
+        if self._stack:
+            self._stack[-1].disable()
+        paused_wall, paused_cpu = time.perf_counter(), time.process_time()
+
+        if outermost and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        if outermost:
+            tracemalloc.reset_peak()
+        memory_before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        self._stack.append(profile)
+        self._children.append([])
+        self._overhead.append([0.0, 0.0])
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            overhead_wall, overhead_cpu = self._overhead.pop()
+            wall = time.perf_counter() - wall_started - overhead_wall
+            cpu = time.process_time() - cpu_started - overhead_cpu
+            self._stack.pop()
+            children = self._children.pop()
+            memory_after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+
+            try:
+                self._write(f"{sequence:02d}-{label}", [profile] + children, memory_before, memory_after,
+                            wall * 1000, cpu * 1000, peak)
+            except Exception as e:
+                # Profiling must never fail the invocation
+                print(f"Error writing profile {label}: {e}")
+
+            if self._stack:
+                # The parent report includes this section's calls, but not the
+                # snapshots and report writing done on its behalf
+                self._children[-1].append(profile)
+                self._children[-1].extend(children)
+                self._overhead[-1][0] += time.perf_counter() - paused_wall - wall
+                self._overhead[-1][1] += time.process_time() - paused_cpu - cpu
+                self._stack[-1].enable()
+            else:
+                if self._started_tracemalloc:
+                    tracemalloc.stop()
+                    self._started_tracemalloc = False
+                self._release()
+
+    def _claim(self) -> bool:
+        thread = threading.get_ident()
+        with self._lock:
+            if self._owner is None:
+                self._owner = thread
+            if self._owner != thread:
+                print("Profiling already active on another thread; section skipped")
+                return False
+            return True
+
+    def _release(self) -> None:
+        with self._lock:
+            self._owner = None
+
+    def _write(self, label: str, profiles: List[cProfile.Profile], memory_before: tracemalloc.Snapshot,
+               memory_after: tracemalloc.Snapshot, wall_ms: float, cpu_ms: float, peak: int) -> None:
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+
+        report = io.StringIO()
+        report.write(f"section: {label}\nrun: {self.run_id}\n")
+        report.write(f"wall: {wall_ms:.1f} ms\ncpu: {cpu_ms:.1f} ms\n")
+        # Wall time the CPU did not account for was spent waiting (DynamoDB, Rekognition, S3)
+        report.write(f"waiting: {max(wall_ms - cpu_ms, 0):.1f} ms\n")
+        report.write(f"peak traced memory: {peak / 1024 / 1024:.1f} MiB\n\n")
+
+        report.write(f"Top {TOP_FUNCTIONS} functions by cumulative time\n")
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+        report.write(f"\nTop {TOP_ALLOCATIONS} allocation changes by line\n")
+        for difference in memory_after.compare_to(memory_before, 'lineno')[:TOP_ALLOCATIONS]:
+            report.write(f"{difference}\n")
+
+        with tempfile.NamedTemporaryFile(suffix='.prof') as raw:
+            stats.dump_stats(raw.name)
+            with open(raw.name, 'rb') as source:
+                raw_bytes = source.read()
+
+        self._save(f"{label}.prof", raw_bytes, 'application/octet-stream')
+        self._save(f"{label}.txt", report.getvalue().encode('utf-8'), 'text/plain')
+
+    def _save(self, name: str, body: bytes, content_type: str) -> None:
+        if self.output_dir:
+            path = os.path.join(self.output_dir, self.run_id, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as output:
+                output.write(body)
+            print(f"Profile written to {path}")
+            return
+
+        key = f"{PROFILE_PREFIX}/{self.run_id}/{name}"
+        self.s3_client().put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        print(f"Profile written to s3://{self.bucket}/{key}")
+
+
+def create_profiler(s3_client: Callable[[], Any]) -> Profiler:
+    return Profiler(
+        s3_client,
+        os.environ.get('VIDEO_BUCKET'),
+        output_dir=os.environ.get('PROFILE_OUTPUT_DIR'),
+        always=os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    )
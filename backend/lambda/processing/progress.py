@@ -0,0 +1,77 @@
+"""Page-by-page publication of stored detections while results are fetched
+
+Rekognition results arrive in pages of up to 1000 faces. When a page has
+been handed downstream, the detection writer is synced and the VIDEO# item
+gets ``processedFaces`` and ``progressPercent``, so search and playback see
+partial results long before the video is PROCESSED.
+
+Filtering, tracking and normalization hold some faces across page
+boundaries (a track is written only once it closes), so ``processedFaces``
+is not the fetched count: it counts the faces behind the items already
+written plus the faces the filters dropped, i.e. detections whose outcome is
+stored. ``progressPercent`` is how far into the video the fetched results
+reach. Updates are made at most every ``interval_seconds``; the first page
+always publishes. Detection archives are written only when complete, so
+archive mode publishes no partial progress.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_INTERVAL_SECONDS = 2
+# 100 is reserved for the completed video
+MAX_PARTIAL_PERCENT = 99
+
+
+class ProgressPublisher:
+    """Syncs the detection writer and records progress at page boundaries"""
+
+    def __init__(self, record: Callable[[int, Optional[int]], bool], video_id: str,
+                 interval_seconds: float = DEFAULT_INTERVAL_SECONDS, dropped_faces: Callable[[], int] = lambda: 0):
+        self.record = record
+        self.video_id = video_id
+        self.interval_seconds = interval_seconds
+        self.dropped_faces = dropped_faces
+        self.writer = None
+        self.fetched_faces = 0
+        self.written_faces = 0
+        self.processed_faces = 0
+        self.progress_percent: Optional[int] = None
+        self.updates = 0
+        self.active = True
+        self._published_at: Optional[float] = None
+
+    def attach(self, writer) -> None:
+        """Use the writer the detections of this video go through"""
+        self.writer = writer
+
+    def observe_item(self, item: Dict[str, Any]) -> None:
+        """Count the faces behind an item handed to the writer"""
+        self.written_faces += int(item.get('detectionCount', 1))
+
+    def page_done(self, response: Dict[str, Any]) -> None:
+        """on_page callback for iter_face_detections"""
+        faces = response.get('Faces', [])
+        self.fetched_faces += len(faces)
+        duration = response.get('VideoMetadata', {}).get('DurationMillis')
+        if faces and duration:
+            self.progress_percent = min(MAX_PARTIAL_PERCENT, int(faces[-1].get('Timestamp', 0) * 100 / duration))
+
+        if not self.active or 'NextToken' not in response:
+            # The completion write publishes the final page
+            return
+        now = time.monotonic()
+        if self._published_at is not None and now - self._published_at < self.interval_seconds:
+            return
+        self._published_at = now
+
+        if self.writer is not None and not self.writer.sync():
+            # Failed batches are raised when the writer closes; do not report them as stored
+            return
+        # Every item yielded before this page boundary has been put and is now written
+        self.processed_faces = self.written_faces + self.dropped_faces()
+        if self.record(self.processed_faces, self.progress_percent):
+            self.updates += 1
+        else:
+            print(f"Video {self.video_id} left the STORING stage; no further progress updates")
+            self.active = False
@@ -0,0 +1,461 @@
+"""Admission control and per-org fair scheduling for Rekognition video jobs
+
+Rekognition limits how many video jobs an account may run at once and how
+fast they may be started. Instead of calling start_face_detection as soon
+as an upload lands, videos are queued per org in DynamoDB and started only
+when a slot is free and the start-rate token bucket allows it:
+
+    SCHEDULER#REKOGNITION / SLOTS            inFlight, token bucket, backoff
+    SCHEDULER#REKOGNITION / ORG#{org}        queued count, lastServedAt
+    SCHEDULER#REKOGNITION / JOB#{org}#{video}#{attempt}   slot lease
+    SCHEDULER#QUEUE#{org} / {enqueuedAt}#{video}          queued video
+
+Orgs with queued videos are served least-recently-served first, so one
+large tenant cannot starve the others. Slot and lease changes are written
+together in transactions, which keeps the in-flight count exact under
+duplicate deliveries.
+
+A video leaves the queue in the same transaction that takes its slot, and
+its lease keeps the queue entry until the started job's id is recorded on
+it. A dispatcher that dies in between leaves a lease without a job, which
+is put back in the queue once it is older than ``start_timeout_seconds``.
+"""
+
+import random
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from batch_writer import backoff_delay
+
+SCHEDULER_PK = 'SCHEDULER#REKOGNITION'
+SLOTS_SK = 'SLOTS'
+
+# Rekognition's default quota is 20 concurrent stored-video jobs per account
+DEFAULT_MAX_CONCURRENT_JOBS = 20
+DEFAULT_START_RATE = 5.0
+DEFAULT_START_BURST = 5
+# A lease older than this is assumed lost (missed notification) and reclaimed
+DEFAULT_LEASE_SECONDS = 6 * 3600
+# A lease still without a job after this long lost its dispatcher (the Lambda timeout)
+DEFAULT_START_TIMEOUT_SECONDS = 15 * 60
+
+THROTTLE_ERRORS = ('LimitExceededException', 'ThrottlingException', 'ProvisionedThroughputExceededException')
+
+ACQUIRED = 'acquired'
+DUPLICATE = 'duplicate'
+TAKEN = 'taken'
+FULL = 'full'
+RATE_LIMITED = 'rate_limited'
+BACKING_OFF = 'backing_off'
+CONTENDED = 'contended'
+
+
+def is_throttle_error(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLE_ERRORS
+
+
+@dataclass
+class QueuedVideo:
+    """A video waiting for a Rekognition job slot"""
+
+    org_id: str
+    video_id: str
+    bucket: str
+    key: str
+    attempt: int = 0
+    enqueued_at: int = 0
+
+    def queue_key(self) -> Dict[str, str]:
+        return {
+            'PK': f"SCHEDULER#QUEUE#{self.org_id}",
+            'SK': f"{self.enqueued_at:013d}#{self.video_id}"
+        }
+
+    def lease_key(self) -> Dict[str, str]:
+        return lease_key(self.org_id, self.video_id, self.attempt)
+
+    def to_item(self) -> Dict[str, Any]:
+        return {
+            **self.queue_key(),
+            'orgId': self.org_id,
+            'videoId': self.video_id,
+            'bucket': self.bucket,
+            'videoKey': self.key,
+            'attempt': self.attempt,
+            'enqueuedAt': self.enqueued_at
+        }
+
+    def to_lease(self, leased_at: int) -> Dict[str, Any]:
+        """Lease item that can put the video back in the queue until its job is recorded"""
+        return {
+            **self.to_item(),
+            **self.lease_key(),
+            'leasedAt': leased_at
+        }
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'QueuedVideo':
+        return cls(
+            org_id=item['orgId'],
+            video_id=item['videoId'],
+            bucket=item['bucket'],
+            key=item['videoKey'],
+            attempt=int(item.get('attempt', 0)),
+            enqueued_at=int(item['enqueuedAt'])
+        )
+
+
+def lease_key(org_id: str, video_id: str, attempt: int) -> Dict[str, str]:
+    return {
+        'PK': SCHEDULER_PK,
+        'SK': f"JOB#{org_id}#{video_id}#{attempt}"
+    }
+
+
+def org_key(org_id: str) -> Dict[str, str]:
+    return {
+        'PK': SCHEDULER_PK,
+        'SK': f"ORG#{org_id}"
+    }
+
+
+def slots_key() -> Dict[str, str]:
+    return {
+        'PK': SCHEDULER_PK,
+        'SK': SLOTS_SK
+    }
+
+
+class JobScheduler:
+    """Starts queued videos while Rekognition slots and start tokens allow
+
+    ``start_job`` starts the Rekognition job for a video. Throttling errors
+    put the video back in the queue and pause starts with jittered
+    exponential backoff; any other error releases the slot and is handed to
+    ``on_start_failure``.
+    """
+
+    def __init__(self, table, start_job: Callable[[QueuedVideo], str],
+                 on_start_failure: Callable[[QueuedVideo, Exception], None],
+                 max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 start_rate: float = DEFAULT_START_RATE, start_burst: int = DEFAULT_START_BURST,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                 start_timeout_seconds: int = DEFAULT_START_TIMEOUT_SECONDS, max_attempts: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 300.0):
+        self.table = table
+        self.client = table.meta.client
+        self.start_job = start_job
+        self.on_start_failure = on_start_failure
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.start_rate = start_rate
+        self.start_burst = start_burst
+        self.lease_seconds = lease_seconds
+        self.start_timeout_seconds = start_timeout_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def enqueue(self, video: QueuedVideo, last_served_at: Optional[int] = None) -> None:
+        """Queue a video behind those already waiting for its org
+
+        A video put back after a deferred start keeps its place in line, and
+        ``last_served_at`` restores its org's turn.
+        """
+        self._transact(self._enqueue_items(video, last_served_at))
+
+    def _enqueue_items(self, video: QueuedVideo, last_served_at: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not video.enqueued_at:
+            video.enqueued_at = int(time.time() * 1000)
+        update_expression = 'ADD queued :one'
+        values: Dict[str, Any] = {':one': 1}
+        if last_served_at is not None:
+            update_expression += ' SET lastServedAt = :lastServedAt'
+            values[':lastServedAt'] = last_served_at
+        return [
+            {'Put': {
+                'TableName': self.table.name,
+                'Item': video.to_item(),
+                'ConditionExpression': 'attribute_not_exists(PK)'
+            }},
+            {'Update': {
+                'TableName': self.table.name,
+                'Key': org_key(video.org_id),
+                'UpdateExpression': update_expression,
+                'ExpressionAttributeValues': values
+            }}
+        ]
+
+    def dispatch(self, limit: Optional[int] = None) -> int:
+        """Start queued videos, fairest org first, until capacity or the queue runs out"""
+        self.requeue_stalled_starts()
+        started = 0
+        while limit is None or started < limit:
+            outcome, _ = self._capacity(self._read_slots(), time.time())
+            if outcome is not None:
+                if outcome == FULL:
+                    self.reap_expired_leases()
+                print(f"Rekognition admission deferred: {outcome}")
+                break
+
+            candidate = self._next_video()
+            if candidate is None:
+                break
+            video, last_served_at = candidate
+
+            # The queue entry is taken with the slot, so only one dispatcher handles it
+            outcome = self._acquire(video)
+            if outcome == TAKEN:
+                continue
+            if outcome == DUPLICATE:
+                print(f"Video {video.video_id} attempt {video.attempt} already holds a slot; dropping duplicate entry")
+                self._dequeue(video)
+                continue
+            if outcome != ACQUIRED:
+                print(f"Rekognition admission deferred: {outcome}")
+                break
+
+            try:
+                job_id = self.start_job(video)
+            except Exception as e:
+                if is_throttle_error(e):
+                    print(f"Rekognition throttled starting video {video.video_id}: {e}")
+                    self._requeue(video, last_served_at)
+                    self._back_off()
+                    break
+                self.release(video.org_id, video.video_id, video.attempt)
+                self.on_start_failure(video, e)
+                continue
+
+            self._record_job(video, job_id)
+            started += 1
+            print(f"Admitted video {video.video_id} for org {video.org_id} as job {job_id}")
+        return started
+
+    def release(self, org_id: str, video_id: str, attempt: int) -> bool:
+        """Free the slot held by a finished job; False if it was already released"""
+        try:
+            self._transact([
+                {'Delete': {
+                    'TableName': self.table.name,
+                    'Key': lease_key(org_id, video_id, attempt),
+                    'ConditionExpression': 'attribute_exists(PK)'
+                }},
+                {'Update': {
+                    'TableName': self.table.name,
+                    'Key': slots_key(),
+                    'UpdateExpression': 'ADD inFlight :minusOne',
+                    'ExpressionAttributeValues': {':minusOne': -1}
+                }}
+            ])
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                raise
+            return False
+        return True
+
+    def reap_expired_leases(self) -> int:
+        """Release slots whose completion notification never arrived"""
+        cutoff = int(time.time()) - self.lease_seconds
+        reaped = 0
+        for lease in self._query(
+            KeyConditionExpression=Key('PK').eq(SCHEDULER_PK) & Key('SK').begins_with('JOB#'),
+            FilterExpression=Attr('leasedAt').lt(cutoff)
+        ):
+            if self.release(lease['orgId'], lease['videoId'], int(lease['attempt'])):
+                print(f"Reclaimed expired Rekognition slot of video {lease['videoId']}")
+                reaped += 1
+        return reaped
+
+    def requeue_stalled_starts(self) -> int:
+        """Put videos whose dispatcher died before their job was recorded back in the queue"""
+        cutoff = int(time.time()) - self.start_timeout_seconds
+        requeued = 0
+        for lease in self._query(
+            KeyConditionExpression=Key('PK').eq(SCHEDULER_PK) & Key('SK').begins_with('JOB#'),
+            FilterExpression=Attr('leasedAt').lt(cutoff) & Attr('jobId').not_exists() & Attr('videoKey').exists()
+        ):
+            video = QueuedVideo.from_item(lease)
+            if not self._requeue(video):
+                continue
+            print(f"Requeued video {video.video_id}: its Rekognition job was never recorded")
+            requeued += 1
+        return requeued
+
+    def _requeue(self, video: QueuedVideo, last_served_at: Optional[int] = None) -> bool:
+        """Give up the video's slot and put it back in its place in line; False if the lease is gone or started"""
+        try:
+            self._transact([
+                {'Delete': {
+                    'TableName': self.table.name,
+                    'Key': video.lease_key(),
+                    'ConditionExpression': 'attribute_exists(PK) AND attribute_not_exists(jobId)'
+                }},
+                {'Update': {
+                    'TableName': self.table.name,
+                    'Key': slots_key(),
+                    'UpdateExpression': 'ADD inFlight :minusOne',
+                    'ExpressionAttributeValues': {':minusOne': -1}
+                }},
+                *self._enqueue_items(video, last_served_at)
+            ])
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                raise
+            return False
+        return True
+
+    def _record_job(self, video: QueuedVideo, job_id: str) -> None:
+        try:
+            self.table.update_item(
+                Key=video.lease_key(),
+                UpdateExpression='SET jobId = :jobId',
+                ConditionExpression='attribute_exists(PK)',
+                ExpressionAttributeValues={':jobId': job_id}
+            )
+        except ClientError as e:
+            # The job already finished and released its lease
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+
+    def _acquire(self, video: QueuedVideo) -> str:
+        """Take the queue entry, a slot and a start token for the video in one transaction"""
+        for attempt in range(self.max_attempts):
+            now = time.time()
+            slots = self._read_slots()
+            outcome, tokens = self._capacity(slots, now)
+            if outcome is not None:
+                return outcome
+
+            version = int(slots.get('version', 0))
+            try:
+                self._transact([
+                    {'Update': {
+                        'TableName': self.table.name,
+                        'Key': slots_key(),
+                        'UpdateExpression': ('SET tokens = :tokens, refilledAt = :now, version = :nextVersion, '
+                                             'inFlight = if_not_exists(inFlight, :zero) + :one'),
+                        'ConditionExpression': ('(attribute_not_exists(version) OR version = :version) AND '
+                                                '(attribute_not_exists(inFlight) OR inFlight < :maxJobs)'),
+                        'ExpressionAttributeValues': {
+                            ':tokens': Decimal(str(round(tokens - 1, 3))),
+                            ':now': Decimal(str(round(now, 3))),
+                            ':version': version,
+                            ':nextVersion': version + 1,
+                            ':zero': 0,
+                            ':one': 1,
+                            ':maxJobs': self.max_concurrent_jobs
+                        }
+                    }},
+                    {'Put': {
+                        'TableName': self.table.name,
+                        'Item': video.to_lease(int(now)),
+                        'ConditionExpression': 'attribute_not_exists(PK)'
+                    }},
+                    *self._dequeue_items(video)
+                ])
+                return ACQUIRED
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                    raise
+                reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+                if len(reasons) > 2 and reasons[2] == 'ConditionalCheckFailed':
+                    return TAKEN
+                if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+                    return DUPLICATE
+                # Another dispatcher moved the bucket; re-read and try again
+                time.sleep(backoff_delay(attempt, 0.02, 0.5))
+        return CONTENDED
+
+    def _read_slots(self) -> Dict[str, Any]:
+        return self.table.get_item(Key=slots_key(), ConsistentRead=True).get('Item', {})
+
+    def _capacity(self, slots: Dict[str, Any], now: float) -> Tuple[Optional[str], float]:
+        """(reason starts must wait or None, tokens available after refill)"""
+        if int(slots.get('inFlight', 0)) >= self.max_concurrent_jobs:
+            return FULL, 0.0
+        if float(slots.get('backoffUntil', 0)) > now:
+            return BACKING_OFF, 0.0
+
+        # Refill the token bucket for the time since the last start
+        refilled_at = float(slots.get('refilledAt', now))
+        tokens = min(self.start_burst, float(slots.get('tokens', self.start_burst)) + (now - refilled_at) * self.start_rate)
+        if tokens < 1:
+            return RATE_LIMITED, tokens
+        return None, tokens
+
+    def _next_video(self) -> Optional[Tuple[QueuedVideo, int]]:
+        """Oldest queued video of the least recently served org, with that org's lastServedAt"""
+        orgs = list(self._query(
+            KeyConditionExpression=Key('PK').eq(SCHEDULER_PK) & Key('SK').begins_with('ORG#'),
+            FilterExpression=Attr('queued').gt(0)
+        ))
+        for org in sorted(orgs, key=lambda item: (int(item.get('lastServedAt', 0)), item['SK'])):
+            org_id = org['SK'][len('ORG#'):]
+            items = self.table.query(
+                KeyConditionExpression=Key('PK').eq(f"SCHEDULER#QUEUE#{org_id}"),
+                ConsistentRead=True,
+                Limit=1
+            ).get('Items', [])
+            if items:
+                return QueuedVideo.from_item(items[0]), int(org.get('lastServedAt', 0))
+        return None
+
+    def _dequeue(self, video: QueuedVideo) -> bool:
+        try:
+            self._transact(self._dequeue_items(video))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                raise
+            return False
+        return True
+
+    def _dequeue_items(self, video: QueuedVideo) -> List[Dict[str, Any]]:
+        return [
+            {'Delete': {
+                'TableName': self.table.name,
+                'Key': video.queue_key(),
+                'ConditionExpression': 'attribute_exists(PK)'
+            }},
+            {'Update': {
+                'TableName': self.table.name,
+                'Key': org_key(video.org_id),
+                'UpdateExpression': 'ADD queued :minusOne SET lastServedAt = :now',
+                'ExpressionAttributeValues': {':minusOne': -1, ':now': int(time.time() * 1000)}
+            }}
+        ]
+
+    def _back_off(self) -> None:
+        """Pause all starts; the pause doubles while throttling keeps recurring"""
+        now = time.time()
+        slots = self._read_slots()
+        streak = int(slots.get('throttleStreak', 0))
+        # A throttle long after the last pause starts a new streak
+        if now - float(slots.get('backoffUntil', 0)) > self.max_delay:
+            streak = 0
+        delay = min(self.max_delay, self.base_delay * (2 ** streak))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.table.update_item(
+            Key=slots_key(),
+            UpdateExpression='SET backoffUntil = :until, throttleStreak = :streak',
+            ExpressionAttributeValues={
+                ':until': Decimal(str(round(now + delay, 3))),
+                ':streak': streak + 1
+            }
+        )
+
+    def _transact(self, items: List[Dict[str, Any]]) -> None:
+        self.client.transact_write_items(TransactItems=items)
+
+    def _query(self, **kwargs) -> Iterator[Dict[str, Any]]:
+        kwargs['ConsistentRead'] = True
+        while True:
+            response = self.table.query(**kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,87 @@
+"""Write sharding for hot GSI partition keys and scatter-gather reads"""
+
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from boto3.dynamodb.conditions import Key
+
+DEFAULT_SHARD_COUNT = 10
+
+
+def shard_for(value: str, shard_count: int) -> int:
+    """Deterministic shard for a value; stable across processes unlike hash()"""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(value.encode('utf-8')) % shard_count
+
+
+def sharded_key(base_key: str, shard_value: str, shard_count: int) -> str:
+    """Append a two-digit shard suffix, e.g. ATTR#color#unknown#07
+
+    A shard count of 1 leaves the key unsharded.
+    """
+    if shard_count <= 1:
+        return base_key
+    return f"{base_key}#{shard_for(shard_value, shard_count):02d}"
+
+
+def shard_keys(base_key: str, shard_count: int) -> List[str]:
+    """Every partition key a sharded base key is spread across"""
+    if shard_count <= 1:
+        return [base_key]
+    return [f"{base_key}#{shard:02d}" for shard in range(shard_count)]
+
+
+def _query_partition(client, table_name: str, index_name: str, partition_attr: str, partition_key: str,
+                     sort_condition=None, limit: Optional[int] = None, scan_forward: bool = True) -> List[Dict[str, Any]]:
+    key_condition = Key(partition_attr).eq(partition_key)
+    if sort_condition is not None:
+        key_condition = key_condition & sort_condition
+
+    request = {
+        'TableName': table_name,
+        'IndexName': index_name,
+        'KeyConditionExpression': key_condition,
+        'ScanIndexForward': scan_forward,
+    }
+    if limit:
+        request['Limit'] = limit
+
+    items: List[Dict[str, Any]] = []
+    while True:
+        response = client.query(**request)
+        items.extend(response.get('Items', []))
+        if limit and len(items) >= limit:
+            return items[:limit]
+        if 'LastEvaluatedKey' not in response:
+            return items
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def query_sharded_index(dynamodb_resource, table_name: str, index_name: str, partition_attr: str, sort_attr: str,
+                        base_key: str, shard_count: int, sort_condition=None, limit: Optional[int] = None,
+                        scan_forward: bool = True, max_workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Query every shard of a GSI partition in parallel and merge by sort key
+
+    ``sort_condition`` is an optional boto3 ``Key(sort_attr)`` condition such
+    as ``Key('GSI3SK').between(start, end)``. Each shard is read in sort-key
+    order, so a k-way merge yields the union in global sort-key order.
+    """
+    client = dynamodb_resource.meta.client
+    partition_keys = shard_keys(base_key, shard_count)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(partition_keys)) as executor:
+        futures = [
+            executor.submit(_query_partition, client, table_name, index_name, partition_attr, partition_key,
+                            sort_condition, limit, scan_forward)
+            for partition_key in partition_keys
+        ]
+        shard_results = [future.result() for future in futures]
+
+    merged = heapq.merge(*shard_results, key=lambda item: item[sort_attr], reverse=not scan_forward)
+    for count, item in enumerate(merged):
+        if limit and count >= limit:
+            break
+        yield item
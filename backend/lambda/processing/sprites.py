@@ -0,0 +1,212 @@
+"""Scrub-preview sprite sheets built in one MediaConvert job per video
+
+The frames worth previewing are the detection-dense ones, so each becomes a
+one-second input clip (as for thumbnails) and MediaConvert's image-based
+trick play tiles one frame per second of the clipped timeline into JPEG
+sheets. Clips end on the last frame of their second (the end timecode is
+inclusive), so each lasts exactly one tile interval. Tile N is therefore the
+Nth timestamp, and the compact index stored on the video (and next to the
+sheets) is enough to locate it:
+
+    sheet  = N // (columns * rows)
+    column = N % columns
+    row    = N % (columns * rows) // columns
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from thumbnails import MAX_JOB_INPUTS, clip_inputs
+
+DEFAULT_SPRITE_FRAMES = 60
+DEFAULT_COLUMNS = 10
+DEFAULT_ROWS = 6
+TILE_WIDTH = 160
+TILE_HEIGHT = 120
+
+SPRITE_PROCESSING = 'processing'
+SPRITE_READY = 'ready'
+SPRITE_FAILED = 'failed'
+
+
+def sprite_prefix(org_id: str, video_id: str) -> str:
+    """S3 prefix holding a video's sprite sheets and their index"""
+    return f"{org_id}/sprites/{video_id}/"
+
+
+def sprite_job_settings(clips: List[Dict[str, Any]], destination: str, columns: int, rows: int) -> Dict[str, Any]:
+    """Job settings tiling one frame per one-second clip into sprite sheets
+
+    Trick-play images need a CMAF group, so the group also carries a
+    minimal low-bitrate rendition that is never served.
+    """
+    return {
+        'TimecodeConfig': {
+            'Source': 'ZEROBASED'
+        },
+        'Inputs': clip_inputs(clips),
+        'OutputGroups': [{
+            'Name': 'Sprite Group',
+            'OutputGroupSettings': {
+                'Type': 'CMAF_GROUP_SETTINGS',
+                'CmafGroupSettings': {
+                    'Destination': destination,
+                    'SegmentLength': 30,
+                    'FragmentLength': 2,
+                    'ImageBasedTrickPlay': 'ADVANCED',
+                    'ImageBasedTrickPlaySettings': {
+                        # One tile per one-second clip
+                        'IntervalCadence': 'FOLLOW_CUSTOM',
+                        'ThumbnailInterval': 1,
+                        'ThumbnailWidth': TILE_WIDTH,
+                        'ThumbnailHeight': TILE_HEIGHT,
+                        'TileWidth': columns,
+                        'TileHeight': rows
+                    }
+                }
+            },
+            'Outputs': [
+                {
+                    'NameModifier': '_preview',
+                    'ContainerSettings': {
+                        'Container': 'CMFC'
+                    },
+                    'VideoDescription': {
+                        'Width': TILE_WIDTH,
+                        'Height': TILE_HEIGHT,
+                        'ScalingBehavior': 'DEFAULT',
+                        'CodecSettings': {
+                            'Codec': 'H_264',
+                            'H264Settings': {
+                                'RateControlMode': 'QVBR',
+                                'MaxBitrate': 100000
+                            }
+                        }
+                    }
+                }
+            ]
+        }]
+    }
+
+
+class SpriteSheetGenerator:
+    """Submits sprite sheet jobs and records their tile index when they finish"""
+
+    def __init__(self, table, mediaconvert_client: Callable[[], Any], s3_client: Callable[[], Any], role_arn: str,
+                 columns: int = DEFAULT_COLUMNS, rows: int = DEFAULT_ROWS):
+        self.table = table
+        self.mediaconvert_client = mediaconvert_client
+        self.s3_client = s3_client
+        self.role_arn = role_arn
+        self.columns = columns
+        self.rows = rows
+
+    def submit(self, org_id: str, video_id: str, bucket: str, video_key: str, timestamps: List[int],
+               frame_rate: Optional[float] = None) -> str:
+        """Start the sprite job for a video's preview frames; returns the job id"""
+        timestamps = sorted(int(timestamp) for timestamp in timestamps)[:MAX_JOB_INPUTS]
+        clips = [{'bucket': bucket, 'key': video_key, 'timestamp': timestamp, 'frameRate': frame_rate}
+                 for timestamp in timestamps]
+        response = self.mediaconvert_client().create_job(
+            Role=self.role_arn,
+            Settings=sprite_job_settings(clips, f"s3://{bucket}/{sprite_prefix(org_id, video_id)}", self.columns, self.rows),
+            UserMetadata={'spriteOrgId': org_id, 'spriteVideoId': video_id}
+        )
+        job_id = response['Job']['Id']
+
+        # Replaces the sheet of any earlier analysis; its job can no longer complete it
+        self._set_sprite(org_id, video_id, {
+            'status': SPRITE_PROCESSING,
+            'jobId': job_id,
+            'bucket': bucket,
+            'columns': self.columns,
+            'rows': self.rows,
+            'tileWidth': TILE_WIDTH,
+            'tileHeight': TILE_HEIGHT,
+            'timestamps': timestamps
+        })
+        print(f"MediaConvert job {job_id} submitted for {len(timestamps)} sprite frames of video {video_id}")
+        return job_id
+
+    def complete(self, detail: Dict[str, Any]) -> bool:
+        """Handle a sprite job's state change; returns whether the video was updated"""
+        metadata = detail.get('userMetadata', {})
+        org_id = metadata.get('spriteOrgId')
+        video_id = metadata.get('spriteVideoId')
+        status = detail.get('status')
+        if not org_id or not video_id or status not in ('COMPLETE', 'ERROR', 'CANCELED'):
+            return False
+
+        video = self.table.get_item(
+            Key={'PK': f"ORG#{org_id}", 'SK': f"VIDEO#{video_id}"},
+            ConsistentRead=True
+        ).get('Item') or {}
+        sprite = video.get('spriteSheet')
+        if not sprite or sprite.get('jobId') != detail.get('jobId') or sprite.get('status') != SPRITE_PROCESSING:
+            print(f"Sprite job {detail.get('jobId')} for video {video_id} is stale or already handled")
+            return False
+
+        sheets: List[str] = []
+        if status == 'COMPLETE':
+            bucket = sprite['bucket']
+            sheets = self._list_sheets(bucket, sprite_prefix(org_id, video_id))
+            if sheets:
+                sprite = {**sprite, 'status': SPRITE_READY, 'sheets': sheets, 'completedAt': datetime.utcnow().isoformat()}
+                self.s3_client().put_object(
+                    Bucket=bucket,
+                    Key=f"{sprite_prefix(org_id, video_id)}index.json",
+                    Body=json.dumps(self.index(sprite)).encode('utf-8'),
+                    ContentType='application/json'
+                )
+        if not sheets:
+            sprite = {**sprite, 'status': SPRITE_FAILED}
+
+        updated = self._set_sprite(org_id, video_id, sprite, expected_job=sprite['jobId'])
+        print(f"Sprite sheets for video {video_id} {sprite['status']}: {len(sheets)} sheets")
+        return updated
+
+    @staticmethod
+    def index(sprite: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact tile index clients use to map scrub positions to tiles"""
+        return {
+            'sheets': sprite['sheets'],
+            'columns': int(sprite['columns']),
+            'rows': int(sprite['rows']),
+            'tileWidth': int(sprite['tileWidth']),
+            'tileHeight': int(sprite['tileHeight']),
+            'timestamps': [int(timestamp) for timestamp in sprite['timestamps']]
+        }
+
+    def _list_sheets(self, bucket: str, prefix: str) -> List[str]:
+        keys: List[str] = []
+        paginator = self.s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.jpg'))
+        # Sheet numbers are zero-padded, so key order is tile order
+        return sorted(keys)
+
+    def _set_sprite(self, org_id: str, video_id: str, sprite: Dict[str, Any], expected_job: Optional[str] = None) -> bool:
+        condition = 'attribute_exists(PK)'
+        values: Dict[str, Any] = {':sprite': sprite}
+        if expected_job:
+            condition += ' AND spriteSheet.jobId = :jobId'
+            values[':jobId'] = expected_job
+        try:
+            self.table.update_item(
+                Key={
+                    'PK': f"ORG#{org_id}",
+                    'SK': f"VIDEO#{video_id}"
+                },
+                UpdateExpression="SET spriteSheet = :sprite",
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            print(f"Video {video_id} was removed or re-analyzed; sprite sheet not recorded")
+            return False
@@ -0,0 +1,96 @@
+"""Per-video summary rollup built while detections stream through"""
+
+import heapq
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from face_quality import face_quality
+
+DEFAULT_TOP_FRAMES = 5
+MS_PER_MINUTE = 60000
+
+
+class VideoSummary:
+    """Accumulates the video-level aggregates stored on the VIDEO# item
+
+    Raw detections feed the per-minute histogram, appearance bounds and the
+    best-frame heap; persisted appearance items feed the people count and the
+    per-attribute value counts. Memory is bounded by video length in minutes
+    plus ``top_frames``, not by the number of detections.
+    """
+
+    def __init__(self, top_frames: int = DEFAULT_TOP_FRAMES):
+        self.top_frames = top_frames
+        self.detection_count = 0
+        self.people_count = 0
+        self.first_appearance: Optional[int] = None
+        self.last_appearance: Optional[int] = None
+        self.minute_counts: Counter = Counter()
+        self.attribute_counts: Dict[str, Counter] = {}
+        self._best_frames: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._frame_timestamp: Optional[int] = None
+        self._frame_best: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    def observe_face(self, face: Dict[str, Any]) -> None:
+        timestamp = face.get('Timestamp', 0)
+        self.detection_count += 1
+        self.minute_counts[timestamp // MS_PER_MINUTE] += 1
+        if self.first_appearance is None or timestamp < self.first_appearance:
+            self.first_appearance = timestamp
+        if self.last_appearance is None or timestamp > self.last_appearance:
+            self.last_appearance = timestamp
+
+        # Keep only the best face of each frame as a best-frame candidate
+        if timestamp != self._frame_timestamp:
+            self._push_frame()
+            self._frame_timestamp = timestamp
+        score = face_quality(face)
+        if self._frame_best is None or score > self._frame_best[0]:
+            self._frame_best = (score, face)
+
+    def observe_appearance(self, item: Dict[str, Any]) -> None:
+        self.people_count += 1
+        for name, value in item.get('attributes', {}).items():
+            self.attribute_counts.setdefault(name, Counter())[str(value)] += 1
+
+    def track(self, faces: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass faces through unchanged while updating the rollup"""
+        for face in faces:
+            self.observe_face(face)
+            yield face
+
+    def _push_frame(self) -> None:
+        if self._frame_best is None or self.top_frames <= 0:
+            return
+        score, face = self._frame_best
+        entry = (score, face['Timestamp'], face.get('Face', {}))
+        if len(self._best_frames) < self.top_frames:
+            heapq.heappush(self._best_frames, entry)
+        elif score > self._best_frames[0][0]:
+            heapq.heapreplace(self._best_frames, entry)
+        self._frame_best = None
+
+    def best_frames(self) -> List[Dict[str, Any]]:
+        self._push_frame()
+        return [
+            {
+                'timestamp': timestamp,
+                'score': round(score, 4),
+                'confidence': details.get('Confidence', 0),
+                'boundingBox': details.get('BoundingBox', {}),
+            }
+            for score, timestamp, details in sorted(self._best_frames, key=lambda entry: (-entry[0], entry[1]))
+        ]
+
+    def to_record(self) -> Dict[str, Any]:
+        """Plain-Python summary record; convert floats before writing to DynamoDB"""
+        last_minute = max(self.minute_counts) if self.minute_counts else -1
+        return {
+            'peopleCount': self.people_count,
+            'detectionCount': self.detection_count,
+            'firstAppearance': self.first_appearance,
+            'lastAppearance': self.last_appearance,
+            'attributeCounts': {name: dict(counts) for name, counts in self.attribute_counts.items()},
+            'detectionsPerMinute': [self.minute_counts.get(minute, 0) for minute in range(last_minute + 1)],
+            'bestFrames': self.best_frames(),
+        }
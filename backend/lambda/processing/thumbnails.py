@@ -0,0 +1,352 @@
+"""Frame-capture MediaConvert jobs, coalesced across videos
+
+Instead of one MediaConvert job per processed video, thumbnail requests are
+parked in DynamoDB and submitted together once the oldest has waited
+``window_seconds`` or enough inputs are pending:
+
+    THUMBNAIL#PENDING / {requestedAt}#{org}#{video}   a video's candidate frames
+    THUMBNAIL#BATCH / {batchId}                       which captures belong to which video
+
+Each candidate frame becomes a one-second input clip, and the job has a
+single frame-capture output at 1 fps, so capture N is the Nth clip. Clip
+end timecodes are inclusive, so each clip ends on the last frame of its
+start second; a clip one frame longer would shift every later capture. When
+MediaConvert reports the job finished, the captures are copied to each
+video's thumbnail key and its ``thumbnailStatus`` is updated.
+"""
+
+import math
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+PENDING_PK = 'THUMBNAIL#PENDING'
+BATCH_PK = 'THUMBNAIL#BATCH'
+
+DEFAULT_WINDOW_SECONDS = 30
+# MediaConvert accepts at most 150 inputs per job
+MAX_JOB_INPUTS = 150
+MANIFEST_TTL_SECONDS = 7 * 86400
+# Assumed when Rekognition did not report the video's frame rate
+DEFAULT_FRAME_RATE = 30
+
+THUMBNAIL_QUEUED = 'queued'
+THUMBNAIL_PROCESSING = 'processing'
+THUMBNAIL_READY = 'ready'
+THUMBNAIL_FAILED = 'failed'
+
+
+def to_timecode(milliseconds: int, frame: int = 0) -> str:
+    """ZEROBASED HH:MM:SS:FF timecode of ``frame`` within the whole second"""
+    seconds = int(milliseconds // 1000)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}:{frame:02d}"
+
+
+def last_frame(frame_rate: Optional[float] = None) -> int:
+    """Frame number of the last frame in a second of video"""
+    return max(math.ceil(frame_rate or DEFAULT_FRAME_RATE) - 1, 0)
+
+
+def thumbnail_key(org_id: str, video_id: str, index: int = 0) -> str:
+    """S3 key of a video's thumbnail (index 0) or its alternates"""
+    return f"{org_id}/thumbnails/{video_id}.jpg" if index == 0 else f"{org_id}/thumbnails/{video_id}-{index}.jpg"
+
+
+def clip_inputs(clips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One-second job inputs starting at each clip's ``timestamp`` (ms)
+
+    ``EndTimecode`` is inclusive, so a clip runs to the last frame of its
+    start second (per the clip's ``frameRate``), exactly one capture interval.
+    """
+    return [
+        {
+            'FileInput': f"s3://{clip['bucket']}/{clip['key']}",
+            'TimecodeSource': 'ZEROBASED',
+            'InputClippings': [{
+                'StartTimecode': to_timecode(clip['timestamp']),
+                'EndTimecode': to_timecode(clip['timestamp'], last_frame(clip.get('frameRate')))
+            }]
+        }
+        for clip in clips
+    ]
+
+
+def frame_capture_settings(clips: List[Dict[str, Any]], destination: str, name_modifier: str) -> Dict[str, Any]:
+    """Job settings capturing one frame per one-second clip
+
+    ``clips`` holds ``bucket``, ``key``, ``timestamp`` (ms) and optionally
+    ``frameRate`` per capture; captures are numbered in clip order.
+    """
+    return {
+        'TimecodeConfig': {
+            'Source': 'ZEROBASED'
+        },
+        'Inputs': clip_inputs(clips),
+        'OutputGroups': [{
+            'Name': 'File Group',
+            'OutputGroupSettings': {
+                'Type': 'FILE_GROUP_SETTINGS',
+                'FileGroupSettings': {
+                    'Destination': destination
+                }
+            },
+            'Outputs': [
+                {
+                    'NameModifier': name_modifier,
+                    'ContainerSettings': {
+                        'Container': 'RAW'
+                    },
+                    'VideoDescription': {
+                        'Width': 320,
+                        'Height': 240,
+                        'ScalingBehavior': 'DEFAULT',
+                        'CodecSettings': {
+                            'Codec': 'FRAME_CAPTURE',
+                            'FrameCaptureSettings': {
+                                # One capture per one-second input clip
+                                'FramerateNumerator': 1,
+                                'FramerateDenominator': 1,
+                                'MaxCaptures': len(clips),
+                                'Quality': 80
+                            }
+                        }
+                    }
+                }
+            ]
+        }]
+    }
+
+
+class ThumbnailCoalescer:
+    """Gathers thumbnail requests and submits them as multi-video jobs"""
+
+    def __init__(self, table, mediaconvert_client: Callable[[], Any], s3_client: Callable[[], Any], role_arn: str,
+                 window_seconds: int = DEFAULT_WINDOW_SECONDS, max_inputs: int = MAX_JOB_INPUTS):
+        self.table = table
+        self.mediaconvert_client = mediaconvert_client
+        self.s3_client = s3_client
+        self.role_arn = role_arn
+        self.window_seconds = window_seconds
+        self.max_inputs = min(max_inputs, MAX_JOB_INPUTS)
+
+    def enqueue(self, org_id: str, video_id: str, bucket: str, video_key: str, timestamps: List[int],
+                frame_rate: Optional[float] = None) -> None:
+        """Park a video's candidate frames (best first) until the next flush"""
+        requested_at = int(time.time() * 1000)
+        item = {
+            'PK': PENDING_PK,
+            'SK': f"{requested_at:013d}#{org_id}#{video_id}",
+            'orgId': org_id,
+            'videoId': video_id,
+            'bucket': bucket,
+            'videoKey': video_key,
+            # Frames beyond the job input limit cannot be captured anyway
+            'timestamps': [int(timestamp) for timestamp in timestamps[:self.max_inputs]],
+            'requestedAt': requested_at
+        }
+        if frame_rate:
+            item['frameRate'] = Decimal(str(frame_rate))
+        self.table.put_item(Item=item)
+
+    def flush(self, force: bool = False) -> int:
+        """Submit pending requests once the window has passed or a job is full; returns jobs submitted"""
+        pending = self._pending()
+        if not pending:
+            return 0
+
+        input_count = sum(len(item['timestamps']) for item in pending)
+        waited = time.time() - int(pending[0]['requestedAt']) / 1000
+        if not force and waited < self.window_seconds and input_count < self.max_inputs:
+            return 0
+
+        submitted = 0
+        batch: List[Dict[str, Any]] = []
+        batch_inputs = 0
+        for item in pending:
+            size = len(item['timestamps'])
+            if batch and (batch_inputs + size > self.max_inputs or item['bucket'] != batch[0]['bucket']):
+                submitted += self._submit(batch)
+                batch, batch_inputs = [], 0
+            if self._claim(item):
+                batch.append(item)
+                batch_inputs += size
+        if batch:
+            submitted += self._submit(batch)
+        return submitted
+
+    def complete(self, detail: Dict[str, Any]) -> int:
+        """Handle a MediaConvert job state change; returns videos updated"""
+        batch_id = detail.get('userMetadata', {}).get('thumbnailBatchId')
+        status = detail.get('status')
+        if not batch_id or status not in ('COMPLETE', 'ERROR', 'CANCELED'):
+            return 0
+
+        manifest = self.table.get_item(Key={'PK': BATCH_PK, 'SK': batch_id}, ConsistentRead=True).get('Item')
+        if not manifest:
+            print(f"Thumbnail batch {batch_id} already handled or unknown")
+            return 0
+
+        captures: List[str] = []
+        if status == 'COMPLETE':
+            captures = self._list_captures(manifest['bucket'], manifest['prefix'])
+            expected = sum(int(video['captureCount']) for video in manifest['videos'])
+            if len(captures) != expected:
+                # Captures are matched to videos by position, which only holds if none are missing
+                print(f"Thumbnail batch {batch_id} has {len(captures)} captures, expected {expected}")
+                captures = []
+
+        updated = 0
+        copied: List[str] = []
+        for video in manifest['videos']:
+            first = int(video['firstCapture'])
+            count = int(video['captureCount'])
+            video_captures = captures[first:first + count]
+            try:
+                if video_captures:
+                    for index, capture in enumerate(video_captures):
+                        self.s3_client().copy_object(
+                            Bucket=manifest['bucket'],
+                            Key=thumbnail_key(video['orgId'], video['videoId'], index),
+                            CopySource={'Bucket': manifest['bucket'], 'Key': capture},
+                            ContentType='image/jpeg',
+                            MetadataDirective='REPLACE'
+                        )
+                    self._set_status(video['orgId'], video['videoId'], THUMBNAIL_READY, len(video_captures))
+                    copied.extend(video_captures)
+                else:
+                    self._set_status(video['orgId'], video['videoId'], THUMBNAIL_FAILED)
+                updated += 1
+            except Exception as e:
+                # Its captures stay under the batch prefix so the thumbnail can be recovered
+                print(f"Error finishing thumbnail of video {video['videoId']}: {e}")
+                self._fail(video)
+
+        # Copied captures now live under each video's thumbnail keys
+        for start in range(0, len(copied), 1000):
+            self.s3_client().delete_objects(
+                Bucket=manifest['bucket'],
+                Delete={'Objects': [{'Key': capture} for capture in copied[start:start + 1000]], 'Quiet': True}
+            )
+
+        self.table.delete_item(Key={'PK': BATCH_PK, 'SK': batch_id})
+        print(f"Thumbnail batch {batch_id} {status.lower()}: {updated} videos updated from {len(captures)} captures")
+        return updated
+
+    def _pending(self) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        query_args = {'KeyConditionExpression': Key('PK').eq(PENDING_PK), 'ConsistentRead': True}
+        while True:
+            response = self.table.query(**query_args)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _claim(self, item: Dict[str, Any]) -> bool:
+        # Concurrent flushes race on the delete; only the winner submits the request
+        try:
+            self.table.delete_item(
+                Key={'PK': item['PK'], 'SK': item['SK']},
+                ConditionExpression='attribute_exists(PK)'
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def _submit(self, batch: List[Dict[str, Any]]) -> int:
+        batch_id = uuid.uuid4().hex
+        bucket = batch[0]['bucket']
+        prefix = f"thumbnails/batches/{batch_id}/"
+
+        clips: List[Dict[str, Any]] = []
+        videos: List[Dict[str, Any]] = []
+        for item in batch:
+            timestamps = [int(timestamp) for timestamp in item['timestamps']]
+            videos.append({
+                'orgId': item['orgId'],
+                'videoId': item['videoId'],
+                'firstCapture': len(clips),
+                'captureCount': len(timestamps)
+            })
+            clips.extend({'bucket': bucket, 'key': item['videoKey'], 'timestamp': timestamp, 'frameRate': item.get('frameRate')}
+                         for timestamp in timestamps)
+
+        # The manifest must exist before MediaConvert can report completion
+        self.table.put_item(
+            Item={
+                'PK': BATCH_PK,
+                'SK': batch_id,
+                'bucket': bucket,
+                'prefix': prefix,
+                'videos': videos,
+                'createdAt': datetime.utcnow().isoformat(),
+                'expiresAt': int(time.time()) + MANIFEST_TTL_SECONDS
+            }
+        )
+
+        try:
+            response = self.mediaconvert_client().create_job(
+                Role=self.role_arn,
+                Settings=frame_capture_settings(clips, f"s3://{bucket}/{prefix}", '_frame'),
+                UserMetadata={'thumbnailBatchId': batch_id}
+            )
+        except Exception as e:
+            print(f"Error submitting thumbnail batch {batch_id}: {e}")
+            for video in videos:
+                self._set_status(video['orgId'], video['videoId'], THUMBNAIL_FAILED)
+            self.table.delete_item(Key={'PK': BATCH_PK, 'SK': batch_id})
+            return 0
+
+        job_id = response['Job']['Id']
+        for video in videos:
+            self._set_status(video['orgId'], video['videoId'], THUMBNAIL_PROCESSING, job_id=job_id)
+        print(f"MediaConvert job {job_id} submitted for {len(videos)} videos ({len(clips)} frames)")
+        return 1
+
+    def _list_captures(self, bucket: str, prefix: str) -> List[str]:
+        keys: List[str] = []
+        paginator = self.s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.jpg'))
+        # Capture numbers are zero-padded, so key order is capture order
+        return sorted(keys)
+
+    def _fail(self, video: Dict[str, Any]) -> None:
+        # Never leave a video whose thumbnail could not be finished in 'processing'
+        try:
+            self._set_status(video['orgId'], video['videoId'], THUMBNAIL_FAILED)
+        except Exception as e:
+            print(f"Error marking thumbnail of video {video['videoId']} failed: {e}")
+
+    def _set_status(self, org_id: str, video_id: str, status: str, capture_count: Optional[int] = None,
+                    job_id: Optional[str] = None) -> None:
+        update_args: Dict[str, Any] = {
+            'UpdateExpression': "SET thumbnailStatus = :status",
+            'ExpressionAttributeValues': {':status': status}
+        }
+        if job_id:
+            update_args['UpdateExpression'] += ", mediaConvertJobId = :jobId"
+            update_args['ExpressionAttributeValues'][':jobId'] = job_id
+        if status == THUMBNAIL_READY:
+            update_args['UpdateExpression'] += ", thumbnailCaptureCount = :captures"
+            update_args['ExpressionAttributeValues'][':captures'] = capture_count
+        try:
+            self.table.update_item(
+                Key={
+                    'PK': f"ORG#{org_id}",
+                    'SK': f"VIDEO#{video_id}"
+                },
+                ConditionExpression='attribute_exists(PK)',
+                **update_args
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            print(f"Video {video_id} no longer exists; thumbnail status not recorded")
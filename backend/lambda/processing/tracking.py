@@ -0,0 +1,198 @@
+"""Collapse per-frame face detections into appearance spans (tracks)"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from face_quality import face_quality
+
+DEFAULT_MIN_IOU = 0.3
+DEFAULT_MAX_GAP_MS = 1000
+# Weight of bounding-box overlap versus attribute agreement when matching
+IOU_WEIGHT = 0.7
+
+ATTRIBUTE_KEYS = ('ageBucket', 'gender', 'emotion', 'mask')
+
+
+def bounding_box_iou(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Intersection over union of two Rekognition bounding boxes"""
+    if not a or not b:
+        return 0.0
+
+    left = max(a.get('Left', 0), b.get('Left', 0))
+    top = max(a.get('Top', 0), b.get('Top', 0))
+    right = min(a.get('Left', 0) + a.get('Width', 0), b.get('Left', 0) + b.get('Width', 0))
+    bottom = min(a.get('Top', 0) + a.get('Height', 0), b.get('Top', 0) + b.get('Height', 0))
+    if right <= left or bottom <= top:
+        return 0.0
+
+    intersection = (right - left) * (bottom - top)
+    union = a.get('Width', 0) * a.get('Height', 0) + b.get('Width', 0) * b.get('Height', 0) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def attribute_similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Fraction of stable attributes (gender, age bucket) that agree"""
+    compared = 0
+    agreed = 0
+    for key in ('gender', 'ageBucket'):
+        if a.get(key, 'unknown') == 'unknown' or b.get(key, 'unknown') == 'unknown':
+            continue
+        compared += 1
+        agreed += a[key] == b[key]
+    return agreed / compared if compared else 1.0
+
+
+@dataclass
+class FaceTrack:
+    """One person's continuous appearance in a video"""
+
+    track_number: int
+    start_timestamp: int
+    end_timestamp: int
+    start_box: Dict[str, float]
+    last_box: Dict[str, float]
+    last_attributes: Dict[str, Any]
+    best_face: Dict[str, Any]
+    best_score: float
+    detection_count: int = 1
+    confidence_total: float = 0.0
+    attribute_votes: Dict[str, Counter] = field(default_factory=dict)
+
+    def add(self, face: Dict[str, Any], attributes: Dict[str, Any]) -> None:
+        details = face.get('Face', {})
+        self.end_timestamp = face['Timestamp']
+        self.last_box = details.get('BoundingBox', {})
+        self.last_attributes = attributes
+        self.detection_count += 1
+        self.vote(details, attributes)
+
+        score = face_quality(face)
+        if score > self.best_score:
+            self.best_face = face
+            self.best_score = score
+
+    def vote(self, details: Dict[str, Any], attributes: Dict[str, Any]) -> None:
+        self.confidence_total += details.get('Confidence', 0)
+        for key in ATTRIBUTE_KEYS:
+            if key in attributes:
+                self.attribute_votes.setdefault(key, Counter())[attributes[key]] += 1
+
+    @property
+    def average_confidence(self) -> float:
+        return self.confidence_total / self.detection_count
+
+    def majority_attributes(self) -> Dict[str, Any]:
+        return {key: votes.most_common(1)[0][0] for key, votes in self.attribute_votes.items()}
+
+
+@dataclass
+class TrackingStats:
+    detections_in: int = 0
+    tracks_out: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'detectionsIn': self.detections_in,
+            'tracksOut': self.tracks_out,
+            'reductionRatio': round(self.detections_in / self.tracks_out, 1) if self.tracks_out else 0,
+        }
+
+
+class FaceTracker:
+    """Greedy frame-to-frame tracker over a timestamp-sorted detection stream
+
+    Detections in consecutive frames are linked when their bounding boxes
+    overlap by at least ``min_iou`` and their stable attributes agree. A track
+    is closed once it has gone unmatched for longer than ``max_gap_ms`` and is
+    yielded immediately, so only currently visible tracks are held in memory.
+    """
+
+    def __init__(self, describe: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 min_iou: float = DEFAULT_MIN_IOU, max_gap_ms: int = DEFAULT_MAX_GAP_MS):
+        self.describe = describe
+        self.min_iou = min_iou
+        self.max_gap_ms = max_gap_ms
+        self.stats = TrackingStats()
+        self._next_track_number = 0
+
+    def track(self, faces: Iterable[Dict[str, Any]]) -> Iterator[FaceTrack]:
+        """Consume detections and yield completed tracks"""
+        active: List[FaceTrack] = []
+        frame: List[Dict[str, Any]] = []
+        frame_timestamp: Optional[int] = None
+
+        for face in faces:
+            self.stats.detections_in += 1
+            if frame and face['Timestamp'] != frame_timestamp:
+                yield from self._advance(active, frame, frame_timestamp)
+                frame = []
+            frame_timestamp = face['Timestamp']
+            frame.append(face)
+
+        if frame:
+            yield from self._advance(active, frame, frame_timestamp)
+
+        for track in sorted(active, key=lambda t: t.start_timestamp):
+            self.stats.tracks_out += 1
+            yield track
+
+    def _advance(self, active: List[FaceTrack], frame: List[Dict[str, Any]], timestamp: int) -> Iterator[FaceTrack]:
+        # Close tracks that have been out of view for too long
+        still_active = []
+        for track in active:
+            if timestamp - track.end_timestamp > self.max_gap_ms:
+                self.stats.tracks_out += 1
+                yield track
+            else:
+                still_active.append(track)
+        active[:] = still_active
+
+        described = [(face, self.describe(face)) for face in frame]
+        matches = self._match(active, described)
+
+        for index, (face, attributes) in enumerate(described):
+            track = matches.get(index)
+            if track is not None:
+                track.add(face, attributes)
+            else:
+                active.append(self._start_track(face, attributes))
+
+    def _match(self, active: List[FaceTrack], described: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[int, FaceTrack]:
+        candidates = []
+        for track_index, track in enumerate(active):
+            for face_index, (face, attributes) in enumerate(described):
+                iou = bounding_box_iou(track.last_box, face.get('Face', {}).get('BoundingBox', {}))
+                if iou < self.min_iou:
+                    continue
+                similarity = attribute_similarity(track.last_attributes, attributes)
+                if similarity == 0.0:
+                    continue
+                score = IOU_WEIGHT * iou + (1 - IOU_WEIGHT) * similarity
+                candidates.append((score, track_index, face_index))
+
+        # Greedy assignment: best-scoring pairs first, each side used once
+        matches: Dict[int, FaceTrack] = {}
+        used_tracks = set()
+        for _, track_index, face_index in sorted(candidates, reverse=True):
+            if track_index in used_tracks or face_index in matches:
+                continue
+            used_tracks.add(track_index)
+            matches[face_index] = active[track_index]
+        return matches
+
+    def _start_track(self, face: Dict[str, Any], attributes: Dict[str, Any]) -> FaceTrack:
+        details = face.get('Face', {})
+        track = FaceTrack(
+            track_number=self._next_track_number,
+            start_timestamp=face['Timestamp'],
+            end_timestamp=face['Timestamp'],
+            start_box=details.get('BoundingBox', {}),
+            last_box=details.get('BoundingBox', {}),
+            last_attributes=attributes,
+            best_face=face,
+            best_score=face_quality(face),
+        )
+        track.vote(details, attributes)
+        self._next_track_number += 1
+        return track
@@ -1,9 +1,11 @@
 import { APIGatewayProxyEvent, APIGatewayProxyResult } from "aws-lambda";
-import { DynamoDBHelper } from "../../shared/utils/dynamodb";
+import { DynamoDBHelper, QueryOptions } from "../../shared/utils/dynamodb";
 import { authHelper } from "../../shared/utils/auth";
 import { SearchRequest, SearchFilters, DynamoDBItem } from "../../shared/types";
 
 const dynamoHelper = new DynamoDBHelper(process.env["DATA_TABLE"]!);
+// Must match the processing Lambda, which writes GSI1PK and GSI3PK across this many shards
+const gsiShardCount = parseInt(process.env["GSI_SHARD_COUNT"] || "10");
 
 export const handler = async (
   event: APIGatewayProxyEvent
@@ -39,7 +41,24 @@ export const handler = async (
       }
     } else {
       // Search based on filters
+      // Clothing color is never detected, so there is no color index to search
+      if (queryParams.color) {
+        return createErrorResponse(400, "Color search is not supported");
+      }
       const filters = parseFilters(queryParams);
+      if (
+        filters.timeRange &&
+        (isNaN(Date.parse(filters.timeRange.start)) ||
+          isNaN(Date.parse(filters.timeRange.end)))
+      ) {
+        return createErrorResponse(400, "start and end must be ISO 8601 times");
+      }
+      if (filters.mask === false && indexedAttributeFilters(filters).length === 0) {
+        return createErrorResponse(
+          400,
+          "mask=false must be combined with another attribute filter"
+        );
+      }
       results = await performSearch(authenticatedOrgId, filters);
     }
 
@@ -61,24 +80,21 @@ async function performSearch(
 ): Promise<DynamoDBItem[]> {
   let results: DynamoDBItem[] = [];
 
-  // If searching by attributes, use GSI1
-  if (filters.color || filters.emotion || filters.ageBucket) {
-    const attributeQueries = [];
-
-    if (filters.color) {
-      attributeQueries.push(`ATTR#color#${filters.color}`);
-    }
-    if (filters.emotion) {
-      attributeQueries.push(`ATTR#emotion#${filters.emotion}`);
-    }
-    if (filters.ageBucket) {
-      attributeQueries.push(`ATTR#age#${filters.ageBucket}`);
-    }
-
-    for (const attrQuery of attributeQueries) {
-      const items = await dynamoHelper.queryGSI("AttributeIndex", attrQuery);
-      results.push(...items.filter((item) => item.PK === `ORG#${orgId}`));
-    }
+  // If searching by attributes, query the org-scoped attribute index entries
+  const attributeFilters = indexedAttributeFilters(filters);
+  if (attributeFilters.length > 0) {
+    // Index partitions are keyed ORG#{orgId}#ATTR#{name}#{value}; DynamoDB applies the other attributes
+    const [[name, value], ...otherFilters] = attributeFilters;
+    results = await dynamoHelper.queryAll(
+      `ORG#${orgId}#ATTR#${name}#${String(value).toLowerCase()}`,
+      {
+        filterEquals: Object.fromEntries(
+          otherFilters.map(([otherName, otherValue]) => [`attributes.${otherName}`, otherValue])
+        ),
+        ...(filters.timeRange ? { sortKeyBetween: appearanceRange(filters.timeRange) } : {}),
+        ...(filters.limit ? { limit: filters.limit } : {}),
+      }
+    );
   }
   // If searching by video, use GSI2
   else if (filters.videoId) {
@@ -88,11 +104,13 @@ async function performSearch(
     );
     results = results.filter((item) => item.PK === `ORG#${orgId}`);
   }
-  // If searching by time, use GSI3
+  // If searching by time, use GSI3; a day's partition is spread across shards
   else if (filters.timeRange) {
-    const dateKey = `TIME#${filters.timeRange.start.split("T")[0]}`;
-    results = await dynamoHelper.queryGSI("TimeIndex", dateKey);
-    results = results.filter((item) => item.PK === `ORG#${orgId}`);
+    const day = filters.timeRange.start.split("T")[0].replace(/-/g, "");
+    results = await queryShardedIndex("TimeIndex", "GSI3PK", "GSI3SK", `TIME#${day}`, {
+      filterEquals: { PK: `ORG#${orgId}` },
+      ...(filters.limit ? { limit: filters.limit } : {}),
+    });
   }
   // Default: search by organization
   else {
@@ -107,14 +125,83 @@ async function performSearch(
   return results;
 }
 
+/**
+ * Attribute filters as stored on index entries, the partition to query first
+ *
+ * Unmasked faces are not indexed, so mask=false can only narrow another attribute.
+ */
+function indexedAttributeFilters(filters: SearchFilters): [string, string | boolean][] {
+  const attributeFilters: [string, string | boolean][] = [];
+  if (filters.mask === true) attributeFilters.push(["mask", true]);
+  if (filters.emotion)
+    attributeFilters.push(["emotion", filters.emotion.toLowerCase()]);
+  if (filters.ageBucket)
+    attributeFilters.push(["ageBucket", filters.ageBucket]);
+  if (filters.gender) {
+    // Stored as Rekognition reports it ("Female"); the partition key is lowercased
+    const gender = filters.gender.toLowerCase();
+    attributeFilters.push(["gender", gender.charAt(0).toUpperCase() + gender.slice(1)]);
+  }
+  if (filters.mask === false && attributeFilters.length > 0)
+    attributeFilters.push(["mask", false]);
+  return attributeFilters;
+}
+
+/**
+ * Index entry sort keys (APPEAR#{appearedAt}#...) within an inclusive time range
+ *
+ * Entries are keyed on UTC times with millisecond precision and no zone
+ * suffix (attribute_index.py appeared_at), so the bounds are written the same way.
+ */
+function appearanceRange(timeRange: { start: string; end: string }): [string, string] {
+  const utc = (time: string) => new Date(time).toISOString().replace("Z", "");
+  // "#\uffff" sorts after every suffix of an entry at exactly the end time
+  return [`APPEAR#${utc(timeRange.start)}`, `APPEAR#${utc(timeRange.end)}#\uffff`];
+}
+
+/**
+ * Partition keys a sharded GSI key is written under (sharding.py shard_keys)
+ */
+function shardKeys(baseKey: string, shardCount: number): string[] {
+  if (shardCount <= 1) return [baseKey];
+  return Array.from(
+    { length: shardCount },
+    (_, shard) => `${baseKey}#${String(shard).padStart(2, "0")}`
+  );
+}
+
+/**
+ * Query every shard of a GSI partition in parallel and merge by sort key
+ */
+async function queryShardedIndex(
+  indexName: string,
+  partitionKeyName: string,
+  sortKeyName: string,
+  baseKey: string,
+  options: QueryOptions = {}
+): Promise<DynamoDBItem[]> {
+  const shards = await Promise.all(
+    shardKeys(baseKey, gsiShardCount).map((key) =>
+      dynamoHelper.queryAll(key, { ...options, indexName, partitionKeyName })
+    )
+  );
+
+  const merged = shards
+    .flat()
+    .sort((a, b) =>
+      a[sortKeyName] < b[sortKeyName] ? -1 : a[sortKeyName] > b[sortKeyName] ? 1 : 0
+    );
+  return options.limit ? merged.slice(0, options.limit) : merged;
+}
+
 function parseFilters(
   queryParams: Record<string, string | undefined>
 ): SearchFilters & { limit?: number } {
   const filters: SearchFilters & { limit?: number } = {};
 
-  if (queryParams.color) filters.color = queryParams.color;
   if (queryParams.emotion) filters.emotion = queryParams.emotion;
   if (queryParams.ageBucket) filters.ageBucket = queryParams.ageBucket;
+  if (queryParams.gender) filters.gender = queryParams.gender;
   if (queryParams.mask !== undefined)
     filters.mask = queryParams.mask === "true";
   if (queryParams.videoId) filters.videoId = queryParams.videoId;
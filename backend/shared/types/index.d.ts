@@ -18,6 +18,8 @@ export interface Video {
     duration?: number;
     fileSize?: number;
     rekognitionJobId?: string;
+    processedFaces?: number;
+    progressPercent?: number;
 }
 export interface PersonDetection {
     personId: string;
@@ -80,9 +82,9 @@ export interface DynamoDBItem {
     [key: string]: any;
 }
 export interface SearchFilters {
-    color?: string;
     emotion?: string;
     ageBucket?: string;
+    gender?: string;
     mask?: boolean;
     timeRange?: {
         start: string;
@@ -21,6 +21,8 @@ export interface Video {
   duration?: number;
   fileSize?: number;
   rekognitionJobId?: string;
+  processedFaces?: number;
+  progressPercent?: number;
 }
 
 export interface PersonDetection {
@@ -93,9 +95,9 @@ export interface DynamoDBItem {
 }
 
 export interface SearchFilters {
-  color?: string;
   emotion?: string;
   ageBucket?: string;
+  gender?: string;
   mask?: boolean;
   timeRange?: {
     start: string;
@@ -1,9 +1,20 @@
-import { DynamoDBClient, GetItemCommand, QueryCommand, PutItemCommand, UpdateItemCommand, DeleteItemCommand } from "@aws-sdk/client-dynamodb";
+import { AttributeValue, DynamoDBClient, GetItemCommand, QueryCommand, PutItemCommand, UpdateItemCommand, DeleteItemCommand } from "@aws-sdk/client-dynamodb";
 import { marshall, unmarshall } from '@aws-sdk/util-dynamodb';
 import { DynamoDBItem } from '../types';
 
 const dynamoClient = new DynamoDBClient({ region: process.env["AWS_REGION"] || "us-east-1" });
 
+export interface QueryOptions {
+  indexName?: string;
+  partitionKeyName?: string;
+  sortKeyName?: string;
+  // Inclusive sort key range
+  sortKeyBetween?: [string, string];
+  // Attribute path (e.g. "attributes.emotion") -> required value, applied by DynamoDB
+  filterEquals?: Record<string, unknown>;
+  limit?: number;
+}
+
 export class DynamoDBHelper {
   private tableName: string;
 
@@ -110,6 +121,49 @@ export class DynamoDBHelper {
     const response = await dynamoClient.send(command);
     return response.Items ? response.Items.map(item => unmarshall(item) as DynamoDBItem) : [];
   }
+
+  /**
+   * Query one partition of the table or an index, following LastEvaluatedKey
+   * until every page is read or `limit` items matched
+   */
+  async queryAll(pk: string, options: QueryOptions = {}): Promise<DynamoDBItem[]> {
+    const names: Record<string, string> = { "#pk": options.partitionKeyName || "PK" };
+    const values: Record<string, unknown> = { ":pk": pk };
+    let keyCondition = "#pk = :pk";
+    if (options.sortKeyBetween) {
+      names["#sk"] = options.sortKeyName || "SK";
+      [values[":skStart"], values[":skEnd"]] = options.sortKeyBetween;
+      keyCondition += " AND #sk BETWEEN :skStart AND :skEnd";
+    }
+    const filters = Object.entries(options.filterEquals || {}).map(([path, value], index) => {
+      const segments = path.split(".").map((segment, depth) => {
+        names[`#f${index}_${depth}`] = segment;
+        return `#f${index}_${depth}`;
+      });
+      values[`:f${index}`] = value;
+      return `${segments.join(".")} = :f${index}`;
+    });
+
+    const items: DynamoDBItem[] = [];
+    let exclusiveStartKey: Record<string, AttributeValue> | undefined;
+    do {
+      const command = new QueryCommand({
+        TableName: this.tableName,
+        ...(options.indexName ? { IndexName: options.indexName } : {}),
+        KeyConditionExpression: keyCondition,
+        ...(filters.length > 0 ? { FilterExpression: filters.join(" AND ") } : {}),
+        ExpressionAttributeNames: names,
+        ExpressionAttributeValues: marshall(values),
+        ...(exclusiveStartKey ? { ExclusiveStartKey: exclusiveStartKey } : {})
+      });
+
+      const response = await dynamoClient.send(command);
+      items.push(...(response.Items || []).map(item => unmarshall(item) as DynamoDBItem));
+      exclusiveStartKey = response.LastEvaluatedKey;
+    } while (exclusiveStartKey && !(options.limit && items.length >= options.limit));
+
+    return options.limit ? items.slice(0, options.limit) : items;
+  }
 }
 
 // Helper functions for common operations
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Processing Lambda
+Measures module import time locally in fresh interpreters and, optionally,
+the Init Duration reported by the deployed function after forced cold starts
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+PROCESSING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'lambda', 'processing')
+
+# Runs in a fresh interpreter so nothing is already imported
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import index
+imported = time.perf_counter()
+from clients import get_table
+get_table()
+first_table = time.perf_counter()
+print(json.dumps({'importMs': (imported - start) * 1000, 'firstTableMs': (first_table - imported) * 1000}))
+"""
+
+INIT_DURATION = re.compile(r'Init Duration: ([\d.]+) ms')
+DURATION = re.compile(r'\tDuration: ([\d.]+) ms')
+
+
+def summarize(samples):
+    """Median, p90 and max of a list of millisecond samples"""
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'medianMs': round(statistics.median(ordered), 1),
+        'p90Ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 1),
+        'maxMs': round(ordered[-1], 1),
+    }
+
+
+def probe_environment():
+    env = dict(os.environ)
+    env.setdefault('DATA_TABLE', 'benchmark-table')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    # Client construction does not need real credentials
+    env.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    return env
+
+
+def benchmark_imports(runs):
+    """Import index.py in fresh interpreters and time it"""
+    print(f"\n1️⃣ Timing module import over {runs} fresh interpreters...")
+
+    imports = []
+    first_tables = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE],
+            cwd=PROCESSING_DIR, env=probe_environment(), capture_output=True, text=True, check=True
+        ).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        imports.append(sample['importMs'])
+        first_tables.append(sample['firstTableMs'])
+
+    result = {'import': summarize(imports), 'firstTable': summarize(first_tables)}
+    print(f"✅ import index: {json.dumps(result['import'])}")
+    print(f"✅ first DynamoDB table: {json.dumps(result['firstTable'])}")
+    return result
+
+
+def slowest_imports(limit):
+    """Top modules by cumulative import time from python -X importtime"""
+    print(f"\n2️⃣ Slowest imports (top {limit})...")
+
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import index'],
+        cwd=PROCESSING_DIR, env=probe_environment(), capture_output=True, text=True, check=True
+    ).stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), name.strip()))
+
+    top = [{'module': name, 'cumulativeMs': round(us / 1000, 1)} for us, name in sorted(modules, reverse=True)[:limit]]
+    for entry in top:
+        print(f"   {entry['cumulativeMs']:>8.1f} ms  {entry['module']}")
+    return top
+
+
+def benchmark_deployed(function_name, runs):
+    """Force cold starts by changing an env var, then read Init Duration from the log tail"""
+    import boto3
+
+    print(f"\n3️⃣ Forcing {runs} cold starts of {function_name}...")
+    lambda_client = boto3.client('lambda')
+
+    configuration = lambda_client.get_function_configuration(FunctionName=function_name)
+    original_variables = configuration.get('Environment', {}).get('Variables', {})
+
+    init_durations = []
+    durations = []
+    try:
+        for run in range(runs):
+            # A configuration change retires every warm container
+            lambda_client.update_function_configuration(
+                FunctionName=function_name,
+                Environment={'Variables': {**original_variables, 'COLD_START_NONCE': f"{time.time()}-{run}"}}
+            )
+            lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+
+            # An empty Records list returns without touching any AWS service
+            response = lambda_client.invoke(
+                FunctionName=function_name,
+                Payload=json.dumps({'Records': []}).encode('utf-8'),
+                LogType='Tail'
+            )
+            log_tail = base64.b64decode(response['LogResult']).decode('utf-8')
+            init_match = INIT_DURATION.search(log_tail)
+            duration_match = DURATION.search(log_tail)
+            if init_match:
+                init_durations.append(float(init_match.group(1)))
+            if duration_match:
+                durations.append(float(duration_match.group(1)))
+            print(f"   run {run + 1}: init {init_match.group(1) if init_match else '?'} ms")
+    finally:
+        lambda_client.update_function_configuration(
+            FunctionName=function_name,
+            Environment={'Variables': original_variables}
+        )
+
+    result = {
+        'initDuration': summarize(init_durations) if init_durations else None,
+        'duration': summarize(durations) if durations else None,
+    }
+    print(f"✅ Init Duration: {json.dumps(result['initDuration'])}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start benchmark for the Processing Lambda')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters / cold starts to measure')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--function', help='deployed function name; also measures real Init Duration')
+    parser.add_argument('--output', help='write the results as JSON for comparison across releases')
+    args = parser.parse_args()
+
+    print("🧊 Processing Lambda Cold-Start Benchmark")
+    print("=" * 50)
+
+    results = {
+        'measuredAt': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'local': benchmark_imports(args.runs),
+        'slowestImports': slowest_imports(args.top),
+    }
+    if args.function:
+        results['deployed'] = benchmark_deployed(args.function, args.runs)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+    print("\n" + "=" * 50)
+
+
+if __name__ == '__main__':
+    main()
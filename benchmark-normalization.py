@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Face normalization benchmark for the Processing Lambda
+Compares faces per second when every face is normalized on its own (before)
+with page-at-a-time columnar normalization (after), on synthetic
+Rekognition GetFaceDetection output
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+PROCESSING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'lambda', 'processing')
+
+EMOTIONS = ['HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR']
+
+
+def synthetic_faces(count, seed):
+    """Timestamp-sorted faces shaped like GetFaceDetection results"""
+    rng = random.Random(seed)
+    faces = []
+    timestamp = 0
+    while len(faces) < count:
+        timestamp += 200
+        for _ in range(rng.randint(1, 6)):
+            low = rng.randint(5, 70)
+            faces.append({
+                'Timestamp': timestamp,
+                'Face': {
+                    'BoundingBox': {
+                        'Width': rng.uniform(0.05, 0.3),
+                        'Height': rng.uniform(0.05, 0.3),
+                        'Left': rng.uniform(0, 0.7),
+                        'Top': rng.uniform(0, 0.7),
+                    },
+                    'AgeRange': {'Low': low, 'High': low + rng.randint(2, 12)},
+                    'Gender': {'Value': rng.choice(['Male', 'Female']), 'Confidence': rng.uniform(80, 100)},
+                    'Emotions': [{'Type': emotion, 'Confidence': rng.uniform(0, 100)} for emotion in EMOTIONS],
+                    'FaceOccluded': {'Value': rng.random() < 0.1, 'Confidence': rng.uniform(80, 100)},
+                    'Quality': {'Brightness': rng.uniform(30, 90), 'Sharpness': rng.uniform(20, 99)},
+                    'Confidence': rng.uniform(90, 100),
+                },
+            })
+    return faces[:count]
+
+
+def time_run(build, faces, runs):
+    """Faces per second over ``runs`` passes, each on a fresh copy of the faces"""
+    rates = []
+    for _ in range(runs):
+        batch = copy.deepcopy(faces)
+        start = time.perf_counter()
+        build(batch)
+        rates.append(len(batch) / (time.perf_counter() - start))
+    return {
+        'runs': runs,
+        'medianFacesPerSecond': round(statistics.median(rates)),
+        'maxFacesPerSecond': round(max(rates)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Face normalization benchmark for the Processing Lambda')
+    parser.add_argument('--faces', type=int, default=20000, help='synthetic faces per run')
+    parser.add_argument('--runs', type=int, default=5, help='timed passes per variant')
+    parser.add_argument('--page-size', type=int, default=1000, help='faces normalized together')
+    parser.add_argument('--no-numpy', action='store_true', help='time the pure-Python columnar path')
+    parser.add_argument('--output', help='write the results as JSON for comparison across releases')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATA_TABLE', 'benchmark-table')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    sys.path.insert(0, PROCESSING_DIR)
+    import index
+    import normalization
+
+    if args.no_numpy:
+        normalization.np = None
+
+    print("🧮 Processing Lambda Face Normalization Benchmark")
+    print("=" * 50)
+
+    faces = synthetic_faces(args.faces, seed=7)
+
+    def per_face(batch):
+        return [index.build_detection_item('org', 'video', face) for face in batch]
+
+    def columnar(batch):
+        return [index.build_detection_item('org', 'video', face)
+                for face in normalization.normalize_faces(batch, args.page_size)]
+
+    def normalize_only(batch):
+        for _ in normalization.normalize_faces(batch, args.page_size):
+            pass
+
+    # Both paths must produce identical items before their speed means anything
+    if per_face(copy.deepcopy(faces[:2000])) != columnar(copy.deepcopy(faces[:2000])):
+        sys.exit("❌ Columnar items differ from per-face items")
+
+    print(f"\n1️⃣ Per-face normalization ({args.faces} faces)...")
+    before = time_run(per_face, faces, args.runs)
+    print(f"✅ {json.dumps(before)}")
+
+    print(f"\n2️⃣ Columnar normalization (pages of {args.page_size}, numpy {'off' if normalization.np is None else 'on'})...")
+    after = time_run(columnar, faces, args.runs)
+    print(f"✅ {json.dumps(after)}")
+
+    print("\n3️⃣ Normalization stage alone...")
+    stage = time_run(normalize_only, faces, args.runs)
+    print(f"✅ {json.dumps(stage)}")
+
+    speedup = after['medianFacesPerSecond'] / before['medianFacesPerSecond']
+    print(f"\n📈 Item construction speedup: {speedup:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'measuredAt': datetime.utcnow().isoformat(),
+                'python': sys.version.split()[0],
+                'numpy': normalization.np is not None,
+                'faces': args.faces,
+                'pageSize': args.page_size,
+                'perFace': before,
+                'columnar': after,
+                'normalizationOnly': stage,
+                'speedup': round(speedup, 2),
+            }, output, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+    print("\n" + "=" * 50)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Processing Lambda results path
+Runs process_rekognition_results on synthetic GetFaceDetection output from
+1k to 1M faces against local stand-ins for DynamoDB, S3, SNS, Rekognition
+and MediaConvert (local_aws.py), and reports faces per second, peak memory
+and simulated API calls per video. No AWS account or network is needed
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSING_DIR = os.path.join(ROOT_DIR, 'backend', 'lambda', 'processing')
+
+TABLE_NAME = 'benchmark-table'
+BUCKET = 'benchmark-videos'
+ORG_ID = 'org-benchmark'
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def s3_upload_event(video_id):
+    return {'Records': [{
+        'eventSource': 'aws:s3',
+        's3': {
+            'bucket': {'name': BUCKET},
+            'object': {'key': f"videos/{ORG_ID}/{video_id}/clip.mp4", 'eTag': video_id, 'size': 1048576},
+        },
+    }]}
+
+
+def sns_completion_event(job_id, job_tag):
+    message = {'JobId': job_id, 'Status': 'SUCCEEDED', 'API': 'StartFaceDetection', 'JobTag': job_tag}
+    return {'Records': [{'EventSource': 'aws:sns', 'Sns': {'Message': json.dumps(message)}}]}
+
+
+def probe(args):
+    """Process ``args.videos`` videos of ``args.probe`` faces each; runs in a fresh interpreter"""
+    os.environ.update({
+        'DATA_TABLE': TABLE_NAME,
+        'VIDEO_BUCKET': BUCKET,
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:benchmark-rekognition',
+        'REKOGNITION_ROLE_ARN': 'arn:aws:iam::000000000000:role/benchmark-rekognition',
+        'DETECTION_AGGREGATION': args.aggregation,
+        'DETECTION_STORAGE': args.storage,
+    })
+    sys.path.insert(0, PROCESSING_DIR)
+    import clients
+    import index
+    from local_aws import LocalAWS
+
+    aws = LocalAWS(latency_ms=args.latency_ms, faces_per_job=args.probe, seed=args.seed)
+    aws.attach(clients, TABLE_NAME)
+
+    # Uploads start the Rekognition jobs; only the results path is measured
+    with contextlib.redirect_stdout(io.StringIO()):
+        for number in range(args.videos):
+            video_id = f"video-{number:04d}"
+            aws.s3.objects[(BUCKET, f"videos/{ORG_ID}/{video_id}/clip.mp4")] = {
+                'data': b'', 'ContentType': 'video/mp4', 'Metadata': {}, 'LastModified': datetime.utcnow(), 'ETag': '""'
+            }
+            index.handler(s3_upload_event(video_id), None)
+    jobs = [(started['JobId'], started['JobTag']) for started in aws.rekognition.started]
+    if len(jobs) != args.videos:
+        return {'error': f"expected {args.videos} Rekognition jobs, uploads started {len(jobs)}"}
+
+    aws.reset_counters()
+    rss_before = peak_rss_mb()
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        for job_id, tag in jobs:
+            index.process_rekognition_results(sns_completion_event(job_id, tag), None)
+    elapsed = time.perf_counter() - started
+
+    processed = sum(1 for item in aws.dynamodb.tables[TABLE_NAME].items()
+                    if item['SK']['S'].startswith('VIDEO#') and item.get('status', {}).get('S') == 'PROCESSED')
+    faces = args.probe * args.videos
+    return {
+        'faces': args.probe,
+        'videos': args.videos,
+        'processedVideos': processed,
+        'seconds': round(elapsed, 3),
+        'facesPerSecond': round(faces / elapsed),
+        # Time spent inside the stand-ins stands for network round trips in Lambda
+        'standInSeconds': round(aws.seconds, 3),
+        'facesPerSecondExcludingStandIns': round(faces / max(elapsed - aws.seconds, 1e-9)),
+        'peakRssMb': peak_rss_mb(),
+        'rssGrowthMb': round(peak_rss_mb() - rss_before, 1),
+        'apiCallsPerVideo': {name: round(count / args.videos, 1) for name, count in sorted(aws.calls.items())},
+        'errorsPerVideo': {name: round(count / args.videos, 1) for name, count in sorted(aws.errors.items())},
+        'writeUnitsPerVideo': round(aws.dynamodb.write_units / args.videos),
+        'storedItems': aws.dynamodb.item_count(),
+        's3BytesWritten': aws.s3.bytes_written,
+    }
+
+
+def run_size(args, count):
+    """Run one size in a fresh interpreter so peak memory is its own"""
+    command = [sys.executable, os.path.abspath(__file__), '--probe', str(count), '--videos', str(args.videos),
+               '--aggregation', args.aggregation, '--storage', args.storage,
+               '--latency-ms', str(args.latency_ms), '--seed', str(args.seed)]
+    output = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+    if output.returncode != 0:
+        return {'faces': count, 'error': output.stderr.strip().splitlines()[-1] if output.stderr.strip() else 'failed'}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the Processing Lambda results path')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated faces per video')
+    parser.add_argument('--videos', type=int, default=1, help='videos processed per size')
+    parser.add_argument('--aggregation', default='track', choices=['track', 'none'], help='DETECTION_AGGREGATION')
+    parser.add_argument('--storage', default='dynamodb', choices=['dynamodb', 'archive'], help='DETECTION_STORAGE')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round trip per AWS call')
+    parser.add_argument('--seed', type=int, default=7, help='synthetic payload seed')
+    parser.add_argument('--output', help='write the results as JSON for comparison across releases')
+    parser.add_argument('--probe', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args)))
+        return
+
+    print("🧪 Processing Lambda Offline Benchmark")
+    print("=" * 50)
+    print(f"aggregation={args.aggregation} storage={args.storage} latency={args.latency_ms}ms videos={args.videos}")
+
+    results = []
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    for step, count in enumerate(sizes, 1):
+        print(f"\n{step}️⃣ {count:,} faces per video...")
+        result = run_size(args, count)
+        results.append(result)
+        if 'error' in result:
+            print(f"❌ {result['error']}")
+            continue
+        print(f"✅ {result['facesPerSecond']:,} faces/s "
+              f"({result['facesPerSecondExcludingStandIns']:,} excluding stand-ins), "
+              f"peak RSS {result['peakRssMb']} MB (+{result['rssGrowthMb']} MB)")
+        print(f"📞 API calls per video: {json.dumps(result['apiCallsPerVideo'])}")
+        print(f"🗄️ {result['storedItems']:,} items stored (stand-in table counts toward memory), "
+              f"{result['writeUnitsPerVideo']:,} write units per video, {result['s3BytesWritten']:,} S3 bytes written")
+        if result['errorsPerVideo']:
+            print(f"⚠️ Errors per video: {json.dumps(result['errorsPerVideo'])}")
+        if result['processedVideos'] != result['videos']:
+            print(f"⚠️ Only {result['processedVideos']} of {result['videos']} videos reached PROCESSED")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'measuredAt': datetime.utcnow().isoformat(),
+                'python': sys.version.split()[0],
+                'aggregation': args.aggregation,
+                'storage': args.storage,
+                'latencyMs': args.latency_ms,
+                'results': results,
+            }, output, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+    print("\n" + "=" * 50)
+
+
+if __name__ == '__main__':
+    main()
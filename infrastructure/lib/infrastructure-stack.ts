@@ -8,6 +8,10 @@ import * as iam from "aws-cdk-lib/aws-iam";
 import * as sns from "aws-cdk-lib/aws-sns";
 import * as sns_subscriptions from "aws-cdk-lib/aws-sns-subscriptions";
 import * as s3n from "aws-cdk-lib/aws-s3-notifications";
+import * as sqs from "aws-cdk-lib/aws-sqs";
+import * as lambda_event_sources from "aws-cdk-lib/aws-lambda-event-sources";
+import * as events from "aws-cdk-lib/aws-events";
+import * as events_targets from "aws-cdk-lib/aws-events-targets";
 import { Construct } from "constructs";
 
 export class ZentriqVisionStack extends cdk.Stack {
@@ -113,6 +117,8 @@ export class ZentriqVisionStack extends cdk.Stack {
       partitionKey: { name: "PK", type: dynamodb.AttributeType.STRING },
       sortKey: { name: "SK", type: dynamodb.AttributeType.STRING },
       billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      // Expires analysis cache entries (and any other item with expiresAt set)
+      timeToLiveAttribute: "expiresAt",
       removalPolicy: cdk.RemovalPolicy.DESTROY,
       pointInTimeRecoverySpecification: {
         pointInTimeRecoveryEnabled: true,
@@ -146,6 +152,9 @@ export class ZentriqVisionStack extends cdk.Stack {
     });
 
     // 5. Lambda functions
+    // Hot GSI partition keys are written across this many shards and read back from all of them
+    const gsiShardCount = "10";
+
     // Upload Lambda function
     const uploadLambda = new lambda.Function(this, "UploadLambda", {
       runtime: lambda.Runtime.NODEJS_18_X,
@@ -168,6 +177,7 @@ export class ZentriqVisionStack extends cdk.Stack {
       code: lambda.Code.fromAsset("../backend/lambda/search/dist"),
       environment: {
         DATA_TABLE: dataTable.tableName,
+        GSI_SHARD_COUNT: gsiShardCount,
         USER_POOL_ID: userPool.userPoolId,
         USER_POOL_CLIENT_ID: userPoolClient.userPoolClientId,
       },
@@ -377,14 +387,74 @@ export class ZentriqVisionStack extends cdk.Stack {
         SNS_TOPIC_ARN: videoProcessingTopic.topicArn,
         MEDIACONVERT_ENDPOINT: "https://mediaconvert.us-east-1.amazonaws.com",
         REKOGNITION_ROLE_ARN: rekognitionRole.roleArn,
+        GSI_SHARD_COUNT: gsiShardCount,
       },
       timeout: cdk.Duration.minutes(15),
       memorySize: 1024,
     });
 
-    // Add SNS subscription for Processing Lambda to receive Rekognition notifications
+    // Buffer uploads and Rekognition notifications through SQS so bursts are
+    // smoothed and only failed messages are retried (batchItemFailures).
+    // Uploads are quick and batched; each completion stores a whole video's
+    // results, so completions get their own queue and one invocation each.
+    const processingDeadLetterQueue = new sqs.Queue(this, "ProcessingDeadLetterQueue", {
+      retentionPeriod: cdk.Duration.days(14),
+    });
+
+    const processingQueue = new sqs.Queue(this, "ProcessingQueue", {
+      // At least six times the Lambda timeout, as recommended for SQS event sources
+      visibilityTimeout: cdk.Duration.minutes(90),
+      deadLetterQueue: {
+        queue: processingDeadLetterQueue,
+        maxReceiveCount: 5,
+      },
+    });
+
+    const completionQueue = new sqs.Queue(this, "ProcessingCompletionQueue", {
+      visibilityTimeout: cdk.Duration.minutes(90),
+      deadLetterQueue: {
+        queue: processingDeadLetterQueue,
+        maxReceiveCount: 5,
+      },
+    });
+
+    processingLambda.addEventSource(
+      new lambda_event_sources.SqsEventSource(processingQueue, {
+        batchSize: 10,
+        maxBatchingWindow: cdk.Duration.seconds(5),
+        reportBatchItemFailures: true,
+      })
+    );
+
+    // A batch must fit in the Lambda timeout; one completion can take minutes
+    processingLambda.addEventSource(
+      new lambda_event_sources.SqsEventSource(completionQueue, {
+        batchSize: 1,
+        reportBatchItemFailures: true,
+      })
+    );
+
+    // Periodic dispatch of queued Rekognition jobs (after backoff or lost notifications)
+    new events.Rule(this, "RekognitionSchedulerTick", {
+      schedule: events.Schedule.rate(cdk.Duration.minutes(1)),
+      targets: [new events_targets.LambdaFunction(processingLambda)],
+    });
+
+    // Completion of coalesced MediaConvert thumbnail jobs
+    new events.Rule(this, "ThumbnailJobStateChange", {
+      eventPattern: {
+        source: ["aws.mediaconvert"],
+        detailType: ["MediaConvert Job State Change"],
+        detail: {
+          status: ["COMPLETE", "ERROR", "CANCELED"],
+        },
+      },
+      targets: [new events_targets.LambdaFunction(processingLambda)],
+    });
+
+    // Rekognition notifications reach the Processing Lambda through the completion queue
     videoProcessingTopic.addSubscription(
-      new sns_subscriptions.LambdaSubscription(processingLambda)
+      new sns_subscriptions.SqsSubscription(completionQueue)
     );
 
     // 6. API Gateway
@@ -520,6 +590,7 @@ export class ZentriqVisionStack extends cdk.Stack {
 
     // Grant MediaConvert role comprehensive permissions
     videoBucket.grantReadWrite(mediaConvertRole);
+    processingLambda.addEnvironment("MEDIACONVERT_ROLE_ARN", mediaConvertRole.roleArn);
     dataTable.grantReadWriteData(mediaConvertRole);
 
     // Grant SNS permissions to MediaConvert role for notifications
@@ -573,7 +644,7 @@ export class ZentriqVisionStack extends cdk.Stack {
     // 8. S3 Event trigger for video processing
     videoBucket.addEventNotification(
       s3.EventType.OBJECT_CREATED,
-      new s3n.LambdaDestination(processingLambda),
+      new s3n.SqsDestination(processingQueue),
       { prefix: "videos/" } // Trigger for all files in videos/ folder
     );
 
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Event record-and-replay load harness for the Processing Lambda
+Records S3 upload and SNS completion envelopes (synthetic traffic shapes or
+sampled "Processing event" log lines) and replays them against handler
+in-process, at the recorded pace or a fixed rate, with bounded concurrency,
+backed by the local AWS stand-ins in local_aws.py
+Reports latency percentiles, throttles and error rates per event type
+
+    ./load-harness.py record upload-storm --videos 200 --window-seconds 10 --output storm.jsonl
+    ./load-harness.py record completion-burst --videos 100 --duplicates 1 --output burst.jsonl
+    ./load-harness.py record --from-logs filter-log-events.json --output captured.jsonl
+    ./load-harness.py replay storm.jsonl --concurrency 20 --speed 10 --write-capacity 500
+"""
+
+import argparse
+import contextlib
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSING_DIR = os.path.join(ROOT_DIR, 'backend', 'lambda', 'processing')
+
+TABLE_NAME = 'load-harness-table'
+BUCKET = 'load-harness-videos'
+# Lambda's default timeout for the processing function
+FUNCTION_TIMEOUT_MS = 900000
+# Videos in these stages at the end of a replay never finished
+UNFINISHED_STAGES = ('ANALYZING', 'STORING')
+
+
+# --- Recording ----------------------------------------------------------------
+
+def upload_envelope(org_id, video_id, etag):
+    return {'Records': [{
+        'eventVersion': '2.1',
+        'eventSource': 'aws:s3',
+        'eventName': 'ObjectCreated:Put',
+        's3': {
+            'bucket': {'name': BUCKET},
+            'object': {'key': f"videos/{org_id}/{video_id}/clip.mp4", 'eTag': etag, 'size': 52428800},
+        },
+    }]}
+
+
+def completion_envelope(job_id, job_tag, status='SUCCEEDED'):
+    message = {'JobId': job_id, 'Status': status, 'API': 'StartFaceDetection', 'JobTag': job_tag,
+               'Timestamp': int(time.time() * 1000)}
+    return {'Records': [{
+        'EventSource': 'aws:sns',
+        'EventVersion': '1.0',
+        'Sns': {'Type': 'Notification', 'MessageId': str(uuid.uuid4()), 'Message': json.dumps(message)},
+    }]}
+
+
+def record_scenario(args):
+    """Synthetic traffic: every video's envelope lands at a random point in the window"""
+    rng = random.Random(args.seed)
+    window_ms = args.window_seconds * 1000
+    entries = []
+    for number in range(args.videos):
+        org_id = f"org-{number % args.orgs:03d}"
+        video_id = f"video-{number:05d}"
+        offset = int(rng.uniform(0, window_ms))
+        if args.scenario == 'upload-storm':
+            event = upload_envelope(org_id, video_id, uuid.UUID(int=rng.getrandbits(128)).hex)
+        else:
+            event = completion_envelope(f"job-{video_id}", f"{org_id}_{video_id}:1")
+        entries.append((offset, event))
+
+    # At-least-once delivery: the same envelope again, a little later
+    for offset, event in list(entries):
+        for _ in range(args.duplicates):
+            entries.append((offset + int(rng.uniform(0, args.duplicate_jitter_ms)), event))
+    return sorted(entries, key=lambda entry: entry[0])
+
+
+def record_from_logs(path):
+    """Envelopes from sampled "Processing event" log lines (LOG_SAMPLE_RATE)
+
+    Accepts ``aws logs filter-log-events`` JSON output or plain log lines
+    with the JSON entry anywhere on the line.
+    """
+    with open(path) as source:
+        text = source.read()
+    try:
+        lines = [(event.get('timestamp'), event['message']) for event in json.loads(text)['events']]
+    except (ValueError, KeyError, TypeError):
+        lines = [(None, line) for line in text.splitlines()]
+
+    entries = []
+    for number, (timestamp, line) in enumerate(lines):
+        start = line.find('{')
+        if start < 0:
+            continue
+        try:
+            entry = json.loads(line[start:])
+        except ValueError:
+            continue
+        event = entry.get('event') if isinstance(entry, dict) else None
+        if entry.get('message') != 'Processing event' or not isinstance(event, dict) or 'Records' not in event:
+            continue
+        entries.append((timestamp if timestamp is not None else number, event))
+
+    if not entries:
+        return []
+    first = min(offset for offset, _ in entries)
+    return sorted(((offset - first, event) for offset, event in entries), key=lambda entry: entry[0])
+
+
+def save_recording(path, entries):
+    with open(path, 'w') as output:
+        for offset, event in entries:
+            output.write(json.dumps({'offsetMs': offset, 'event': event}, separators=(',', ':')) + '\n')
+
+
+def load_recording(path):
+    with open(path) as source:
+        return [(entry['offsetMs'], entry['event']) for entry in map(json.loads, source) if entry]
+
+
+# --- Replay ---------------------------------------------------------------------
+
+def event_kind(event):
+    if event.get('source') == 'aws.events':
+        return 'schedule'
+    records = event.get('Records') or [{}]
+    if records[0].get('eventSource') == 'aws:sqs':
+        return 'sqs'
+    if records[0].get('EventSource') == 'aws:sns':
+        return 'sns'
+    if 's3' in records[0]:
+        return 's3'
+    return 'other'
+
+
+def response_errors(response):
+    """Failed records reported by a handler response"""
+    if not isinstance(response, dict):
+        return 0
+    if 'batchItemFailures' in response:
+        return len(response['batchItemFailures'])
+    try:
+        body = json.loads(response.get('body') or '{}')
+    except (TypeError, ValueError):
+        body = {}
+    errors = len(body.get('errors', [])) if isinstance(body, dict) else 0
+    return errors or (1 if response.get('statusCode', 200) >= 500 else 0)
+
+
+class Context:
+    """Enough of the Lambda context object for the handler"""
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = 'load-harness-processing'
+        self._deadline = time.monotonic() + FUNCTION_TIMEOUT_MS / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+class Replay:
+    """Delivers recorded envelopes on schedule to at most ``concurrency`` concurrent invocations
+
+    Rekognition completions are closed-loop: when the handler starts a job
+    for an uploaded video, its SNS completion is delivered after
+    ``analysis_seconds``, unless the recording carries that video's
+    completion itself, which is then held until the job exists and
+    delivered with the started job's id and tag.
+
+    Once the recording is delivered, schedule ticks keep coming until no
+    video is ANALYZING or STORING (queued in the Rekognition scheduler or
+    mid-results) or ``drain_seconds`` have passed.
+    """
+
+    def __init__(self, index, identity, aws, entries, args):
+        self.index = index
+        self.parse_job_tag = identity.parse_job_tag
+        self.aws = aws
+        self.args = args
+        self.concurrency = args.concurrency
+        self.analysis_seconds = args.analysis_seconds / args.speed
+        self.tick_seconds = args.tick_seconds / args.speed
+        self.drain_seconds = args.drain_seconds / args.speed
+        self.drain_deadline = None
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = 0
+        self.in_flight = 0
+        self.started_at = None
+        self.samples = []
+        self.jobs = {}
+        self.held = defaultdict(list)
+        self.uploaded = set()
+        self.recorded_completions = set()
+
+        for position, (offset, event) in enumerate(entries):
+            due = position / args.rate if args.rate else offset / 1000 / args.speed
+            self._push(due, event)
+            for video in self._sns_videos(event):
+                self.recorded_completions.add(video)
+            if event_kind(event) == 's3':
+                for record in event['Records']:
+                    parts = record['s3']['object']['key'].split('/')
+                    if len(parts) >= 3:
+                        self.uploaded.add((parts[1], parts[2]))
+        if self.tick_seconds > 0:
+            self._push(self.tick_seconds, {'source': 'aws.events', 'detail-type': 'Scheduled Event'})
+        aws.rekognition.on_start = self._job_started
+
+    def clock(self):
+        return time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    def _push(self, due, event):
+        self.sequence += 1
+        heapq.heappush(self.queue, (due, self.sequence, event))
+
+    def _sns_videos(self, event):
+        if event_kind(event) != 'sns':
+            return []
+        videos = []
+        for record in event['Records']:
+            try:
+                parsed = self.parse_job_tag(json.loads(record['Sns']['Message']).get('JobTag', ''))
+            except (KeyError, ValueError):
+                parsed = None
+            if parsed:
+                videos.append(parsed[:2])
+        return videos
+
+    def seed_completed_analyses(self, lifecycle, table):
+        """VIDEO# items for completions whose upload is not in the recording"""
+        seeded = set()
+        for _, _, event in self.queue:
+            for record in event.get('Records', []) if event_kind(event) == 'sns' else []:
+                message = json.loads(record['Sns']['Message'])
+                parsed = self.parse_job_tag(message.get('JobTag', ''))
+                if not parsed or parsed[:2] in self.uploaded or parsed[:2] in seeded:
+                    continue
+                org_id, video_id, attempt = parsed
+                item = {**lifecycle.video_item_key(org_id, video_id), 'status': 'PROCESSING',
+                        'processingStage': lifecycle.STAGE_ANALYZING, 'rekognitionJobId': message['JobId'],
+                        'videoKey': f"videos/{org_id}/{video_id}/clip.mp4", 'orgId': org_id, 'videoId': video_id}
+                if attempt:
+                    item['analysisAttempt'] = attempt
+                table.put_item(Item=item)
+                self.aws.rekognition.add_job(message['JobId'], self.args.faces_per_job)
+                seeded.add(parsed[:2])
+        return len(seeded)
+
+    def _job_started(self, job):
+        parsed = self.parse_job_tag(job.get('JobTag') or '')
+        if not parsed:
+            return
+        video = parsed[:2]
+        with self.condition:
+            self.jobs[video] = (job['JobId'], job['JobTag'])
+            now = self.clock()
+            for event in self.held.pop(video, []):
+                self._push(now, self._remap(event))
+            if video not in self.recorded_completions and self.analysis_seconds >= 0:
+                self._push(now + self.analysis_seconds, completion_envelope(job['JobId'], job['JobTag']))
+            self.condition.notify_all()
+
+    def _remap(self, event):
+        records = []
+        for record in event['Records']:
+            message = json.loads(record['Sns']['Message'])
+            parsed = self.parse_job_tag(message.get('JobTag', ''))
+            if parsed and parsed[:2] in self.jobs:
+                message['JobId'], message['JobTag'] = self.jobs[parsed[:2]]
+                record = {**record, 'Sns': {**record['Sns'], 'Message': json.dumps(message)}}
+            records.append(record)
+        return {**event, 'Records': records}
+
+    def _ready(self, event):
+        """False when a recorded completion must wait for its video's job to start"""
+        waiting = [video for video in self._sns_videos(event) if video in self.uploaded and video not in self.jobs]
+        if waiting:
+            self.held[waiting[0]].append(event)
+            return False
+        return True
+
+    def unfinished_videos(self):
+        """VIDEO# items still ANALYZING or STORING"""
+        return [item for item in self.aws.dynamodb.items(TABLE_NAME)
+                if item['SK'].get('S', '').startswith('VIDEO#')
+                and item.get('processingStage', {}).get('S') in UNFINISHED_STAGES]
+
+    def _done(self):
+        """True once the recording is delivered and no video can still make progress"""
+        if self.in_flight or any(event_kind(event) != 'schedule' for _, _, event in self.queue):
+            return False
+        if self.tick_seconds <= 0 or not self.unfinished_videos():
+            return True
+        if self.drain_deadline is None:
+            self.drain_deadline = self.clock() + self.drain_seconds
+        return self.clock() >= self.drain_deadline
+
+    def _next(self):
+        """Block until an event is due and a concurrency slot is free; None when all work is done"""
+        throttled = False
+        with self.condition:
+            while True:
+                if self._done():
+                    return None
+                if self.queue:
+                    due, _, event = self.queue[0]
+                    now = self.clock()
+                    if due <= now and self.in_flight < self.concurrency:
+                        heapq.heappop(self.queue)
+                        if event_kind(event) == 'schedule':
+                            if self.tick_seconds > 0:
+                                self._push(now + self.tick_seconds, event)
+                        elif event_kind(event) == 'sns' and not self._ready(event):
+                            continue
+                        elif event_kind(event) == 'sns':
+                            event = self._remap(event)
+                        self.in_flight += 1
+                        return due, event, throttled
+                    if due <= now:
+                        # Every concurrent execution is busy: Lambda throttles and the event waits
+                        throttled = True
+                        self.condition.wait()
+                    else:
+                        self.condition.wait(timeout=due - now)
+                else:
+                    self.condition.wait()
+
+    def _invoke(self, due, event, throttled):
+        started = self.clock()
+        failed_records = 0
+        crashed = False
+        try:
+            failed_records = response_errors(self.index.handler(event, Context()))
+        except Exception:
+            crashed = True
+        finished = self.clock()
+        with self.condition:
+            self.samples.append({
+                'kind': event_kind(event),
+                'latencyMs': (finished - started) * 1000,
+                'waitMs': (started - due) * 1000,
+                'throttled': throttled,
+                'failed': crashed or failed_records > 0,
+                'failedRecords': failed_records,
+                'crashed': crashed,
+            })
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                work = self._next()
+                if work is None:
+                    break
+                executor.submit(self._invoke, *work)
+        return self.clock()
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def summarize(samples):
+    latencies = sorted(sample['latencyMs'] for sample in samples)
+    waits = sorted(sample['waitMs'] for sample in samples)
+    failed = sum(1 for sample in samples if sample['failed'])
+    return {
+        'invocations': len(samples),
+        'failed': failed,
+        'errorRate': round(failed / len(samples), 4) if samples else 0.0,
+        'crashed': sum(1 for sample in samples if sample['crashed']),
+        'concurrencyThrottled': sum(1 for sample in samples if sample['throttled']),
+        'latencyMs': {
+            'p50': round(percentile(latencies, 0.5), 1),
+            'p90': round(percentile(latencies, 0.9), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(latencies[-1], 1) if latencies else 0.0,
+            'mean': round(statistics.mean(latencies), 1) if latencies else 0.0,
+        },
+        'queueWaitMs': {
+            'p50': round(percentile(waits, 0.5), 1),
+            'p99': round(percentile(waits, 0.99), 1),
+        },
+    }
+
+
+def replay(args):
+    entries = load_recording(args.recording)
+    if not entries:
+        sys.exit(f"❌ No events in {args.recording}")
+
+    os.environ.update({
+        'DATA_TABLE': TABLE_NAME,
+        'VIDEO_BUCKET': BUCKET,
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:load-harness-rekognition',
+        'REKOGNITION_ROLE_ARN': 'arn:aws:iam::000000000000:role/load-harness-rekognition',
+        'DETECTION_AGGREGATION': args.aggregation,
+        # The harness prints the results; per-invocation log sampling would only add noise
+        'LOG_SAMPLE_RATE': '0',
+    })
+    sys.path.insert(0, PROCESSING_DIR)
+    import clients
+    import identity
+    import index
+    import lifecycle
+    from local_aws import LocalAWS
+
+    aws = LocalAWS(latency_ms=args.latency_ms, write_capacity=args.write_capacity,
+                   faces_per_job=args.faces_per_job, seed=args.seed)
+    aws.attach(clients, TABLE_NAME)
+    run = Replay(index, identity, aws, entries, args)
+    seeded = run.seed_completed_analyses(lifecycle, clients.get_table())
+    aws.reset_counters()
+
+    print("🔁 Processing Lambda Load Replay")
+    print("=" * 50)
+    pace = f"{args.rate}/s" if args.rate else f"recorded pace x{args.speed}"
+    print(f"{len(entries)} events from {args.recording}, {pace}, concurrency {args.concurrency}, "
+          f"{args.faces_per_job} faces per job")
+    if seeded:
+        print(f"🌱 Seeded {seeded} videos awaiting their recorded completions")
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        elapsed = run.run()
+
+    videos = [item for item in aws.dynamodb.items(TABLE_NAME) if item['SK'].get('S', '').startswith('VIDEO#')]
+    stages = Counter(item.get('processingStage', {}).get('S', 'NONE') for item in videos)
+    unfinished = sum(stages[stage] for stage in UNFINISHED_STAGES)
+    # A video that never reached COMPLETE failed, whatever its invocations reported
+    failed_videos = len(videos) - stages['COMPLETE']
+    throttle_errors = {name: count for name, count in aws.errors.items() if name.rsplit('.', 1)[1] in ('ProvisionedThroughputExceededException',
+                                                                                                        'ThrottlingException', 'LimitExceededException')}
+    by_kind = defaultdict(list)
+    for sample in run.samples:
+        by_kind[sample['kind']].append(sample)
+
+    report = {
+        'measuredAt': datetime.utcnow().isoformat(),
+        'recording': args.recording,
+        'events': len(entries),
+        'seconds': round(elapsed, 2),
+        'concurrency': args.concurrency,
+        'overall': summarize(run.samples),
+        'byKind': {kind: summarize(samples) for kind, samples in sorted(by_kind.items())},
+        'throttles': {
+            'lambdaConcurrency': sum(1 for sample in run.samples if sample['throttled']),
+            'dynamodbThrottledRequests': aws.dynamodb.throttled_writes,
+            'sdkRetries': dict(aws.retries),
+            'throttleErrorsSurfaced': throttle_errors,
+        },
+        'apiErrors': dict(aws.errors),
+        'apiCalls': dict(sorted(aws.calls.items())),
+        'videoStages': dict(stages),
+        'videos': {
+            'total': len(videos),
+            'complete': stages['COMPLETE'],
+            'unfinished': unfinished,
+            'failed': failed_videos,
+            'failureRate': round(failed_videos / len(videos), 4) if videos else 0.0,
+        },
+    }
+
+    for kind, summary in report['byKind'].items():
+        latency = summary['latencyMs']
+        print(f"\n📨 {kind}: {summary['invocations']} invocations, error rate {summary['errorRate']:.2%}, "
+              f"{summary['concurrencyThrottled']} throttled")
+        print(f"   latency p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+        print(f"   queue wait p50 {summary['queueWaitMs']['p50']} ms, p99 {summary['queueWaitMs']['p99']} ms")
+    throttles = report['throttles']
+    print(f"\n🚦 Throttles: {throttles['lambdaConcurrency']} Lambda concurrency, "
+          f"{throttles['dynamodbThrottledRequests']} DynamoDB, {sum(aws.retries.values())} SDK retries, "
+          f"{sum(throttle_errors.values())} surfaced as errors")
+    print(f"🎬 Video stages: {json.dumps(report['videoStages'])}")
+    if failed_videos:
+        print(f"❌ {failed_videos} of {len(videos)} videos did not complete ({unfinished} still in progress), "
+              f"failure rate {report['videos']['failureRate']:.2%}")
+    if report['apiErrors']:
+        print(f"⚠️ API errors: {json.dumps(report['apiErrors'])}")
+    print(f"⏱️ Replayed in {report['seconds']} s")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+    print("\n" + "=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event record-and-replay load harness for the Processing Lambda')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='write a recording of S3 and SNS envelopes')
+    record.add_argument('scenario', nargs='?', choices=['upload-storm', 'completion-burst'], help='synthetic traffic shape')
+    record.add_argument('--from-logs', help='extract envelopes from sampled "Processing event" log lines instead')
+    record.add_argument('--videos', type=int, default=100, help='videos in the scenario')
+    record.add_argument('--orgs', type=int, default=1, help='orgs the videos are spread across')
+    record.add_argument('--window-seconds', type=float, default=10.0, help='time span the envelopes arrive in')
+    record.add_argument('--duplicates', type=int, default=0, help='extra deliveries of every envelope')
+    record.add_argument('--duplicate-jitter-ms', type=int, default=2000, help='max delay of a duplicate delivery')
+    record.add_argument('--seed', type=int, default=7, help='random seed')
+    record.add_argument('--output', required=True, help='recording file (JSON lines)')
+
+    play = commands.add_parser('replay', help='replay a recording against handler')
+    play.add_argument('recording', help='recording file written by record')
+    play.add_argument('--rate', type=float, help='events per second, ignoring the recorded offsets')
+    play.add_argument('--speed', type=float, default=1.0, help='time compression of the recording and simulated waits')
+    play.add_argument('--concurrency', type=int, default=10, help='concurrent Lambda executions')
+    play.add_argument('--latency-ms', type=float, default=5.0, help='simulated round trip per AWS call')
+    play.add_argument('--write-capacity', type=float, help='DynamoDB writes per second before throttling')
+    play.add_argument('--faces-per-job', type=int, default=2000, help='faces in every Rekognition result')
+    play.add_argument('--analysis-seconds', type=float, default=30.0,
+                      help='simulated Rekognition job duration before its completion; negative disables')
+    play.add_argument('--tick-seconds', type=float, default=60.0, help='EventBridge schedule period; 0 disables')
+    play.add_argument('--drain-seconds', type=float, default=1800.0,
+                      help='how long ticks keep coming after the recording while videos are unfinished')
+    play.add_argument('--aggregation', default='track', choices=['track', 'none'], help='DETECTION_AGGREGATION')
+    play.add_argument('--seed', type=int, default=7, help='synthetic payload seed')
+    play.add_argument('--output', help='write the report as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        replay(args)
+        return
+
+    if args.from_logs:
+        entries = record_from_logs(args.from_logs)
+    elif args.scenario:
+        entries = record_scenario(args)
+    else:
+        parser.error('record needs a scenario or --from-logs')
+    save_recording(args.output, entries)
+    span = entries[-1][0] / 1000 if entries else 0
+    print(f"📼 Recorded {len(entries)} events over {span:.1f} s to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
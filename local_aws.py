@@ -0,0 +1,1186 @@
+#!/usr/bin/env python3
+"""
+Local in-memory stand-ins for the AWS services the Processing Lambda calls
+DynamoDB, S3, SNS, Rekognition and MediaConvert requests are answered
+in-process from botocore's before-call hook, so boto3 serialization and the
+handler code run unchanged while no request leaves the machine
+Shared by the offline benchmark and load harness scripts
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+# Key schema of the single table and its GSIs, as defined in infrastructure-stack.ts
+TABLE_INDEXES = {
+    'AttributeIndex': ('GSI1PK', 'GSI1SK'),
+    'VideoIndex': ('GSI2PK', 'GSI2SK'),
+    'TimeIndex': ('GSI3PK', 'GSI3SK'),
+}
+
+# Error codes botocore retries with backoff before raising
+THROTTLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'LimitExceededException',
+                   'RequestLimitExceeded', 'SlowDown', 'TooManyRequestsException')
+
+EMOTIONS = ['HAPPY', 'SAD', 'ANGRY', 'CONFUSED', 'DISGUSTED', 'SURPRISED', 'CALM', 'FEAR']
+
+
+class LocalError(Exception):
+    """An AWS error response: raised by a stand-in, returned to botocore as a ClientError"""
+
+    def __init__(self, code, message, status=400, **extra):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+# --- DynamoDB expressions ---------------------------------------------------
+
+TOKEN = re.compile(r'\s*(?:(?P<number>\d+)|(?P<name>#[A-Za-z0-9_]+)|(?P<value>:[A-Za-z0-9_]+)'
+                   r'|(?P<op><>|<=|>=|=|<|>|\(|\)|,|\.|\[|\]|\+|-)|(?P<word>[A-Za-z_][A-Za-z0-9_]*))')
+COMPARATORS = ('=', '<>', '<', '<=', '>', '>=')
+CONDITION_FUNCTIONS = ('attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains')
+UPDATE_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise LocalError('ValidationException', f"Invalid expression near: {expression[position:]}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+class ExpressionParser:
+    """Recursive-descent parser for condition, key condition, projection and update expressions"""
+
+    def __init__(self, expression, names):
+        self.tokens = tokenize(expression)
+        self.names = names or {}
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token[0] is None or (expected is not None and token[1] != expected and token[1].upper() != expected):
+            raise LocalError('ValidationException', f"Invalid expression: expected {expected}, found {token[1]}")
+        self.position += 1
+        return token
+
+    def at_keyword(self, *keywords):
+        kind, text = self.peek()
+        return kind == 'word' and text.upper() in keywords
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # Conditions
+    def condition(self):
+        node = self.conjunction()
+        while self.at_keyword('OR'):
+            self.take()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.at_keyword('AND'):
+            self.take()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.at_keyword('NOT'):
+            self.take()
+            return ('not', self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        kind, text = self.peek()
+        if text == '(':
+            self.take('(')
+            node = self.condition()
+            self.take(')')
+            return node
+        if kind == 'word' and text in CONDITION_FUNCTIONS and self.peek(1)[1] == '(':
+            self.take()
+            return ('function', text, self.arguments())
+
+        left = self.operand()
+        if self.at_keyword('BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            return ('between', left, low, self.operand())
+        if self.at_keyword('IN'):
+            self.take()
+            return ('in', left, self.arguments())
+        operator = self.take()[1]
+        if operator not in COMPARATORS:
+            raise LocalError('ValidationException', f"Invalid comparator: {operator}")
+        return ('compare', operator, left, self.operand())
+
+    def arguments(self):
+        self.take('(')
+        arguments = [self.operand()]
+        while self.peek()[1] == ',':
+            self.take(',')
+            arguments.append(self.operand())
+        self.take(')')
+        return arguments
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            self.take()
+            return ('value', text)
+        if kind == 'word' and text in ('size', 'if_not_exists', 'list_append') and self.peek(1)[1] == '(':
+            self.take()
+            return (text, self.arguments())
+        return ('path', self.path())
+
+    def path(self):
+        elements = [self.attribute_name()]
+        while self.peek()[1] in ('.', '['):
+            if self.take()[1] == '.':
+                elements.append(self.attribute_name())
+            else:
+                elements.append(int(self.take()[1]))
+                self.take(']')
+        return tuple(elements)
+
+    def attribute_name(self):
+        kind, text = self.take()
+        if kind == 'name':
+            if text not in self.names:
+                raise LocalError('ValidationException', f"Undefined attribute name: {text}")
+            return self.names[text]
+        if kind != 'word':
+            raise LocalError('ValidationException', f"Invalid attribute name: {text}")
+        return text
+
+    # Updates
+    def update(self):
+        actions = {clause: [] for clause in UPDATE_CLAUSES}
+        while not self.done():
+            clause = self.take()[1].upper()
+            if clause not in actions:
+                raise LocalError('ValidationException', f"Invalid update clause: {clause}")
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    actions[clause].append((path, self.set_value()))
+                elif clause == 'REMOVE':
+                    actions[clause].append((path, None))
+                else:
+                    actions[clause].append((path, self.operand()))
+                if self.peek()[1] != ',':
+                    break
+                self.take(',')
+        return actions
+
+    def set_value(self):
+        value = self.operand()
+        if self.peek()[1] in ('+', '-'):
+            operator = self.take()[1]
+            return (operator, value, self.operand())
+        return value
+
+    # Projections
+    def projection(self):
+        paths = [self.path()]
+        while self.peek()[1] == ',':
+            self.take(',')
+            paths.append(self.path())
+        return paths
+
+
+def parse(kind, expression, names):
+    """Parsed expression, cached by its text and attribute names"""
+    cache_key = (kind, expression, tuple(sorted((names or {}).items())))
+    node = _parsed.get(cache_key)
+    if node is None:
+        parser = ExpressionParser(expression, names)
+        node = getattr(parser, kind)()
+        if not parser.done():
+            raise LocalError('ValidationException', f"Unexpected tokens in expression: {expression}")
+        with _parsed_lock:
+            _parsed[cache_key] = node
+    return node
+
+
+def comparable(value):
+    """Python value of a scalar AttributeValue for ordering, or None"""
+    if value is None:
+        return None
+    if 'N' in value:
+        return Decimal(value['N'])
+    if 'S' in value:
+        return value['S']
+    if 'B' in value:
+        return value['B']
+    return None
+
+
+def same_value(left, right):
+    if left is None or right is None:
+        return False
+    (left_type, left_value), = left.items()
+    (right_type, right_value), = right.items()
+    if left_type != right_type:
+        return False
+    if left_type == 'N':
+        return Decimal(left_value) == Decimal(right_value)
+    if left_type in ('SS', 'BS'):
+        return set(left_value) == set(right_value)
+    if left_type == 'NS':
+        return {Decimal(v) for v in left_value} == {Decimal(v) for v in right_value}
+    if left_type == 'L':
+        return len(left_value) == len(right_value) and all(map(same_value, left_value, right_value))
+    if left_type == 'M':
+        return left_value.keys() == right_value.keys() and all(same_value(left_value[k], right_value[k]) for k in left_value)
+    return left_value == right_value
+
+
+def get_path(item, path):
+    value = {'M': item}
+    for element in path:
+        container = value.get('L') if isinstance(element, int) else value.get('M')
+        if container is None:
+            return None
+        if isinstance(element, int):
+            if element >= len(container):
+                return None
+            value = container[element]
+        else:
+            value = container.get(element)
+            if value is None:
+                return None
+    return value
+
+
+def set_path(item, path, value):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else {'M': item}
+    element = path[-1]
+    if isinstance(element, int) and parent is not None and 'L' in parent:
+        values = parent['L']
+        if element < len(values):
+            values[element] = value
+        else:
+            values.append(value)
+    elif not isinstance(element, int) and parent is not None and 'M' in parent:
+        parent['M'][element] = value
+    else:
+        raise LocalError('ValidationException', 'The document path provided in the update expression is invalid for update')
+
+
+def remove_path(item, path):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else {'M': item}
+    element = path[-1]
+    if parent is None:
+        return
+    if isinstance(element, int) and 'L' in parent and element < len(parent['L']):
+        del parent['L'][element]
+    elif not isinstance(element, int) and 'M' in parent:
+        parent['M'].pop(element, None)
+
+
+def resolve(item, operand, values):
+    kind = operand[0]
+    if kind == 'value':
+        if operand[1] not in values:
+            raise LocalError('ValidationException', f"Undefined attribute value: {operand[1]}")
+        return values[operand[1]]
+    if kind == 'path':
+        return get_path(item, operand[1])
+    if kind == 'size':
+        value = resolve(item, operand[1][0], values)
+        if value is None:
+            return None
+        (value_type, contents), = value.items()
+        return {'N': str(len(contents))} if value_type != 'N' else None
+    if kind == 'if_not_exists':
+        existing = resolve(item, operand[1][0], values)
+        return existing if existing is not None else resolve(item, operand[1][1], values)
+    if kind == 'list_append':
+        first, second = (resolve(item, argument, values) for argument in operand[1])
+        if first is None or second is None or 'L' not in first or 'L' not in second:
+            raise LocalError('ValidationException', 'An operand in the update expression has an incorrect data type')
+        return {'L': first['L'] + second['L']}
+    raise LocalError('ValidationException', f"Unsupported operand: {kind}")
+
+
+def evaluate(item, node, values):
+    kind = node[0]
+    if kind == 'and':
+        return evaluate(item, node[1], values) and evaluate(item, node[2], values)
+    if kind == 'or':
+        return evaluate(item, node[1], values) or evaluate(item, node[2], values)
+    if kind == 'not':
+        return not evaluate(item, node[1], values)
+    if kind == 'compare':
+        _, operator, left, right = node
+        left, right = resolve(item, left, values), resolve(item, right, values)
+        if operator == '=':
+            return same_value(left, right)
+        if operator == '<>':
+            return not same_value(left, right)
+        left, right = comparable(left), comparable(right)
+        if left is None or right is None or type(left) is not type(right):
+            return False
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[operator]
+    if kind == 'between':
+        value, low, high = (comparable(resolve(item, operand, values)) for operand in node[1:])
+        if value is None or low is None or high is None or not (type(value) is type(low) is type(high)):
+            return False
+        return low <= value <= high
+    if kind == 'in':
+        value = resolve(item, node[1], values)
+        return any(same_value(value, resolve(item, candidate, values)) for candidate in node[2])
+
+    name, arguments = node[1], node[2]
+    target = resolve(item, arguments[0], values)
+    if name == 'attribute_exists':
+        return target is not None
+    if name == 'attribute_not_exists':
+        return target is None
+    other = resolve(item, arguments[1], values)
+    if target is None or other is None:
+        return False
+    if name == 'attribute_type':
+        return other.get('S') in target
+    if name == 'begins_with':
+        for value_type in ('S', 'B'):
+            if value_type in target and value_type in other:
+                return target[value_type].startswith(other[value_type])
+        return False
+    # contains
+    if 'S' in target and 'S' in other:
+        return other['S'] in target['S']
+    for set_type, member_type in (('SS', 'S'), ('NS', 'N'), ('BS', 'B')):
+        if set_type in target and member_type in other:
+            return any(same_value({member_type: member}, other) for member in target[set_type])
+    if 'L' in target:
+        return any(same_value(member, other) for member in target['L'])
+    return False
+
+
+def number(value):
+    if value is None:
+        return Decimal(0)
+    if 'N' not in value:
+        raise LocalError('ValidationException', 'An operand in the update expression has an incorrect data type')
+    return Decimal(value['N'])
+
+
+def apply_update(item, actions, values):
+    """Apply parsed update actions to item in place; returns the top-level names touched"""
+    touched = set()
+    for path, operand in actions['SET']:
+        if operand[0] in ('+', '-'):
+            left, right = number(resolve(item, operand[1], values)), number(resolve(item, operand[2], values))
+            value = {'N': str(left + right if operand[0] == '+' else left - right)}
+        else:
+            value = resolve(item, operand, values)
+            if value is None:
+                raise LocalError('ValidationException',
+                                 'The provided expression refers to an attribute that does not exist in the item')
+        set_path(item, path, value)
+        touched.add(path[0])
+    for path, _ in actions['REMOVE']:
+        remove_path(item, path)
+        touched.add(path[0])
+    for path, operand in actions['ADD']:
+        value = resolve(item, operand, values)
+        current = get_path(item, path)
+        if 'N' in value:
+            set_path(item, path, {'N': str(number(current) + Decimal(value['N']))})
+        else:
+            (set_type, members), = value.items()
+            existing = current[set_type] if current else []
+            set_path(item, path, {set_type: existing + [member for member in members if member not in existing]})
+        touched.add(path[0])
+    for path, operand in actions['DELETE']:
+        value = resolve(item, operand, values)
+        current = get_path(item, path)
+        if current is not None:
+            (set_type, members), = value.items()
+            remaining = [member for member in current.get(set_type, []) if member not in members]
+            if remaining:
+                set_path(item, path, {set_type: remaining})
+            else:
+                remove_path(item, path)
+        touched.add(path[0])
+    return touched
+
+
+def project(item, expression, names):
+    if not expression:
+        return item
+    projected = {}
+    for path in parse('projection', expression, names):
+        value = get_path(item, path[:1])
+        if value is not None:
+            projected[path[0]] = value
+    return projected
+
+
+def clone(value):
+    """Copy of an AttributeValue structure; cheaper than copy.deepcopy"""
+    if isinstance(value, dict):
+        return {key: clone(member) for key, member in value.items()}
+    if isinstance(value, list):
+        return [clone(member) for member in value]
+    return value
+
+
+def item_size(item):
+    return len(json.dumps(item, separators=(',', ':')))
+
+
+# --- DynamoDB ---------------------------------------------------------------
+
+class LocalTable:
+    def __init__(self, name, hash_key='PK', range_key='SK', indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes if indexes is not None else dict(TABLE_INDEXES)
+        # hash key value -> range key value -> item
+        self.partitions = {}
+
+    def key_of(self, item):
+        hash_value = comparable(item.get(self.hash_key))
+        range_value = comparable(item.get(self.range_key)) if self.range_key else None
+        if hash_value is None or (self.range_key and range_value is None):
+            raise LocalError('ValidationException', 'The provided key element does not match the schema')
+        return hash_value, range_value
+
+    def get(self, key):
+        hash_value, range_value = self.key_of(key)
+        return self.partitions.get(hash_value, {}).get(range_value)
+
+    def put(self, item):
+        hash_value, range_value = self.key_of(item)
+        self.partitions.setdefault(hash_value, {})[range_value] = item
+
+    def delete(self, key):
+        hash_value, range_value = self.key_of(key)
+        partition = self.partitions.get(hash_value, {})
+        old = partition.pop(range_value, None)
+        if not partition:
+            self.partitions.pop(hash_value, None)
+        return old
+
+    def items(self):
+        for partition in self.partitions.values():
+            yield from partition.values()
+
+    def key_attributes(self, item, index_name=None):
+        names = [self.hash_key, self.range_key]
+        if index_name:
+            names.extend(self.indexes[index_name])
+        return {name: item[name] for name in names if name and name in item}
+
+
+class LocalDynamoDB:
+    """One or more tables with conditional writes, transactions and paginated queries
+
+    ``write_capacity`` (items per second, with one second of burst) makes
+    writes beyond the rate fail the way an under-provisioned table does:
+    single writes raise ProvisionedThroughputExceededException and batch
+    writes come back as UnprocessedItems.
+    """
+
+    def __init__(self, write_capacity=None):
+        self.tables = {}
+        self.write_capacity = write_capacity
+        self.read_units = 0
+        self.write_units = 0
+        self.throttled_writes = 0
+        self._tokens = float(write_capacity or 0)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.RLock()
+        self.operations = {
+            'GetItem': self.get_item,
+            'BatchGetItem': self.batch_get_item,
+            'PutItem': self.put_item,
+            'UpdateItem': self.update_item,
+            'DeleteItem': self.delete_item,
+            'BatchWriteItem': self.batch_write_item,
+            'TransactWriteItems': self.transact_write_items,
+            'Query': self.query,
+            'Scan': self.scan,
+            'DescribeTable': self.describe_table,
+        }
+
+
+    def items(self, table_name):
+        """Snapshot of a table's items, safe while other threads write"""
+        with self._lock:
+            return list(self.tables[table_name].items()) if table_name in self.tables else []
+    def create_table(self, name, hash_key='PK', range_key='SK', indexes=None):
+        self.tables[name] = LocalTable(name, hash_key, range_key, indexes)
+        return self.tables[name]
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise LocalError('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return table
+
+    def item_count(self):
+        return sum(1 for table in self.tables.values() for _ in table.items())
+
+    def _take_write(self, units=1):
+        """Spend write capacity; False when the table is throttling"""
+        if not self.write_capacity:
+            return True
+        now = time.monotonic()
+        self._tokens = min(float(self.write_capacity), self._tokens + (now - self._refilled_at) * self.write_capacity)
+        self._refilled_at = now
+        if self._tokens < units:
+            self.throttled_writes += 1
+            return False
+        self._tokens -= units
+        return True
+
+    def _throttle(self):
+        raise LocalError('ProvisionedThroughputExceededException',
+                         'The level of configured provisioned throughput for the table was exceeded.')
+
+    def _check(self, existing, request):
+        condition = request.get('ConditionExpression')
+        if not condition:
+            return True
+        node = parse('condition', condition, request.get('ExpressionAttributeNames'))
+        return evaluate(existing or {}, node, request.get('ExpressionAttributeValues', {}))
+
+    def _condition_failed(self, existing, request):
+        extra = {}
+        if existing is not None and request.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+            extra['Item'] = clone(existing)
+        raise LocalError('ConditionalCheckFailedException', 'The conditional request failed', **extra)
+
+    def _count_write(self, *items):
+        self.write_units += max(1, math.ceil(max(item_size(item) if item else 0 for item in items) / 1024))
+
+    def _count_read(self, item):
+        self.read_units += max(1, math.ceil((item_size(item) if item else 0) / 4096))
+
+    def get_item(self, params):
+        with self._lock:
+            item = self.table(params['TableName']).get(params['Key'])
+            self._count_read(item)
+            if item is None:
+                return {}
+            return {'Item': clone(project(item, params.get('ProjectionExpression'), params.get('ExpressionAttributeNames')))}
+
+    def batch_get_item(self, params):
+        responses = {}
+        with self._lock:
+            for table_name, request in params['RequestItems'].items():
+                table = self.table(table_name)
+                found = responses.setdefault(table_name, [])
+                for key in request['Keys']:
+                    item = table.get(key)
+                    self._count_read(item)
+                    if item is not None:
+                        found.append(clone(project(item, request.get('ProjectionExpression'),
+                                                   request.get('ExpressionAttributeNames'))))
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def _put(self, table, request):
+        item = request['Item']
+        existing = table.get(item)
+        if not self._check(existing, request):
+            self._condition_failed(existing, request)
+        self._count_write(existing, item)
+        table.put(item)
+        return existing
+
+    def put_item(self, params):
+        with self._lock:
+            if not self._take_write():
+                self._throttle()
+            existing = self._put(self.table(params['TableName']), params)
+        if params.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+            return {'Attributes': clone(existing)}
+        return {}
+
+    def _update(self, table, request):
+        existing = table.get(request['Key'])
+        if not self._check(existing, request):
+            self._condition_failed(existing, request)
+        updated = clone(existing) if existing is not None else clone(request['Key'])
+        touched = set()
+        if request.get('UpdateExpression'):
+            actions = parse('update', request['UpdateExpression'], request.get('ExpressionAttributeNames'))
+            touched = apply_update(updated, actions, request.get('ExpressionAttributeValues', {}))
+        self._count_write(existing, updated)
+        table.put(updated)
+        return existing, updated, touched
+
+    def update_item(self, params):
+        with self._lock:
+            if not self._take_write():
+                self._throttle()
+            existing, updated, touched = self._update(self.table(params['TableName']), params)
+        return_values = params.get('ReturnValues', 'NONE')
+        if return_values == 'ALL_NEW':
+            return {'Attributes': clone(updated)}
+        if return_values == 'ALL_OLD' and existing is not None:
+            return {'Attributes': clone(existing)}
+        if return_values == 'UPDATED_NEW':
+            return {'Attributes': {name: clone(updated[name]) for name in touched if name in updated}}
+        if return_values == 'UPDATED_OLD' and existing is not None:
+            return {'Attributes': {name: clone(existing[name]) for name in touched if name in existing}}
+        return {}
+
+    def _delete(self, table, request):
+        existing = table.get(request['Key'])
+        if not self._check(existing, request):
+            self._condition_failed(existing, request)
+        self._count_write(existing)
+        table.delete(request['Key'])
+        return existing
+
+    def delete_item(self, params):
+        with self._lock:
+            if not self._take_write():
+                self._throttle()
+            existing = self._delete(self.table(params['TableName']), params)
+        if params.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+            return {'Attributes': clone(existing)}
+        return {}
+
+    def batch_write_item(self, params):
+        request_items = params['RequestItems']
+        if sum(len(requests) for requests in request_items.values()) > 25:
+            raise LocalError('ValidationException', 'Too many items requested for the BatchWriteItem call')
+        unprocessed = {}
+        with self._lock:
+            for table_name, requests in request_items.items():
+                table = self.table(table_name)
+                for request in requests:
+                    if not self._take_write():
+                        unprocessed.setdefault(table_name, []).append(request)
+                    elif 'PutRequest' in request:
+                        item = request['PutRequest']['Item']
+                        self._count_write(item)
+                        table.put(item)
+                    else:
+                        self._count_write(table.delete(request['DeleteRequest']['Key']))
+        return {'UnprocessedItems': unprocessed}
+
+    def transact_write_items(self, params):
+        actions = params['TransactItems']
+        with self._lock:
+            if not self._take_write(2 * len(actions)):
+                self._throttle()
+            # Every condition is checked before anything is written
+            reasons = []
+            for action in actions:
+                (kind, request), = action.items()
+                table = self.table(request['TableName'])
+                existing = table.get(request['Item'] if kind == 'Put' else request['Key'])
+                if self._check(existing, request):
+                    reasons.append({'Code': 'None'})
+                else:
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                raise LocalError('TransactionCanceledException',
+                                 f"Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]",
+                                 CancellationReasons=reasons)
+            for action in actions:
+                (kind, request), = action.items()
+                table = self.table(request['TableName'])
+                if kind == 'Put':
+                    self._put(table, request)
+                elif kind == 'Update':
+                    self._update(table, request)
+                elif kind == 'Delete':
+                    self._delete(table, request)
+                self.write_units += 1  # transactional writes cost double
+        return {}
+
+    def query(self, params):
+        with self._lock:
+            table = self.table(params['TableName'])
+            index_name = params.get('IndexName')
+            names = params.get('ExpressionAttributeNames')
+            values = params.get('ExpressionAttributeValues', {})
+            hash_key, range_key = table.indexes[index_name] if index_name else (table.hash_key, table.range_key)
+            key_condition = parse('condition', params['KeyConditionExpression'], names)
+            hash_value = self._hash_value(key_condition, hash_key, values)
+
+            if index_name:
+                candidates = [item for item in table.items()
+                              if same_value(item.get(hash_key), hash_value) and range_key in item]
+            else:
+                candidates = list(table.partitions.get(comparable(hash_value), {}).values())
+            candidates = [item for item in candidates if evaluate(item, key_condition, values)]
+            return self._page(table, candidates, params, index_name, range_key)
+
+    def scan(self, params):
+        with self._lock:
+            table = self.table(params['TableName'])
+            return self._page(table, list(table.items()), params, params.get('IndexName'), None)
+
+    def _hash_value(self, node, hash_key, values):
+        if node[0] == 'and':
+            return self._hash_value(node[1], hash_key, values) or self._hash_value(node[2], hash_key, values)
+        if node[0] == 'compare' and node[1] == '=' and node[2] == ('path', (hash_key,)):
+            return resolve({}, node[3], values)
+        if node[0] in ('compare', 'between', 'function'):
+            return None
+        raise LocalError('ValidationException', 'Query key condition not supported')
+
+    def _page(self, table, candidates, params, index_name, range_key):
+        def order(item):
+            sort_value = comparable(item.get(range_key)) if range_key else None
+            return (sort_value if sort_value is not None else '',
+                    comparable(item.get(table.hash_key)), comparable(item.get(table.range_key)))
+
+        candidates.sort(key=order, reverse=params.get('ScanIndexForward', True) is False)
+        start = params.get('ExclusiveStartKey')
+        if start:
+            boundary = order(start)
+            forward = params.get('ScanIndexForward', True) is not False
+            candidates = [item for item in candidates if (order(item) > boundary if forward else order(item) < boundary)]
+
+        limit = params.get('Limit')
+        evaluated = candidates[:limit] if limit else candidates
+        for item in evaluated:
+            self._count_read(item)
+
+        names = params.get('ExpressionAttributeNames')
+        values = params.get('ExpressionAttributeValues', {})
+        if params.get('FilterExpression'):
+            node = parse('condition', params['FilterExpression'], names)
+            matched = [item for item in evaluated if evaluate(item, node, values)]
+        else:
+            matched = evaluated
+
+        response = {'Count': len(matched), 'ScannedCount': len(evaluated)}
+        if params.get('Select') != 'COUNT':
+            response['Items'] = [clone(project(item, params.get('ProjectionExpression'), names)) for item in matched]
+        if limit and len(candidates) > limit:
+            response['LastEvaluatedKey'] = clone(table.key_attributes(evaluated[-1], index_name))
+        return response
+
+    def describe_table(self, params):
+        table = self.table(params['TableName'])
+        return {'Table': {'TableName': table.name, 'TableStatus': 'ACTIVE', 'ItemCount': sum(1 for _ in table.items())}}
+
+
+# --- S3 ---------------------------------------------------------------------
+
+class LocalS3:
+    """Objects held in memory, with ranged reads and multipart uploads"""
+
+    def __init__(self):
+        self.objects = {}
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self.operations = {
+            'PutObject': self.put_object,
+            'GetObject': self.get_object,
+            'HeadObject': self.head_object,
+            'CopyObject': self.copy_object,
+            'DeleteObject': self.delete_object,
+            'DeleteObjects': self.delete_objects,
+            'ListObjectsV2': self.list_objects_v2,
+            'CreateMultipartUpload': self.create_multipart_upload,
+            'UploadPart': self.upload_part,
+            'CompleteMultipartUpload': self.complete_multipart_upload,
+            'AbortMultipartUpload': self.abort_multipart_upload,
+        }
+
+    @staticmethod
+    def _body(body):
+        if body is None:
+            return b''
+        if isinstance(body, str):
+            return body.encode('utf-8')
+        if isinstance(body, (bytes, bytearray)):
+            return bytes(body)
+        return body.read()
+
+    def _store(self, bucket, key, data, content_type=None, metadata=None):
+        with self._lock:
+            self.objects[(bucket, key)] = {
+                'data': data,
+                'ContentType': content_type or 'binary/octet-stream',
+                'Metadata': metadata or {},
+                'LastModified': datetime.now(timezone.utc),
+                'ETag': f'"{uuid.uuid4().hex}"',
+            }
+            self.bytes_written += len(data)
+
+    def _object(self, params):
+        stored = self.objects.get((params['Bucket'], params['Key']))
+        if stored is None:
+            raise LocalError('NoSuchKey', 'The specified key does not exist.', status=404)
+        return stored
+
+    def put_object(self, params):
+        self._store(params['Bucket'], params['Key'], self._body(params.get('Body')),
+                    params.get('ContentType'), params.get('Metadata'))
+        return {'ETag': self.objects[(params['Bucket'], params['Key'])]['ETag']}
+
+    def get_object(self, params):
+        stored = self._object(params)
+        data = stored['data']
+        response = {'ContentType': stored['ContentType'], 'ETag': stored['ETag'],
+                    'LastModified': stored['LastModified'], 'Metadata': stored['Metadata']}
+        if params.get('Range'):
+            start, _, end = params['Range'].replace('bytes=', '').partition('-')
+            if start == '':
+                start, end = max(len(data) - int(end), 0), len(data) - 1
+            else:
+                start, end = int(start), min(int(end) if end else len(data) - 1, len(data) - 1)
+            response['ContentRange'] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        self.bytes_read += len(data)
+        response['ContentLength'] = len(data)
+        response['Body'] = StreamingBody(BytesIO(data), len(data))
+        return response
+
+    def head_object(self, params):
+        stored = self.objects.get((params['Bucket'], params['Key']))
+        if stored is None:
+            raise LocalError('404', 'Not Found', status=404)
+        return {'ContentLength': len(stored['data']), 'ContentType': stored['ContentType'],
+                'ETag': stored['ETag'], 'LastModified': stored['LastModified'], 'Metadata': stored['Metadata']}
+
+    def copy_object(self, params):
+        source = params['CopySource']
+        if isinstance(source, str):
+            source_bucket, _, source_key = source.lstrip('/').partition('/')
+        else:
+            source_bucket, source_key = source['Bucket'], source['Key']
+        stored = self._object({'Bucket': source_bucket, 'Key': source_key})
+        self._store(params['Bucket'], params['Key'], stored['data'],
+                    params.get('ContentType', stored['ContentType']), stored['Metadata'])
+        return {'CopyObjectResult': {'ETag': self.objects[(params['Bucket'], params['Key'])]['ETag']}}
+
+    def delete_object(self, params):
+        with self._lock:
+            self.objects.pop((params['Bucket'], params['Key']), None)
+        return {}
+
+    def delete_objects(self, params):
+        deleted = []
+        with self._lock:
+            for entry in params['Delete']['Objects']:
+                self.objects.pop((params['Bucket'], entry['Key']), None)
+                deleted.append({'Key': entry['Key']})
+        return {'Deleted': deleted}
+
+    def list_objects_v2(self, params):
+        prefix = params.get('Prefix', '')
+        after = params.get('ContinuationToken') or params.get('StartAfter') or ''
+        max_keys = params.get('MaxKeys', 1000)
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects
+                          if bucket == params['Bucket'] and key.startswith(prefix) and key > after)
+        page = keys[:max_keys]
+        response = {'Name': params['Bucket'], 'Prefix': prefix, 'KeyCount': len(page), 'MaxKeys': max_keys,
+                    'IsTruncated': len(keys) > max_keys}
+        if page:
+            response['Contents'] = [{
+                'Key': key,
+                'Size': len(self.objects[(params['Bucket'], key)]['data']),
+                'ETag': self.objects[(params['Bucket'], key)]['ETag'],
+                'LastModified': self.objects[(params['Bucket'], key)]['LastModified'],
+            } for key in page]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def create_multipart_upload(self, params):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {'parts': {}, 'ContentType': params.get('ContentType')}
+        return {'Bucket': params['Bucket'], 'Key': params['Key'], 'UploadId': upload_id}
+
+    def upload_part(self, params):
+        data = self._body(params.get('Body'))
+        with self._lock:
+            self._uploads[params['UploadId']]['parts'][params['PartNumber']] = data
+        return {'ETag': f'"{uuid.uuid4().hex}"'}
+
+    def complete_multipart_upload(self, params):
+        with self._lock:
+            upload = self._uploads.pop(params['UploadId'])
+        data = b''.join(upload['parts'][number] for number in sorted(upload['parts']))
+        self._store(params['Bucket'], params['Key'], data, upload['ContentType'])
+        return {'Bucket': params['Bucket'], 'Key': params['Key'], 'ETag': self.objects[(params['Bucket'], params['Key'])]['ETag']}
+
+    def abort_multipart_upload(self, params):
+        with self._lock:
+            self._uploads.pop(params['UploadId'], None)
+        return {}
+
+
+# --- Rekognition, SNS, MediaConvert ------------------------------------------
+
+def synthetic_face_detections(count, seed=7, people=4, interval_ms=200):
+    """Timestamp-sorted faces shaped like GetFaceDetection results, generated lazily
+
+    A few people are on screen at a time and drift slowly between frames, so
+    face tracking sees realistic tracks; people leave and new ones arrive.
+    """
+    rng = random.Random(seed)
+
+    def arrival():
+        low = rng.randint(5, 70)
+        return {
+            'left': rng.uniform(0, 0.7), 'top': rng.uniform(0, 0.7), 'size': rng.uniform(0.08, 0.25),
+            'age': (low, low + rng.randint(2, 12)), 'gender': rng.choice(['Male', 'Female']),
+            'emotion': rng.choice(EMOTIONS), 'remaining': rng.randint(10, 300),
+        }
+
+    cast = [arrival() for _ in range(people)]
+    produced = 0
+    timestamp = 0
+    while produced < count:
+        timestamp += interval_ms
+        for index, person in enumerate(cast):
+            if produced >= count:
+                return
+            person['remaining'] -= 1
+            if person['remaining'] <= 0:
+                person = cast[index] = arrival()
+            person['left'] = min(max(person['left'] + rng.uniform(-0.01, 0.01), 0.0), 0.7)
+            person['top'] = min(max(person['top'] + rng.uniform(-0.01, 0.01), 0.0), 0.7)
+            produced += 1
+            yield {
+                'Timestamp': timestamp,
+                'Face': {
+                    'BoundingBox': {'Width': person['size'], 'Height': person['size'],
+                                    'Left': person['left'], 'Top': person['top']},
+                    'AgeRange': {'Low': person['age'][0], 'High': person['age'][1]},
+                    'Gender': {'Value': person['gender'], 'Confidence': rng.uniform(80, 100)},
+                    'Emotions': [{'Type': emotion, 'Confidence': rng.uniform(60, 100) if emotion == person['emotion']
+                                  else rng.uniform(0, 50)} for emotion in EMOTIONS],
+                    'FaceOccluded': {'Value': rng.random() < 0.1, 'Confidence': rng.uniform(80, 100)},
+                    'Quality': {'Brightness': rng.uniform(30, 90), 'Sharpness': rng.uniform(20, 99)},
+                    'Confidence': rng.uniform(90, 100),
+                },
+            }
+
+
+class LocalRekognition:
+    """Face detection jobs whose results are streamed from a face generator, one page per call
+
+    ``on_start`` is called with each started job, which lets a harness
+    deliver the job's SNS completion later.
+    """
+
+    def __init__(self, faces_per_job=1000, seed=7):
+        self.faces_per_job = faces_per_job
+        self.seed = seed
+        self.started = []
+        self.on_start = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.operations = {
+            'StartFaceDetection': self.start_face_detection,
+            'GetFaceDetection': self.get_face_detection,
+        }
+
+    def add_job(self, job_id, face_count=None, seed=None):
+        """Register results for a job id; pages are generated as they are requested"""
+        count = face_count or self.faces_per_job
+        with self._lock:
+            self._jobs[job_id] = {
+                'faces': synthetic_face_detections(count, self.seed if seed is None else seed),
+                'page': 0,
+                # The generator's default cast of 4 people advances 200 ms per frame
+                'duration': -(-count // 4) * 200,
+            }
+        return job_id
+
+    def start_face_detection(self, params):
+        job_id = uuid.uuid4().hex
+        job = {'JobId': job_id, 'JobTag': params.get('JobTag'), 'Video': params.get('Video')}
+        with self._lock:
+            self.started.append(job)
+        self.add_job(job_id)
+        if self.on_start:
+            self.on_start(job)
+        return {'JobId': job_id}
+
+    def get_face_detection(self, params):
+        with self._lock:
+            job = self._jobs.get(params['JobId'])
+            if job is None:
+                raise LocalError('ResourceNotFoundException', f"Job {params['JobId']} not found")
+            expected = str(job['page']) if job['page'] else None
+            if params.get('NextToken') != expected:
+                raise LocalError('InvalidPaginationTokenException', 'Pages are generated in order only')
+            page = [face for _, face in zip(range(params.get('MaxResults', 1000)), job['faces'])]
+            job['page'] += 1
+            response = {
+                'JobStatus': 'SUCCEEDED',
+                'VideoMetadata': {'Codec': 'h264', 'DurationMillis': job['duration'],
+                                  'Format': 'QuickTime / MOV', 'FrameRate': 30.0, 'FrameHeight': 1080, 'FrameWidth': 1920},
+                'Faces': page,
+            }
+            if len(page) == params.get('MaxResults', 1000):
+                response['NextToken'] = str(job['page'])
+            else:
+                self._jobs.pop(params['JobId'])
+            return response
+
+
+class LocalSNS:
+    def __init__(self):
+        self.messages = []
+        self.operations = {'Publish': self.publish}
+
+    def publish(self, params):
+        message_id = uuid.uuid4().hex
+        self.messages.append({'MessageId': message_id, 'TopicArn': params.get('TopicArn'), 'Message': params['Message']})
+        return {'MessageId': message_id}
+
+
+class LocalMediaConvert:
+    def __init__(self):
+        self.jobs = {}
+        self.operations = {'CreateJob': self.create_job, 'GetJob': self.get_job}
+
+    def create_job(self, params):
+        job_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+        self.jobs[job_id] = {'Id': job_id, 'Status': 'SUBMITTED', 'Role': params.get('Role'),
+                             'Settings': params.get('Settings'), 'UserMetadata': params.get('UserMetadata', {})}
+        return {'Job': self.jobs[job_id]}
+
+    def get_job(self, params):
+        if params['Id'] not in self.jobs:
+            raise LocalError('NotFoundException', f"Job {params['Id']} not found", status=404)
+        return {'Job': self.jobs[params['Id']]}
+
+
+# --- Wiring -------------------------------------------------------------------
+
+class LocalAWS:
+    """All stand-ins, answering every client built from the sessions they are installed on"""
+
+    def __init__(self, latency_ms=0.0, write_capacity=None, faces_per_job=1000, seed=7):
+        self.dynamodb = LocalDynamoDB(write_capacity=write_capacity)
+        self.s3 = LocalS3()
+        self.rekognition = LocalRekognition(faces_per_job=faces_per_job, seed=seed)
+        self.sns = LocalSNS()
+        self.mediaconvert = LocalMediaConvert()
+        self.latency_ms = latency_ms
+        self.calls = Counter()
+        self.errors = Counter()
+        self.retries = Counter()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._services = {
+            'dynamodb': self.dynamodb,
+            's3': self.s3,
+            'rekognition': self.rekognition,
+            'sns': self.sns,
+            'mediaconvert': self.mediaconvert,
+        }
+
+    def install(self, session):
+        """Answer every call made by clients created from this boto3 session"""
+        session.events.register('before-parameter-build', self._capture_params)
+        session.events.register('before-call', self._answer)
+
+    def attach(self, clients_module, table_name):
+        """Point the Processing Lambda's shared clients at the stand-ins"""
+        import boto3
+
+        clients_module.reset()
+        session = boto3.session.Session(region_name='us-east-1', aws_access_key_id='local',
+                                        aws_secret_access_key='local')
+        self.install(session)
+        clients_module._session = session
+        if table_name not in self.dynamodb.tables:
+            self.dynamodb.create_table(table_name)
+        return session
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.retries.clear()
+            self.seconds = 0.0
+
+    @staticmethod
+    def _capture_params(params, context, **kwargs):
+        # before-call only sees the serialized HTTP request, so keep the API parameters
+        context['local_params'] = params
+
+    def _answer(self, model, context, **kwargs):
+        service = model.service_model.service_name
+        operation = model.name
+        started = time.perf_counter()
+        with self._lock:
+            self.calls[f"{service}.{operation}"] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        stand_in = self._services.get(service)
+        handler = stand_in.operations.get(operation) if stand_in else None
+        # Answering from before-call skips botocore's retry handler, so throttles are retried here
+        retries = context['client_config'].retries or {}
+        attempts = retries.get('total_max_attempts') or retries.get('max_attempts', 0) + 1
+        for attempt in range(attempts):
+            try:
+                if handler is None:
+                    raise LocalError('UnsupportedOperation', f"No local stand-in for {service}.{operation}")
+                status, body = 200, handler(context.get('local_params', {})) or {}
+                break
+            except LocalError as e:
+                status, body = e.status, {'Error': {'Code': e.code, 'Message': e.message}, **e.extra}
+                if e.code not in THROTTLE_ERRORS or attempt == attempts - 1:
+                    with self._lock:
+                        self.errors[f"{service}.{operation}.{e.code}"] += 1
+                    break
+                with self._lock:
+                    self.retries[f"{service}.{operation}.{e.code}"] += 1
+                # Full-jitter exponential backoff, as in botocore's standard retry mode
+                time.sleep(random.uniform(0, min(20.0, 2 ** attempt)))
+
+        body['ResponseMetadata'] = {'RequestId': uuid.uuid4().hex, 'HTTPStatusCode': status,
+                                    'HTTPHeaders': {}, 'RetryAttempts': 0}
+        with self._lock:
+            self.seconds += time.perf_counter() - started
+        return AWSResponse(f"https://{service}.local/", status, {}, None), body
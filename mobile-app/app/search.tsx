@@ -254,30 +254,30 @@ export default function SearchScreen() {
               })()}
 
               <View style={styles.filterRow}>
-                <Text style={styles.filterLabel}>Color:</Text>
+                <Text style={styles.filterLabel}>Gender:</Text>
                 <ScrollView horizontal showsHorizontalScrollIndicator={false}>
-                  {["red", "blue", "green", "black", "white"].map((color) => (
+                  {["male", "female"].map((gender) => (
                     <TouchableOpacity
-                      key={color}
+                      key={gender}
                       style={[
                         styles.filterChip,
-                        filters.color === color && styles.filterChipActive,
+                        filters.gender === gender && styles.filterChipActive,
                       ]}
                       onPress={() =>
                         updateFilter(
-                          "color",
-                          filters.color === color ? undefined : color
+                          "gender",
+                          filters.gender === gender ? undefined : gender
                         )
                       }
                     >
                       <Text
                         style={[
                           styles.filterChipText,
-                          filters.color === color &&
+                          filters.gender === gender &&
                             styles.filterChipTextActive,
                         ]}
                       >
-                        {color}
+                        {gender}
                       </Text>
                     </TouchableOpacity>
                   ))}
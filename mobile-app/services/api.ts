@@ -115,7 +115,7 @@ class ApiService {
           const params = {
             orgId: url.searchParams.get("orgId") || "test-org",
             filters: {
-              color: url.searchParams.get("color") || undefined,
+              gender: url.searchParams.get("gender") || undefined,
               emotion: url.searchParams.get("emotion") || undefined,
               ageBucket: url.searchParams.get("ageBucket") || undefined,
               mask: url.searchParams.get("mask") === "true",
@@ -178,9 +178,9 @@ class ApiService {
   async searchDetections(params: {
     orgId: string;
     filters?: {
-      color?: string;
       emotion?: string;
       ageBucket?: string;
+      gender?: string;
       mask?: boolean;
       timeRange?: {
         start: string;
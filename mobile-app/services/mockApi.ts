@@ -42,9 +42,9 @@ class MockApiService {
   async searchDetections(params: {
     orgId: string;
     filters?: {
-      color?: string;
       emotion?: string;
       ageBucket?: string;
+      gender?: string;
       mask?: boolean;
       timeRange?: {
         start: string;
@@ -67,10 +67,9 @@ class MockApiService {
     
     // Apply filters
     if (params.filters) {
-      if (params.filters.color) {
+      if (params.filters.gender) {
         results = results.filter(detection => 
-          detection.attributes.upperColor === params.filters?.color ||
-          detection.attributes.lowerColor === params.filters?.color
+          detection.attributes.gender === params.filters?.gender
         );
       }
       
@@ -48,9 +48,9 @@ export interface Organization {
 }
 
 export interface SearchFilters {
-  color?: string;
   emotion?: string;
   ageBucket?: string;
+  gender?: string;
   mask?: boolean;
   timeRange?: {
     start: string;